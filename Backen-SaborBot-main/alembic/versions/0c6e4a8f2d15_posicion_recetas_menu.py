@@ -0,0 +1,40 @@
+"""posicion recetas menu
+
+Revision ID: 0c6e4a8f2d15
+Revises: f1b7d2c9e403
+Create Date: 2026-10-19 11:03:58.271940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c6e4a8f2d15'
+down_revision: Union[str, Sequence[str], None] = 'f1b7d2c9e403'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('recetamenusemanal', sa.Column('posicion', sa.Integer(), server_default='0', nullable=False))
+    # Menús existentes: el día se desconoce, se usa el orden de inserción de las recetas
+    op.execute(
+        """
+        UPDATE recetamenusemanal r
+        JOIN (
+            SELECT menu_semanal_id, receta_id,
+                   ROW_NUMBER() OVER (PARTITION BY menu_semanal_id ORDER BY receta_id) - 1 AS posicion
+            FROM recetamenusemanal
+        ) o ON o.menu_semanal_id = r.menu_semanal_id AND o.receta_id = r.receta_id
+        SET r.posicion = o.posicion
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('recetamenusemanal', 'posicion')
@@ -0,0 +1,85 @@
+"""imagenes en almacen externo
+
+Revision ID: 3f9c1d7a5e21
+Revises: ca2f1f6f7c2a
+Create Date: 2026-10-18 10:12:31.482915
+
+"""
+import base64
+import binascii
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+from app.image_store import get_image_store
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1d7a5e21'
+down_revision: Union[str, Sequence[str], None] = 'ca2f1f6f7c2a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Filas procesadas por lote al mover las imágenes
+BATCH_SIZE = 50
+
+receta = sa.table(
+    'receta',
+    sa.column('id', sa.Integer),
+    sa.column('imagen_receta_base64', sa.Text),
+    sa.column('imagen_key', sa.String),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('receta', sa.Column('imagen_key', sa.String(length=64), nullable=True))
+
+    # Mueve cada imagen Base64 al almacén y deja solo su clave SHA-256 en la fila
+    conn = op.get_bind()
+    store = get_image_store()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(receta.c.id, receta.c.imagen_receta_base64)
+            .where(receta.c.id > last_id, receta.c.imagen_receta_base64.isnot(None))
+            .order_by(receta.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            try:
+                imagen_key = store.put(base64.b64decode(row.imagen_receta_base64, validate=True))
+            except (binascii.Error, ValueError):
+                print(f"Receta {row.id}: imagen Base64 inválida, se descarta")
+                continue
+            conn.execute(sa.update(receta).where(receta.c.id == row.id).values(imagen_key=imagen_key))
+        last_id = rows[-1].id
+
+    op.drop_column('receta', 'imagen_receta_base64')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('receta', sa.Column('imagen_receta_base64', mysql.LONGTEXT(), nullable=True))
+
+    conn = op.get_bind()
+    store = get_image_store()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(receta.c.id, receta.c.imagen_key)
+            .where(receta.c.id > last_id, receta.c.imagen_key.isnot(None))
+            .order_by(receta.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            data = base64.b64encode(store.read(row.imagen_key)).decode()
+            conn.execute(sa.update(receta).where(receta.c.id == row.id).values(imagen_receta_base64=data))
+        last_id = rows[-1].id
+
+    op.drop_column('receta', 'imagen_key')
@@ -0,0 +1,32 @@
+"""hash instrucciones receta
+
+Revision ID: 7d3a9e1c5b28
+Revises: 0c6e4a8f2d15
+Create Date: 2026-10-19 15:26:44.830215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3a9e1c5b28'
+down_revision: Union[str, Sequence[str], None] = '0c6e4a8f2d15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('receta', sa.Column('instrucciones_sha256', sa.String(length=64), nullable=True))
+    # Mismo valor que models.hash_instrucciones (SHA-256 hexadecimal de los bytes UTF-8)
+    op.execute("UPDATE receta SET instrucciones_sha256 = SHA2(instrucciones, 256)")
+    op.create_index('ix_receta_instrucciones_sha256', 'receta', ['instrucciones_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_receta_instrucciones_sha256', table_name='receta')
+    op.drop_column('receta', 'instrucciones_sha256')
@@ -0,0 +1,28 @@
+"""indice fulltext recetas
+
+Revision ID: 8b2e4c6d1a90
+Revises: 3f9c1d7a5e21
+Create Date: 2026-10-18 11:40:05.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4c6d1a90'
+down_revision: Union[str, Sequence[str], None] = '3f9c1d7a5e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ft_receta_texto', 'receta', ['titulo', 'promt_usuario', 'instrucciones'], unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ft_receta_texto', table_name='receta')
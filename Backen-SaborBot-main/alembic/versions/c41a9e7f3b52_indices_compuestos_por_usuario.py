@@ -0,0 +1,49 @@
+"""indices compuestos por usuario
+
+Revision ID: c41a9e7f3b52
+Revises: 8b2e4c6d1a90
+Create Date: 2026-10-18 12:31:47.902316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41a9e7f3b52'
+down_revision: Union[str, Sequence[str], None] = '8b2e4c6d1a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Índices para los accesos reales (listados por usuario, ingredientes por receta).
+    # MySQL descarta solo el índice implícito del FK al existir uno que lo cubre.
+    op.create_index('ix_receta_usuario_id_id', 'receta', ['usuario_id', 'id'], unique=False)
+    op.create_index('ix_menusemanal_usuario_id_id', 'menusemanal', ['usuario_id', 'id'], unique=False)
+    op.create_index('ix_ingredientefaltantereceta_receta_id', 'ingredientefaltantereceta', ['receta_id'], unique=False)
+
+    # Índices duplicados de la clave primaria: solo añaden coste de escritura
+    op.drop_index(op.f('ix_usuario_id'), table_name='usuario')
+    op.drop_index(op.f('ix_receta_id'), table_name='receta')
+    op.drop_index(op.f('ix_menusemanal_id'), table_name='menusemanal')
+    op.drop_index(op.f('ix_ingredientefaltantereceta_id'), table_name='ingredientefaltantereceta')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_ingredientefaltantereceta_id'), 'ingredientefaltantereceta', ['id'], unique=False)
+    op.create_index(op.f('ix_menusemanal_id'), 'menusemanal', ['id'], unique=False)
+    op.create_index(op.f('ix_receta_id'), 'receta', ['id'], unique=False)
+    op.create_index(op.f('ix_usuario_id'), 'usuario', ['id'], unique=False)
+
+    # Los FK necesitan un índice propio antes de borrar los compuestos
+    op.create_index('usuario_id', 'receta', ['usuario_id'], unique=False)
+    op.create_index('usuario_id', 'menusemanal', ['usuario_id'], unique=False)
+    op.create_index('receta_id', 'ingredientefaltantereceta', ['receta_id'], unique=False)
+    op.drop_index('ix_ingredientefaltantereceta_receta_id', table_name='ingredientefaltantereceta')
+    op.drop_index('ix_menusemanal_usuario_id_id', table_name='menusemanal')
+    op.drop_index('ix_receta_usuario_id_id', table_name='receta')
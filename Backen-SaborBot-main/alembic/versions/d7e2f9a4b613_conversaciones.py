@@ -0,0 +1,51 @@
+"""conversaciones
+
+Revision ID: d7e2f9a4b613
+Revises: c41a9e7f3b52
+Create Date: 2026-10-18 15:08:22.417395
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7e2f9a4b613'
+down_revision: Union[str, Sequence[str], None] = 'c41a9e7f3b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('conversacion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('titulo', sa.String(length=200), nullable=False),
+    sa.Column('creada_en', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('resumen', sa.Text(), nullable=True),
+    sa.Column('resumen_hasta_id', sa.Integer(), nullable=True),
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuario.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_conversacion_usuario_id_id', 'conversacion', ['usuario_id', 'id'], unique=False)
+    op.create_table('mensajeconversacion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('conversacion_id', sa.Integer(), nullable=False),
+    sa.Column('rol', sa.String(length=10), nullable=False),
+    sa.Column('contenido', sa.Text(), nullable=False),
+    sa.Column('tokens', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['conversacion_id'], ['conversacion.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_mensajeconversacion_conversacion_id_id', 'mensajeconversacion', ['conversacion_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_mensajeconversacion_conversacion_id_id', table_name='mensajeconversacion')
+    op.drop_table('mensajeconversacion')
+    op.drop_index('ix_conversacion_usuario_id_id', table_name='conversacion')
+    op.drop_table('conversacion')
@@ -0,0 +1,38 @@
+"""versiones para etags
+
+Revision ID: e5a8c3b1f702
+Revises: d7e2f9a4b613
+Create Date: 2026-10-18 17:42:10.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a8c3b1f702'
+down_revision: Union[str, Sequence[str], None] = 'd7e2f9a4b613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('receta', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('receta', sa.Column('actualizada_en', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.add_column('usuario', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('usuario', sa.Column('actualizado_en', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    op.add_column('usuario', sa.Column('version_recetas', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('usuario', sa.Column('recetas_actualizadas_en', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('usuario', 'recetas_actualizadas_en')
+    op.drop_column('usuario', 'version_recetas')
+    op.drop_column('usuario', 'actualizado_en')
+    op.drop_column('usuario', 'version')
+    op.drop_column('receta', 'actualizada_en')
+    op.drop_column('receta', 'version')
@@ -0,0 +1,37 @@
+"""ingredientes on delete cascade
+
+Revision ID: f1b7d2c9e403
+Revises: e5a8c3b1f702
+Create Date: 2026-10-19 10:12:37.504118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b7d2c9e403'
+down_revision: Union[str, Sequence[str], None] = 'e5a8c3b1f702'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nombre que MySQL dio a la FK creada sin nombre en la migración inicial
+    op.drop_constraint('ingredientefaltantereceta_ibfk_1', 'ingredientefaltantereceta', type_='foreignkey')
+    op.create_foreign_key(
+        'ingredientefaltantereceta_ibfk_1', 'ingredientefaltantereceta', 'receta',
+        ['receta_id'], ['id'], ondelete='CASCADE',
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('ingredientefaltantereceta_ibfk_1', 'ingredientefaltantereceta', type_='foreignkey')
+    op.create_foreign_key(
+        'ingredientefaltantereceta_ibfk_1', 'ingredientefaltantereceta', 'receta',
+        ['receta_id'], ['id'],
+    )
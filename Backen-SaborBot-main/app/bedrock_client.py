@@ -3,12 +3,19 @@
 # app/bedrock_client.py
 import os
 import json
+import time
+import threading
+from contextlib import contextmanager
 import boto3
-from botocore.exceptions import ClientError
 from botocore.config import Config
 from datetime import datetime
 import base64 # Necesario para decodificar la imagen
+from typing import Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from app.bedrock_scheduler import bedrock_scheduler, INTERACTIVE
+from app.bedrock_errors import BedrockError, BedrockEmptyResponseError, BedrockTimeoutError, BedrockUnavailableError
+from app import metrics
 load_dotenv() 
 
 # --- CONFIGURACIÓN DE AWS ---
@@ -20,52 +27,209 @@ TITAN_IMAGE_MODEL_ID = "amazon.titan-image-generator-v1" # ID para el modelo de
 MY_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID", "")
 MY_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY", "")
 
-# Configuración base de Boto3
-my_config = Config(
-    connect_timeout=10, 
-    read_timeout=120, 
-    retries={'max_attempts': 1}
-)
+# Endpoint alternativo (p. ej. un stub local para pruebas); None usa el de AWS
+BEDROCK_ENDPOINT_URL = os.getenv("BEDROCK_ENDPOINT_URL") or None
+# Conexiones HTTP reutilizables por cliente (una por llamada concurrente)
+BEDROCK_MAX_POOL_CONNECTIONS = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "50"))
 
-# La función invoke_bedrock (para texto) se mantiene igual
-def invoke_bedrock(prompt: str, max_tokens: int = 512, temperature: float = 0.7) -> str:
+# Cuotas por modelo para el planificador (peticiones/minuto y concurrencia inicial/máxima)
+NOVA_LITE_RPM = float(os.getenv("NOVA_LITE_RPM", "200"))
+NOVA_LITE_CONCURRENCY = int(os.getenv("NOVA_LITE_CONCURRENCY", "8"))
+NOVA_LITE_MAX_CONCURRENCY = int(os.getenv("NOVA_LITE_MAX_CONCURRENCY", "32"))
+TITAN_IMAGE_RPM = float(os.getenv("TITAN_IMAGE_RPM", "60"))
+TITAN_IMAGE_CONCURRENCY = int(os.getenv("TITAN_IMAGE_CONCURRENCY", "2"))
+TITAN_IMAGE_MAX_CONCURRENCY = int(os.getenv("TITAN_IMAGE_MAX_CONCURRENCY", "6"))
+
+# Familias de modelos: cada una tiene su propio cliente y pool de conexiones
+TEXT_FAMILY = "text"
+IMAGE_FAMILY = "image"
+MODEL_FAMILIES = (TEXT_FAMILY, IMAGE_FAMILY)
+
+# Timeouts de socket por familia. En el stream de texto read_timeout es la espera
+# máxima entre fragmentos (incluido el primero); Titan entrega la imagen de una vez
+BEDROCK_CONNECT_TIMEOUT = float(os.getenv("BEDROCK_CONNECT_TIMEOUT", "5"))
+BEDROCK_TEXT_READ_TIMEOUT = float(os.getenv("BEDROCK_TEXT_READ_TIMEOUT", "20"))
+BEDROCK_IMAGE_READ_TIMEOUT = float(os.getenv("BEDROCK_IMAGE_READ_TIMEOUT", "60"))
+
+
+def _client_config(read_timeout: float) -> Config:
+    # Sin reintentos de botocore: los reintentos (con jitter y plazo) y el control de
+    # tasa los hace app/bedrock_scheduler.py, que ve todas las llamadas del proceso
+    return Config(
+        connect_timeout=BEDROCK_CONNECT_TIMEOUT,
+        read_timeout=read_timeout,
+        retries={'max_attempts': 1, 'mode': 'standard'},
+        max_pool_connections=BEDROCK_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=True,
+    )
+
+
+FAMILY_CONFIGS = {
+    TEXT_FAMILY: _client_config(BEDROCK_TEXT_READ_TIMEOUT),
+    IMAGE_FAMILY: _client_config(BEDROCK_IMAGE_READ_TIMEOUT),
+}
+
+
+class BedrockClientManager:
     """
-    Invoca Amazon Bedrock (Nova Lite) con un contexto de chatbot de cocina.
+    Mantiene un cliente bedrock-runtime compartido por familia de modelos.
+
+    Los clientes de boto3 son thread-safe, así que se crean una sola vez y se
+    reutilizan desde el threadpool; así se evita resolver credenciales y
+    endpoint y abrir un TLS nuevo en cada petición.
     """
-    try:
-        client = boto3.client(
-            "bedrock-runtime",
+
+    def __init__(self, endpoint_url: str | None = None, configs: dict | None = None):
+        self._endpoint_url = endpoint_url
+        self._configs = dict(configs or FAMILY_CONFIGS)
+        self._lock = threading.Lock()
+        self._clients: dict = {}
+        self._in_use = {family: 0 for family in MODEL_FAMILIES}
+        self._peak = {family: 0 for family in MODEL_FAMILIES}
+        self._calls = {family: 0 for family in MODEL_FAMILIES}
+
+    def configure(self, endpoint_url: str | None = None, config: Config | None = None) -> None:
+        """Cambia endpoint/configuración (p. ej. un stub local) y descarta los clientes creados."""
+        with self._lock:
+            self._endpoint_url = endpoint_url
+            if config is not None:
+                self._configs = {family: config for family in MODEL_FAMILIES}
+            self._clients.clear()
+
+    def _build_client(self, family: str):
+        # boto3.Session no es thread-safe: los clientes se crean siempre bajo el lock
+        session = boto3.session.Session(
+            aws_access_key_id=MY_ACCESS_KEY or None,
+            aws_secret_access_key=MY_SECRET_KEY or None,
             region_name=AWS_REGION,
-            aws_access_key_id=MY_ACCESS_KEY,
-            aws_secret_access_key=MY_SECRET_KEY,
-            config=my_config # Usando la configuración definida globalmente
         )
-    except ClientError as e:
-        print(f"Error al inicializar el cliente de Bedrock: {e}")
-        return "Error de conexión con AWS Bedrock. Verifica credenciales y región."
-        
-    system_list = [
-        {"text": "Eres un asistente de cocina amable y experto. Responde a todas las preguntas del usuario relacionadas con recetas, ingredientes, técnicas de cocina y consejos culinarios. Responde de forma concisa y útil."}
-    ]
-    message_list = [{"role": "user", "content": [{"text": prompt}]}]
+        return session.client("bedrock-runtime", endpoint_url=self._endpoint_url, config=self._configs[family])
+
+    def get(self, family: str):
+        """Devuelve el cliente de la familia, creándolo la primera vez."""
+        client = self._clients.get(family)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(family)
+                if client is None:
+                    client = self._build_client(family)
+                    self._clients[family] = client
+        return client
+
+    def warm(self) -> None:
+        """Crea todos los clientes por adelantado (se llama al arrancar la API)."""
+        for family in MODEL_FAMILIES:
+            self.get(family)
+
+    @contextmanager
+    def lease(self, family: str):
+        """Entrega el cliente de la familia y contabiliza la conexión mientras se usa."""
+        client = self.get(family)
+        with self._lock:
+            self._in_use[family] += 1
+            self._calls[family] += 1
+            self._peak[family] = max(self._peak[family], self._in_use[family])
+        try:
+            yield client
+        finally:
+            with self._lock:
+                self._in_use[family] -= 1
+
+    def stats(self) -> dict:
+        """Uso del pool de conexiones por familia de modelos."""
+        with self._lock:
+            stats = {}
+            for family in MODEL_FAMILIES:
+                max_pool = self._configs[family].max_pool_connections or 10
+                stats[family] = {
+                    "initialized": family in self._clients,
+                    "in_use": self._in_use[family],
+                    "peak_in_use": self._peak[family],
+                    "max_pool_connections": max_pool,
+                    "utilization": round(self._in_use[family] / max_pool, 3),
+                    "calls": self._calls[family],
+                }
+            return stats
+
+
+client_manager = BedrockClientManager(endpoint_url=BEDROCK_ENDPOINT_URL)
+
+bedrock_scheduler.register(LITE_TEXT_MODEL_ID, NOVA_LITE_RPM, NOVA_LITE_CONCURRENCY, NOVA_LITE_MAX_CONCURRENCY)
+bedrock_scheduler.register(TITAN_IMAGE_MODEL_ID, TITAN_IMAGE_RPM, TITAN_IMAGE_CONCURRENCY, TITAN_IMAGE_MAX_CONCURRENCY)
+
+# Parámetros por defecto de las respuestas del chat
+DEFAULT_MAX_TOKENS = 512
+DEFAULT_TEMPERATURE = 0.7
+
+SYSTEM_PROMPT = "Eres un asistente de cocina amable y experto. Responde a todas las preguntas del usuario relacionadas con recetas, ingredientes, técnicas de cocina y consejos culinarios. Responde de forma concisa y útil."
+
+
+def _build_text_request(
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    system_prompt: str = SYSTEM_PROMPT,
+    history: Optional[List[dict]] = None,
+) -> dict:
+    """Arma el body de la petición para Nova Lite (history: turnos previos {"role", "text"})."""
+    system_list = [{"text": system_prompt}]
+    message_list = [{"role": m["role"], "content": [{"text": m["text"]}]} for m in history or []]
+    message_list.append({"role": "user", "content": [{"text": prompt}]})
     inf_params = {"maxTokens": max_tokens, "topP": 0.9, "topK": 20, "temperature": temperature}
 
-    request_body = {
+    return {
         "schemaVersion": "messages-v1",
         "messages": message_list,
         "system": system_list,
         "inferenceConfig": inf_params,
     }
 
+
+def _outcome(e: BedrockError) -> str:
+    """Etiqueta `outcome` de las métricas de Bedrock para un error."""
+    if isinstance(e, BedrockTimeoutError):
+        return "timeout"
+    if isinstance(e, BedrockUnavailableError):
+        return "unavailable"
+    return "error"
+
+
+def stream_bedrock(
+    prompt: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    temperature: float = DEFAULT_TEMPERATURE,
+    system_prompt: str = SYSTEM_PROMPT,
+    priority: int = INTERACTIVE,
+    history: Optional[List[dict]] = None,
+    deadline: Optional[float] = None,
+) -> Iterator[str]:
+    """
+    Invoca Nova Lite en modo streaming y va entregando cada fragmento de texto
+    (contentBlockDelta) en cuanto llega, sin esperar a la respuesta completa.
+
+    `deadline` (time.monotonic()) es el plazo de la petición HTTP: cubre la cola,
+    los reintentos y la lectura del stream. Lanza BedrockError (o una subclase)
+    si la invocación falla, el circuito está abierto o se agota el plazo.
+    """
+    body = json.dumps(_build_text_request(prompt, max_tokens, temperature, system_prompt, history))
+    client = client_manager.get(TEXT_FAMILY)
+    # Los tiempos incluyen la espera en el planificador: es la latencia que percibe el usuario
+    start, first_token, outcome = time.perf_counter(), True, "error"
     try:
-        response = client.invoke_model_with_response_stream(
-            modelId=LITE_TEXT_MODEL_ID, # Usar el ID del modelo de texto
-            body=json.dumps(request_body)
-        )
-        stream = response.get("body")
-        full_response_text = ""
-        if stream:
+        # El cupo del planificador y la conexión quedan ocupados mientras dure el stream
+        with bedrock_scheduler.invoke(
+            LITE_TEXT_MODEL_ID,
+            lambda: client.invoke_model_with_response_stream(modelId=LITE_TEXT_MODEL_ID, body=body),
+            priority=priority,
+            deadline=deadline,
+        ) as response, client_manager.lease(TEXT_FAMILY):
+            stream = response.get("body")
+            if not stream:
+                outcome = "empty"
+                return
             for event in stream:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise BedrockTimeoutError("Se agotó el plazo de la petición leyendo la respuesta del modelo")
                 chunk = event.get("chunk")
                 if chunk:
                     chunk_json = json.loads(chunk.get("bytes").decode())
@@ -73,17 +237,142 @@ def invoke_bedrock(prompt: str, max_tokens: int = 512, temperature: float = 0.7)
                     if content_block_delta:
                         text_chunk = content_block_delta.get("delta").get("text")
                         if text_chunk:
-                            full_response_text += text_chunk
-            return full_response_text.strip()
-        else:
-            return "No se recibió respuesta del modelo de texto."
-            
-    except ClientError as e:
-        error_message = f"Error al invocar el modelo de Bedrock (texto): {e}"
-        print(error_message)
-        return error_message
-
-# --- NUEVA FUNCIÓN PARA GENERAR IMÁGENES ---
+                            if first_token:
+                                metrics.bedrock_time_to_first_token.observe(time.perf_counter() - start, model=LITE_TEXT_MODEL_ID)
+                                first_token = False
+                            metrics.bedrock_output_chars.inc(len(text_chunk), model=LITE_TEXT_MODEL_ID)
+                            yield text_chunk
+            outcome = "ok"
+    except GeneratorExit:
+        # El cliente dejó de leer (p. ej. cerró la conexión del stream)
+        outcome = "cancelled"
+        raise
+    except BedrockError as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        metrics.observe_bedrock(LITE_TEXT_MODEL_ID, start, outcome)
+
+
+def invoke_bedrock(
+    prompt: str,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    temperature: float = DEFAULT_TEMPERATURE,
+    system_prompt: str = SYSTEM_PROMPT,
+    priority: int = INTERACTIVE,
+    history: Optional[List[dict]] = None,
+    deadline: Optional[float] = None,
+) -> str:
+    """
+    Invoca Amazon Bedrock (Nova Lite) con un contexto de chatbot de cocina.
+    Devuelve la respuesta completa una vez terminado el stream.
+    Lanza BedrockError (ver stream_bedrock) o BedrockEmptyResponseError si no hay texto.
+    """
+    full_response_text = "".join(stream_bedrock(
+        prompt, max_tokens=max_tokens, temperature=temperature, system_prompt=system_prompt,
+        priority=priority, history=history, deadline=deadline,
+    )).strip()
+    if not full_response_text:
+        raise BedrockEmptyResponseError("No se recibió respuesta del modelo de texto.")
+    return full_response_text
+
+# --- GENERACIÓN DE IMÁGENES ---
+
+# Titan G1 acepta como máximo 5 imágenes por invocación
+TITAN_MAX_IMAGES_PER_CALL = 5
+# Invocaciones paralelas al repartir lotes grandes
+TITAN_BATCH_CONCURRENCY = int(os.getenv("TITAN_BATCH_CONCURRENCY", "3"))
+# Tamaños admitidos por Titan G1 que exponemos (vistas previas y final)
+TITAN_SIZES = {
+    "small": (512, 512),
+    "medium": (768, 768),
+    "large": (1024, 1024),
+}
+TITAN_MAX_SEED = 2147483646
+
+
+def _invoke_titan(
+    prompt: str, count: int, seed: int, cfg_scale: float, quality: str, width: int, height: int,
+    priority: int = INTERACTIVE, deadline: Optional[float] = None,
+) -> List[str]:
+    """Una sola invocación de Titan que devuelve `count` imágenes en Base64. Lanza BedrockError."""
+    # Estructura del body para Titan Image Generator G1
+    request_body = {
+        "taskType": "TEXT_IMAGE",
+        "textToImageParams": {
+            "text": prompt
+        },
+        "imageGenerationConfig": {
+            "numberOfImages": count,
+            "quality": quality,
+            "cfgScale": cfg_scale,
+            "seed": seed,
+            "width": width,
+            "height": height
+        }
+    }
+
+    def invoke() -> List[str]:
+        with client_manager.lease(IMAGE_FAMILY) as client:
+            response = client.invoke_model(
+                modelId=TITAN_IMAGE_MODEL_ID,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(request_body)
+            )
+            response_body = json.loads(response.get("body").read())
+        return response_body["images"]
+
+    # El planificador reintenta la invocación completa si Titan responde con throttling
+    start, outcome = time.perf_counter(), "error"
+    try:
+        images = bedrock_scheduler.call(TITAN_IMAGE_MODEL_ID, invoke, priority=priority, deadline=deadline)
+        outcome = "ok"
+        return images
+    except BedrockError as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        metrics.observe_bedrock(TITAN_IMAGE_MODEL_ID, start, outcome)
+
+
+def generate_images_with_titan(
+    prompt: str,
+    count: int = 1,
+    seed: int = 0,
+    cfg_scale: float = 7.0,
+    quality: str = "standard",
+    width: int = 1024,
+    height: int = 1024,
+    priority: int = INTERACTIVE,
+    deadline: Optional[float] = None,
+) -> List[str]:
+    """
+    Genera `count` variantes de una imagen con Titan Image Generator G1.
+
+    Hasta TITAN_MAX_IMAGES_PER_CALL se piden en una sola invocación
+    (numberOfImages); por encima se reparten en invocaciones paralelas con
+    semillas distintas (máx. TITAN_BATCH_CONCURRENCY a la vez).
+    Devuelve las imágenes en Base64. Lanza BedrockError si falla alguna invocación.
+    """
+    if count <= TITAN_MAX_IMAGES_PER_CALL:
+        return _invoke_titan(prompt, count, seed, cfg_scale, quality, width, height, priority, deadline)
+
+    chunks = [
+        min(TITAN_MAX_IMAGES_PER_CALL, count - start)
+        for start in range(0, count, TITAN_MAX_IMAGES_PER_CALL)
+    ]
+    with ThreadPoolExecutor(max_workers=min(TITAN_BATCH_CONCURRENCY, len(chunks))) as executor:
+        futures = [
+            executor.submit(
+                _invoke_titan, prompt, chunk, (seed + i) % TITAN_MAX_SEED, cfg_scale, quality, width, height,
+                priority, deadline,
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+        return [image for future in futures for image in future.result()]
+
+
 def generate_image_with_titan(
     prompt: str, 
     seed: int = 0, 
@@ -91,7 +380,9 @@ def generate_image_with_titan(
     quality: str = "standard", 
     width: int = 1024, 
     height: int = 1024,
-    output_image_path: str = None # Path para guardar la imagen # type: ignore
+    output_image_path: str = None, # Path para guardar la imagen # type: ignore
+    priority: int = INTERACTIVE,
+    deadline: Optional[float] = None,
 ) -> str:
     """
     Genera una imagen usando Amazon Titan Image Generator G1.
@@ -104,65 +395,22 @@ def generate_image_with_titan(
     :param height: Alto de la imagen.
     :param output_image_path: Ruta del archivo donde guardar la imagen (e.g., "imagen_generada.png").
                                Si es None, devuelve la imagen en Base64.
+    :param priority: Carril del planificador (INTERACTIVE o BACKGROUND).
+    :param deadline: Plazo de la petición (time.monotonic()); None usa el del carril.
     :return: Si output_image_path es None, devuelve la imagen codificada en Base64.
              Si se proporciona output_image_path, devuelve la ruta del archivo.
-             En caso de error, devuelve un mensaje de error.
+    :raises BedrockError: Si Titan falla, el circuito está abierto o se agota el plazo.
     """
-    try:
-        client = boto3.client(
-            "bedrock-runtime",
-            aws_access_key_id=MY_ACCESS_KEY,
-            aws_secret_access_key=MY_SECRET_KEY,
-            region_name=AWS_REGION,
-            config=my_config # Usando la configuración definida globalmente
-        )
-    except ClientError as e:
-        print(f"Error al inicializar el cliente de Bedrock para imagen: {e}")
-        return "Error de conexión con AWS Bedrock para imagen. Verifica credenciales y región."
-
-    # Estructura del body para Titan Image Generator G1
-    request_body = {
-        "taskType": "TEXT_IMAGE",
-        "textToImageParams": {
-            "text": prompt
-        },
-        "imageGenerationConfig": {
-            "numberOfImages": 1, # Solo generamos una imagen por solicitud para este ejemplo
-            "quality": quality,
-            "cfgScale": cfg_scale,
-            "seed": seed,
-            "width": width,
-            "height": height
-        }
-    }
-
-    try:
-        response = client.invoke_model(
-            modelId=TITAN_IMAGE_MODEL_ID,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(request_body)
-        )
+    # Las imágenes vienen en una lista, incluso si solo pedimos una
+    base64_image_data = generate_images_with_titan(
+        prompt, count=1, seed=seed, cfg_scale=cfg_scale, quality=quality, width=width, height=height,
+        priority=priority, deadline=deadline,
+    )[0]
 
-        response_body = json.loads(response.get("body").read())
-        
-        # Las imágenes vienen en una lista, incluso si solo pedimos una
-        base64_image_data = response_body["images"][0] 
-        
-        if output_image_path:
-            # Decodifica y guarda la imagen si se proporciona una ruta
-            with open(output_image_path, "wb") as f:
-                f.write(base64.b64decode(base64_image_data))
-            return output_image_path
-        else:
-            # Si no se da una ruta, devuelve los datos Base64
-            return base64_image_data
-
-    except ClientError as e:
-        error_message = f"Error al invocar el modelo de Bedrock (imagen): {e}"
-        print(error_message)
-        return error_message
-    except Exception as e:
-        error_message = f"Error inesperado al generar la imagen: {e}"
-        print(error_message)
-        return error_message
\ No newline at end of file
+    if output_image_path:
+        # Decodifica y guarda la imagen si se proporciona una ruta
+        with open(output_image_path, "wb") as f:
+            f.write(base64.b64decode(base64_image_data))
+        return output_image_path
+    # Si no se da una ruta, devuelve los datos Base64
+    return base64_image_data
@@ -0,0 +1,72 @@
+# app/bedrock_errors.py
+# Errores tipados de las llamadas a Bedrock. Reemplazan a los mensajes de error
+# devueltos como texto: quien llama decide si reintenta, degrada o responde 5xx.
+from typing import Optional
+
+from botocore.exceptions import BotoCoreError, ClientError, ConnectTimeoutError, ReadTimeoutError
+
+# Errores que indican que Bedrock está saturado (reducen el límite y se reintentan)
+THROTTLING_CODES = {
+    "ThrottlingException", "throttlingException",
+    "TooManyRequestsException", "ServiceQuotaExceededException",
+    "ServiceUnavailableException", "serviceUnavailableException",
+}
+# Errores transitorios que se reintentan sin tocar el límite
+TRANSIENT_CODES = {
+    "InternalServerException", "internalServerException",
+    "ModelNotReadyException", "ModelTimeoutException", "modelStreamErrorException",
+}
+
+
+def error_code(e: ClientError) -> str:
+    return e.response.get("Error", {}).get("Code", "")
+
+
+class BedrockError(Exception):
+    """Fallo al invocar un modelo de Bedrock."""
+
+    # Código HTTP con el que la API informa el error
+    status_code = 502
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BedrockUnavailableError(BedrockError):
+    """Bedrock no responde: circuito abierto, servicio caído o sin conexión."""
+    status_code = 503
+
+
+class BedrockThrottledError(BedrockError):
+    """Cuota de Bedrock agotada incluso después de reintentar."""
+    status_code = 503
+
+
+class BedrockTimeoutError(BedrockError):
+    """Se agotó el plazo de la petición (cola, reintentos o lectura del modelo)."""
+    status_code = 504
+
+
+class BedrockEmptyResponseError(BedrockError):
+    """El modelo respondió sin contenido."""
+
+
+def translate_error(e: Exception) -> BedrockError:
+    """Convierte un error de botocore en el BedrockError correspondiente."""
+    if isinstance(e, BedrockError):
+        return e
+    if isinstance(e, ClientError):
+        code = error_code(e)
+        if code in THROTTLING_CODES:
+            return BedrockThrottledError(f"Bedrock sin cuota disponible ({code})")
+        if code == "ModelTimeoutException":
+            return BedrockTimeoutError(f"El modelo no respondió a tiempo ({code})")
+        if code in TRANSIENT_CODES:
+            return BedrockUnavailableError(f"Bedrock no está disponible ({code})")
+        return BedrockError(f"Error al invocar el modelo de Bedrock: {e}")
+    if isinstance(e, (ReadTimeoutError, ConnectTimeoutError)):
+        return BedrockTimeoutError(f"Bedrock no respondió a tiempo: {e}")
+    if isinstance(e, BotoCoreError):
+        return BedrockUnavailableError(f"Sin conexión con Bedrock: {e}")
+    return BedrockError(f"Error inesperado al invocar Bedrock: {e}")
@@ -0,0 +1,310 @@
+# app/bedrock_scheduler.py
+# Planificador de llamadas a Bedrock: limita la tasa y la concurrencia por modelo
+# y reintenta con jitter cuando Bedrock responde con throttling.
+#
+# - Token bucket por modelo: no supera las peticiones/minuto de la cuota.
+# - Concurrencia adaptativa (AIMD): el límite sube +1 por "ventana" de
+#   llamadas correctas y se multiplica por BEDROCK_AIMD_DECREASE al recibir
+#   un ThrottlingException, así converge a lo que Bedrock admite en cada momento.
+# - Carriles de prioridad: el chat (interactivo) pasa delante de los trabajos
+#   en segundo plano, que además solo pueden ocupar una parte de los cupos.
+# - Plazos: cada llamada tiene un deadline que cubre la espera en cola y los
+#   reintentos; si no cabe otro intento se falla en lugar de seguir esperando.
+#   La API puede pasar el plazo de la petición HTTP (parámetro deadline).
+# - Circuit breaker por modelo (app/circuit_breaker.py): con el circuito
+#   abierto se falla al instante sin hacer cola.
+# - Los errores de botocore salen traducidos a BedrockError (app/bedrock_errors.py).
+#
+# Las llamadas a Bedrock son bloqueantes (boto3) y se ejecutan en hilos, por
+# eso todo se sincroniza con threading y no con asyncio.
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, TypeVar
+
+from botocore.exceptions import BotoCoreError, ClientError
+from dotenv import load_dotenv
+
+from app.bedrock_errors import (
+    BedrockTimeoutError, THROTTLING_CODES, TRANSIENT_CODES, error_code, translate_error,
+)
+from app.circuit_breaker import CircuitBreaker
+load_dotenv()
+
+T = TypeVar("T")
+
+# Carriles de prioridad (menor = más prioritario)
+INTERACTIVE = 0
+BACKGROUND = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+# Intentos totales por llamada (botocore no reintenta: los reintentos son de este módulo)
+BEDROCK_MAX_ATTEMPTS = int(os.getenv("BEDROCK_MAX_ATTEMPTS", "4"))
+# Backoff exponencial con full jitter: uniforme en [0, min(cap, base * 2^intento)]
+BEDROCK_BACKOFF_BASE = float(os.getenv("BEDROCK_BACKOFF_BASE", "0.5"))
+BEDROCK_BACKOFF_CAP = float(os.getenv("BEDROCK_BACKOFF_CAP", "8"))
+# Plazo (segundos) para conseguir turno y reintentar, por carril
+BEDROCK_INTERACTIVE_DEADLINE = float(os.getenv("BEDROCK_INTERACTIVE_DEADLINE", "30"))
+BEDROCK_BACKGROUND_DEADLINE = float(os.getenv("BEDROCK_BACKGROUND_DEADLINE", "600"))
+# Fracción de los cupos que pueden ocupar las llamadas en segundo plano
+BEDROCK_BACKGROUND_SHARE = float(os.getenv("BEDROCK_BACKGROUND_SHARE", "0.5"))
+# Factor de reducción del límite ante throttling y tiempo mínimo entre reducciones
+BEDROCK_AIMD_DECREASE = float(os.getenv("BEDROCK_AIMD_DECREASE", "0.5"))
+BEDROCK_AIMD_COOLDOWN = float(os.getenv("BEDROCK_AIMD_COOLDOWN", "2"))
+
+
+class SchedulerTimeout(BedrockTimeoutError):
+    """No se obtuvo turno (o no quedaba plazo para reintentar) antes del deadline."""
+
+
+class TokenBucket:
+    """Limita la tasa de llamadas: `rate` por segundo con ráfagas de hasta `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                raise SchedulerTimeout("Se agotó el plazo esperando cuota de Bedrock")
+            time.sleep(wait)
+
+    def tokens(self) -> float:
+        with self._lock:
+            return round(self._tokens, 2)
+
+
+class ModelScheduler:
+    """Cola con prioridad, token bucket y límite de concurrencia AIMD de un modelo."""
+
+    def __init__(self, model_id: str, rpm: float, initial_concurrency: int, max_concurrency: int):
+        self.model_id = model_id
+        self.bucket = TokenBucket(rate=rpm / 60.0, burst=max(1.0, min(rpm / 60.0 * 5, float(max_concurrency))))
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(initial_concurrency, max_concurrency))
+        self.breaker = CircuitBreaker(model_id)
+        self._cond = threading.Condition()
+        self._waiters: list = []  # heap de (prioridad, secuencia)
+        self._seq = itertools.count()
+        self._in_flight = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._last_decrease = 0.0
+        self._stats = {
+            "calls": 0, "throttled": 0, "retries": 0, "deadline_exceeded": 0,
+            "wait_count": 0, "wait_total_s": 0.0, "wait_max_s": 0.0,
+        }
+
+    # --- Cupos de concurrencia ---
+
+    def _can_run(self, priority: int) -> bool:
+        in_flight = sum(self._in_flight.values())
+        if in_flight >= int(self.limit):
+            return False
+        if priority == BACKGROUND:
+            return self._in_flight[BACKGROUND] < max(1, int(self.limit * BEDROCK_BACKGROUND_SHARE))
+        return True
+
+    def acquire(self, priority: int, deadline: float) -> None:
+        start = time.monotonic()
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                # Solo avanza el primero de la cola (orden por carril y luego FIFO)
+                while self._waiters[0] != ticket or not self._can_run(priority):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["deadline_exceeded"] += 1
+                        raise SchedulerTimeout(f"Se agotó el plazo en la cola de {self.model_id}")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+            self._in_flight[priority] += 1
+            waited = time.monotonic() - start
+            self._stats["wait_count"] += 1
+            self._stats["wait_total_s"] += waited
+            self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+
+    def release(self, priority: int, throttled: bool = False, success: bool = True) -> None:
+        with self._cond:
+            self._in_flight[priority] -= 1
+            self._stats["calls"] += 1
+            now = time.monotonic()
+            if throttled:
+                self._stats["throttled"] += 1
+                # Una sola reducción por ventana: varias respuestas 429 simultáneas son la misma señal
+                if now - self._last_decrease >= BEDROCK_AIMD_COOLDOWN:
+                    self.limit = max(1.0, self.limit * BEDROCK_AIMD_DECREASE)
+                    self._last_decrease = now
+            elif success:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def record_retry(self) -> None:
+        with self._cond:
+            self._stats["retries"] += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = {LANE_NAMES[p]: 0 for p in LANE_NAMES}
+            for priority, _ in self._waiters:
+                queued[LANE_NAMES[priority]] += 1
+            stats = dict(self._stats)
+            wait_count = stats.pop("wait_count")
+            wait_total = stats.pop("wait_total_s")
+            return {
+                "limit": round(self.limit, 2),
+                "max_concurrency": self.max_concurrency,
+                "in_flight": {LANE_NAMES[p]: n for p, n in self._in_flight.items()},
+                "queued": queued,
+                "tokens": self.bucket.tokens(),
+                "wait_avg_ms": round(wait_total / wait_count * 1000, 1) if wait_count else 0.0,
+                "wait_max_ms": round(stats.pop("wait_max_s") * 1000, 1),
+                "breaker": self.breaker.stats(),
+                **stats,
+            }
+
+
+class BedrockScheduler:
+    """Reparte las llamadas de cada modelo a su ModelScheduler y aplica la política de reintentos."""
+
+    def __init__(self):
+        self._models: dict[str, ModelScheduler] = {}
+        self._lock = threading.Lock()
+
+    def register(self, model_id: str, rpm: float, initial_concurrency: int, max_concurrency: int) -> None:
+        with self._lock:
+            self._models[model_id] = ModelScheduler(model_id, rpm, initial_concurrency, max_concurrency)
+
+    def _get(self, model_id: str) -> ModelScheduler:
+        scheduler = self._models.get(model_id)
+        if scheduler is None:
+            raise KeyError(f"Modelo sin registrar en el planificador: {model_id}")
+        return scheduler
+
+    @staticmethod
+    def _deadline(priority: int, timeout: Optional[float]) -> float:
+        if timeout is None:
+            timeout = BEDROCK_INTERACTIVE_DEADLINE if priority == INTERACTIVE else BEDROCK_BACKGROUND_DEADLINE
+        return time.monotonic() + timeout
+
+    @contextmanager
+    def invoke(
+        self,
+        model_id: str,
+        fn: Callable[[], T],
+        priority: int = INTERACTIVE,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> Iterator[T]:
+        """
+        Ejecuta `fn` cuando el modelo tiene turno, reintentando ante throttling.
+        El cupo sigue ocupado mientras dure el bloque `with` (para consumir un stream).
+        Lanza CircuitOpenError sin esperar si el circuito está abierto, SchedulerTimeout
+        si se agota el plazo y el BedrockError correspondiente si la llamada falla.
+        """
+        scheduler = self._get(model_id)
+        probe = scheduler.breaker.enter()
+        own_deadline = self._deadline(priority, timeout)
+        # El plazo de la petición HTTP (time.monotonic()) solo puede acortar el del carril
+        deadline = own_deadline if deadline is None else min(own_deadline, deadline)
+        # Para el circuito: True si Bedrock respondió, False si falló, None si no cuenta
+        ok: Optional[bool] = None
+        try:
+            attempt = 0
+            while True:
+                scheduler.acquire(priority, deadline)
+                try:
+                    scheduler.bucket.acquire(deadline)
+                    result = fn()
+                except SchedulerTimeout:
+                    scheduler.release(priority, success=False)
+                    raise
+                except ClientError as e:
+                    code = error_code(e)
+                    throttled = code in THROTTLING_CODES
+                    scheduler.release(priority, throttled=throttled, success=False)
+                    attempt += 1
+                    if not (throttled or code in TRANSIENT_CODES):
+                        # Bedrock respondió: el error es de la petición (p. ej. validación)
+                        ok = True
+                        raise translate_error(e) from e
+                    backoff = random.uniform(0, min(BEDROCK_BACKOFF_CAP, BEDROCK_BACKOFF_BASE * 2 ** attempt))
+                    if attempt >= BEDROCK_MAX_ATTEMPTS or time.monotonic() + backoff > deadline:
+                        # Sin tiempo para reintentar por el plazo de la petición: no cuenta como fallo
+                        ok = False if attempt >= BEDROCK_MAX_ATTEMPTS or deadline >= own_deadline else None
+                        raise translate_error(e) from e
+                    scheduler.record_retry()
+                    time.sleep(backoff)
+                    continue
+                except BotoCoreError as e:
+                    # Timeouts de conexión/lectura o endpoint inalcanzable
+                    scheduler.release(priority, success=False)
+                    ok = False
+                    raise translate_error(e) from e
+                except BaseException:
+                    scheduler.release(priority, success=False)
+                    raise
+                break
+
+            throttled, success = False, True
+            try:
+                yield result
+                ok = True
+            except ClientError as e:
+                # Un stream también puede cortarse con throttling a mitad de la respuesta
+                code = error_code(e)
+                throttled, success = code in THROTTLING_CODES, False
+                ok = not (throttled or code in TRANSIENT_CODES)
+                raise translate_error(e) from e
+            except BotoCoreError as e:
+                success, ok = False, False
+                raise translate_error(e) from e
+            except BedrockTimeoutError:
+                # Plazo agotado a mitad del stream. Solo cuenta para el circuito si venció
+                # el del carril: un plazo más corto fijado por la petición (p. ej. con
+                # X-Request-Timeout) no indica que Bedrock esté degradado
+                success = False
+                ok = False if time.monotonic() >= own_deadline else None
+                raise
+            finally:
+                scheduler.release(priority, throttled=throttled, success=success)
+        finally:
+            scheduler.breaker.exit(ok, probe)
+
+    def call(
+        self,
+        model_id: str,
+        fn: Callable[[], T],
+        priority: int = INTERACTIVE,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """Como invoke(), para llamadas que terminan al devolver `fn`."""
+        with self.invoke(model_id, fn, priority=priority, timeout=timeout, deadline=deadline) as result:
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = dict(self._models)
+        return {model_id: scheduler.stats() for model_id, scheduler in models.items()}
+
+
+bedrock_scheduler = BedrockScheduler()
@@ -0,0 +1,234 @@
+# app/cache.py
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import redis  # Opcional: solo si se configura la caché compartida
+except ImportError:  # pragma: no cover
+    redis = None
+
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1024"))
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "3600"))
+# Umbral de similitud (0-1) para reutilizar prompts casi iguales; 0 lo desactiva
+PROMPT_CACHE_SIMILARITY = float(os.getenv("PROMPT_CACHE_SIMILARITY", "0"))
+PROMPT_CACHE_REDIS_URL = os.getenv("PROMPT_CACHE_REDIS_URL", "")
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Caché LRU en memoria con expiración por entrada. Thread-safe."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item # type: ignore
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> list:
+        """Copia de las entradas vigentes (clave, valor)."""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (expires_at, value) in self._data.items() if expires_at >= now]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CacheBackend(ABC):
+    """Interfaz del nivel compartido de la caché de prompts (p. ej. Redis)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: float) -> None:
+        ...
+
+
+class RedisCacheBackend(CacheBackend):
+    """Nivel compartido entre workers/instancias guardado en Redis."""
+
+    def __init__(self, url: str, prefix: str = "saborbot:prompt:"):
+        if redis is None:
+            raise RuntimeError("PROMPT_CACHE_REDIS_URL requiere el paquete 'redis'")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self.client.set(self.prefix + key, value, ex=int(ttl))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Minúsculas, sin tildes ni signos de puntuación y con espacios colapsados."""
+    text = unicodedata.normalize("NFKD", prompt.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def _trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class PromptCache:
+    """
+    Caché de respuestas del chat indexada por prompt normalizado + parámetros del modelo.
+
+    Nivel 1: LRU+TTL en memoria del proceso. Nivel 2 (opcional): CacheBackend
+    compartido. Si similarity_threshold > 0 también se reutilizan respuestas de
+    prompts casi iguales (similitud de Jaccard sobre trigramas de caracteres).
+    """
+
+    def __init__(
+        self,
+        maxsize: int = PROMPT_CACHE_SIZE,
+        ttl: float = PROMPT_CACHE_TTL,
+        shared: Optional[CacheBackend] = None,
+        similarity_threshold: float = PROMPT_CACHE_SIMILARITY,
+    ):
+        self.ttl = ttl
+        self.local = TTLCache(maxsize, ttl)
+        self.shared = shared
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "shared_hits": 0, "near_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(normalized: str, max_tokens: int, temperature: float) -> str:
+        raw = json.dumps([normalized, max_tokens, round(temperature, 3)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _near_match(self, normalized: str, max_tokens: int, temperature: float, threshold: Optional[float] = None) -> Optional[str]:
+        threshold = self.similarity_threshold if threshold is None else threshold
+        grams = _trigrams(normalized)
+        best_score, best_response = 0.0, None
+        for _, (params, entry_grams, response) in self.local.items():
+            if params != (max_tokens, round(temperature, 3)):
+                continue
+            # Cota rápida: la similitud nunca supera el cociente de tamaños
+            if min(len(grams), len(entry_grams)) / max(len(grams), len(entry_grams)) < threshold:
+                continue
+            score = _jaccard(grams, entry_grams)
+            if score > best_score:
+                best_score, best_response = score, response
+        return best_response if best_score >= threshold else None
+
+    async def get(self, prompt: str, max_tokens: int, temperature: float) -> Optional[str]:
+        """Devuelve la respuesta cacheada para el prompt, o None."""
+        normalized = normalize_prompt(prompt)
+        key = self.make_key(normalized, max_tokens, temperature)
+
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count("hits")
+            return entry[2]
+
+        if self.shared is not None:
+            try:
+                response = await run_in_threadpool(self.shared.get, key)
+            except Exception as e:
+                print(f"Error al leer la caché compartida: {e}")
+                response = None
+            if response is not None:
+                self._count("shared_hits")
+                self.local.set(key, ((max_tokens, round(temperature, 3)), _trigrams(normalized), response))
+                return response
+
+        if self.similarity_threshold > 0:
+            response = self._near_match(normalized, max_tokens, temperature)
+            if response is not None:
+                self._count("near_hits")
+                return response
+
+        self._count("misses")
+        return None
+
+    async def set(self, prompt: str, max_tokens: int, temperature: float, response: str) -> None:
+        """Guarda la respuesta del modelo para el prompt."""
+        normalized = normalize_prompt(prompt)
+        key = self.make_key(normalized, max_tokens, temperature)
+        self.local.set(key, ((max_tokens, round(temperature, 3)), _trigrams(normalized), response))
+        if self.shared is not None:
+            try:
+                await run_in_threadpool(self.shared.set, key, response, self.ttl)
+            except Exception as e:
+                print(f"Error al escribir en la caché compartida: {e}")
+
+    def find_similar(self, prompt: str, max_tokens: int, temperature: float, threshold: float) -> Optional[str]:
+        """
+        Búsqueda de respaldo (solo memoria local, sin contar en las estadísticas):
+        la entrada exacta o la más parecida por encima de `threshold`.
+        """
+        normalized = normalize_prompt(prompt)
+        entry = self.local.get(self.make_key(normalized, max_tokens, temperature))
+        if entry is not None:
+            return entry[2]
+        return self._near_match(normalized, max_tokens, temperature, threshold)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["near_hits"] + stats["misses"]
+        stats["entries"] = len(self.local)
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+        return stats
+
+
+prompt_cache = PromptCache(shared=RedisCacheBackend(PROMPT_CACHE_REDIS_URL) if PROMPT_CACHE_REDIS_URL else None)
@@ -0,0 +1,123 @@
+# app/circuit_breaker.py
+# Circuit breaker por modelo de Bedrock (lo usa app/bedrock_scheduler.py).
+#
+# - Cerrado: las llamadas pasan y se anota el resultado de las últimas
+#   BEDROCK_BREAKER_WINDOW.
+# - Abierto: si falla al menos BEDROCK_BREAKER_FAILURE_RATIO de esas llamadas
+#   (con un mínimo de BEDROCK_BREAKER_MIN_CALLS), durante BEDROCK_BREAKER_OPEN_SECONDS
+#   se rechaza todo al instante, sin ocupar hilos ni cupos esperando a un Bedrock degradado.
+# - Semiabierto: pasado ese tiempo entra una sola llamada de prueba; si
+#   Bedrock responde se cierra y si vuelve a fallar se abre otra vez.
+import os
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app.bedrock_errors import BedrockUnavailableError
+load_dotenv()
+
+BEDROCK_BREAKER_WINDOW = int(os.getenv("BEDROCK_BREAKER_WINDOW", "20"))
+BEDROCK_BREAKER_MIN_CALLS = int(os.getenv("BEDROCK_BREAKER_MIN_CALLS", "5"))
+BEDROCK_BREAKER_FAILURE_RATIO = float(os.getenv("BEDROCK_BREAKER_FAILURE_RATIO", "0.5"))
+BEDROCK_BREAKER_OPEN_SECONDS = float(os.getenv("BEDROCK_BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(BedrockUnavailableError):
+    """El circuito del modelo está abierto: se falla sin llamar a Bedrock."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window: int = BEDROCK_BREAKER_WINDOW,
+        min_calls: int = BEDROCK_BREAKER_MIN_CALLS,
+        failure_ratio: float = BEDROCK_BREAKER_FAILURE_RATIO,
+        open_seconds: float = BEDROCK_BREAKER_OPEN_SECONDS,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.open_seconds = open_seconds
+        self._outcomes: deque = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0}
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - now)
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._stats["opened"] += 1
+        print(f"Circuito de {self.name} abierto durante {self.open_seconds:.0f} s")
+
+    def enter(self) -> bool:
+        """
+        Pide paso para una llamada. Devuelve True si es la llamada de prueba
+        del estado semiabierto. Lanza CircuitOpenError si el circuito está abierto.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(
+                        f"{self.name} no disponible temporalmente (circuito abierto)",
+                        retry_after=self._retry_after(now),
+                    )
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if self._probe_in_flight:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(f"{self.name} no disponible temporalmente (probando recuperación)", retry_after=1.0)
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def exit(self, ok: Optional[bool], probe: bool) -> None:
+        """
+        Anota el resultado de una llamada admitida por enter(): True si Bedrock
+        respondió, False si falló por su lado, None si no cuenta (p. ej. cancelada).
+        """
+        with self._lock:
+            now = time.monotonic()
+            if probe:
+                self._probe_in_flight = False
+                if ok is True:
+                    self._state = CLOSED
+                    print(f"Circuito de {self.name} cerrado")
+                elif ok is False:
+                    self._open(now)
+                # None: sigue semiabierto y la próxima llamada vuelve a probar
+                return
+            if ok is None or self._state != CLOSED:
+                # Resultados de llamadas admitidas antes de abrir el circuito
+                return
+            self._outcomes.append(ok)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_ratio:
+                self._open(now)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            calls = len(self._outcomes)
+            return {
+                "state": self._state,
+                "open": self._state != CLOSED,
+                "failure_ratio": round(self._outcomes.count(False) / calls, 3) if calls else 0.0,
+                "retry_after_s": round(self._retry_after(now), 1) if self._state == OPEN else 0.0,
+                **self._stats,
+            }
@@ -0,0 +1,142 @@
+# app/compression.py
+# Compresión de respuestas (Brotli o gzip según Accept-Encoding).
+#
+# Solo se comprimen cuerpos completos (no streams: NDJSON/SSE deben llegar
+# fragmento a fragmento) que superen COMPRESSION_MIN_SIZE y cuyo tipo no esté
+# ya comprimido: PNG/WebP/AVIF no ganan nada y gastarían CPU.
+import os
+import gzip
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from dotenv import load_dotenv
+load_dotenv()
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se usa solo gzip
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1") == "1"
+# Por debajo de este tamaño la cabecera y la CPU no compensan
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Calidad 4-5: ratio parecido a gzip -9 con coste de CPU similar a gzip -6
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+# Cuerpos mayores se comprimen en el pool de hilos para no bloquear el event loop
+COMPRESSION_THREAD_MIN = int(os.getenv("COMPRESSION_THREAD_MIN", str(256 * 1024)))
+
+# Tipos que ya vienen comprimidos o que se envían en streaming
+SKIP_CONTENT_TYPES = (
+    "image/", "video/", "audio/", "application/zip", "application/gzip", "application/octet-stream",
+    "application/x-ndjson", "text/event-stream",
+)
+
+_stats = {"compressed": 0, "skipped": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Elige "br" o "gzip" según Accept-Encoding (respetando q=0); None si ninguno."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def _compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    content_type = headers.get("content-type", "").lower()
+    return not content_type.startswith(SKIP_CONTENT_TYPES)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI que comprime las respuestas completas elegibles."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if state["passthrough"]:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Se retiene hasta ver el cuerpo: el tamaño decide si se comprime
+                state["start"] = message
+                if not _compressible(Headers(raw=message["headers"])):
+                    state["passthrough"] = True
+                    _stats["skipped"] += 1
+                    await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            start, body = state["start"], message.get("body", b"")
+            state["passthrough"] = True
+            if message.get("more_body", False) or len(body) < COMPRESSION_MIN_SIZE:
+                # Streaming o cuerpo pequeño: se envía tal cual
+                _stats["skipped"] += 1
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= COMPRESSION_THREAD_MIN:
+                compressed = await run_in_threadpool(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            _stats["compressed"] += 1
+            _stats["bytes_in"] += len(body)
+            _stats["bytes_out"] += len(compressed)
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # Otra representación de bytes: el ETag fuerte pasa a débil
+                headers["ETag"] = f"W/{etag}"
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def compression_stats() -> dict:
+    saved = _stats["bytes_in"] - _stats["bytes_out"]
+    return {
+        **_stats,
+        "ratio": round(_stats["bytes_out"] / _stats["bytes_in"], 3) if _stats["bytes_in"] else None,
+        "bytes_saved": saved,
+        "brotli_available": brotli is not None,
+    }
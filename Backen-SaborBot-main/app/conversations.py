@@ -0,0 +1,189 @@
+# app/conversations.py
+# Memoria de conversación para /chat con un tamaño de entrada acotado.
+#
+# En cada turno se envían a Nova: el resumen guardado de los turnos antiguos
+# (en el system prompt) + los mensajes más recientes que quepan en
+# CONVERSATION_HISTORY_TOKENS. El resumen se actualiza en segundo plano cuando
+# hay mensajes que ya salieron de la ventana, así la latencia del chat no
+# crece con la longitud de la conversación.
+import os
+import asyncio
+from typing import Optional, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+from app import crud, models
+from app.bedrock_client import invoke_bedrock, SYSTEM_PROMPT
+from app.bedrock_errors import BedrockError
+from app.bedrock_scheduler import BACKGROUND
+from app.database import AsyncSessionLocal
+load_dotenv()
+
+# Presupuesto de tokens para resumen + historial (sin contar el mensaje nuevo)
+CONVERSATION_HISTORY_TOKENS = int(os.getenv("CONVERSATION_HISTORY_TOKENS", "1500"))
+# Longitud máxima del resumen generado
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+# No se resume hasta que lo que quedó fuera de la ventana suma al menos esto
+SUMMARY_MIN_TOKENS = int(os.getenv("SUMMARY_MIN_TOKENS", "200"))
+# Mensajes leídos como máximo para armar la ventana
+HISTORY_FETCH_LIMIT = 40
+
+USER = "user"
+ASSISTANT = "assistant"
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Resumes conversaciones entre un usuario y un asistente de cocina. "
+    "Conserva los datos útiles para continuar: recetas en curso, ingredientes, "
+    "restricciones (alergias, dietas), cantidades y preferencias del usuario. "
+    "Responde solo con el resumen, en español y en pocas frases."
+)
+
+_summaries_running: set[int] = set()
+_tasks: set = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximación sin tokenizador: ~4 caracteres por token."""
+    return len(text) // 4 + 1
+
+
+def select_window(mensajes: Sequence[models.MensajeConversacion], budget: int) -> list[models.MensajeConversacion]:
+    """
+    Recibe mensajes del más nuevo al más antiguo y devuelve, en orden cronológico,
+    los más recientes que caben en `budget`. La ventana empieza siempre con un
+    mensaje del usuario (Nova exige alternar empezando por "user").
+    """
+    window, used = [], 0
+    for mensaje in mensajes:
+        if used + mensaje.tokens > budget:
+            break
+        window.append(mensaje)
+        used += mensaje.tokens
+    window.reverse()
+    while window and window[0].rol != USER:
+        window.pop(0)
+    return window
+
+
+def system_prompt_for(conversacion: Optional[models.Conversacion]) -> str:
+    if conversacion is None or not conversacion.resumen:
+        return SYSTEM_PROMPT
+    return f"{SYSTEM_PROMPT}\n\nResumen de la conversación hasta ahora: {conversacion.resumen}"
+
+
+def has_context(conversacion: models.Conversacion, history: list[dict]) -> bool:
+    """Si hay historial o resumen la respuesta depende de la conversación y no se puede cachear."""
+    return bool(history or conversacion.resumen)
+
+
+def _summary_budget(conversacion: models.Conversacion) -> int:
+    used = estimate_tokens(conversacion.resumen) if conversacion.resumen else 0 # type: ignore
+    return max(CONVERSATION_HISTORY_TOKENS - used, 0)
+
+
+async def load_context(
+    db: AsyncSession, usuario_id: int, conversacion_id: Optional[int], first_message: str
+) -> tuple[models.Conversacion, list[dict]]:
+    """
+    Obtiene (o crea, si conversacion_id es None) la conversación del usuario y
+    el historial a enviar a Nova como lista de {"role", "text"}.
+    """
+    if conversacion_id is None:
+        conversacion = await crud.create_conversacion(db, usuario_id, titulo=first_message[:200])
+        return conversacion, []
+
+    conversacion = await crud.get_conversacion(db, conversacion_id)
+    if conversacion is None or conversacion.usuario_id != usuario_id:
+        raise HTTPException(status_code=404, detail="Conversación no encontrada")
+    mensajes = await crud.get_ultimos_mensajes(
+        db, conversacion_id, limit=HISTORY_FETCH_LIMIT, after_id=conversacion.resumen_hasta_id # type: ignore
+    )
+    window = select_window(mensajes, _summary_budget(conversacion))
+    return conversacion, [{"role": m.rol, "text": m.contenido} for m in window]
+
+
+async def save_turn(db: AsyncSession, conversacion_id: int, pregunta: str, respuesta: str) -> None:
+    """Guarda la pregunta y la respuesta y, si hace falta, actualiza el resumen en segundo plano."""
+    await crud.add_mensajes(db, conversacion_id, [
+        {"rol": USER, "contenido": pregunta, "tokens": estimate_tokens(pregunta)},
+        {"rol": ASSISTANT, "contenido": respuesta, "tokens": estimate_tokens(respuesta)},
+    ])
+    schedule_summary(conversacion_id)
+
+
+def _format_for_summary(mensajes: Sequence[models.MensajeConversacion]) -> str:
+    nombres = {USER: "Usuario", ASSISTANT: "Asistente"}
+    return "\n".join(f"{nombres.get(m.rol, m.rol)}: {m.contenido}" for m in mensajes)
+
+
+async def update_summary(conversacion_id: int) -> bool:
+    """
+    Resume (de forma incremental: resumen anterior + mensajes nuevos) los mensajes
+    que ya no caben en la ventana. Avanza en lotes cronológicos desde resumen_hasta_id,
+    así no se salta ninguno aunque se hayan acumulado mientras los resúmenes fallaban.
+    Devuelve True si se guardó algún resumen nuevo.
+    """
+    guardado = False
+    while True:
+        async with AsyncSessionLocal() as db:
+            conversacion = await crud.get_conversacion(db, conversacion_id)
+            if conversacion is None:
+                return guardado
+            recientes = await crud.get_ultimos_mensajes(
+                db, conversacion_id, limit=HISTORY_FETCH_LIMIT, after_id=conversacion.resumen_hasta_id # type: ignore
+            )
+            window = select_window(recientes, _summary_budget(conversacion))
+            # Mensajes anteriores a la ventana y aún sin resumir, empezando por el más antiguo
+            fuera = await crud.get_mensajes_sin_resumir(
+                db, conversacion_id,
+                after_id=conversacion.resumen_hasta_id, # type: ignore
+                before_id=window[0].id if window else None, # type: ignore
+                limit=HISTORY_FETCH_LIMIT,
+            )
+        if sum(m.tokens for m in fuera) < SUMMARY_MIN_TOKENS:
+            return guardado
+
+        prompt = _format_for_summary(fuera)
+        if conversacion.resumen:
+            prompt = f"Resumen anterior: {conversacion.resumen}\n\nMensajes nuevos:\n{prompt}"
+        # Sin sesión abierta mientras responde Nova: no se retiene una conexión del pool
+        try:
+            resumen = await run_in_threadpool(
+                invoke_bedrock,
+                prompt=prompt,
+                max_tokens=SUMMARY_MAX_TOKENS,
+                temperature=0.0,
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+                priority=BACKGROUND,
+            )
+        except BedrockError as e:
+            print(f"No se pudo resumir la conversación {conversacion_id}: {e}")
+            return guardado
+        async with AsyncSessionLocal() as db:
+            await crud.update_resumen_conversacion(db, conversacion_id, resumen, resumen_hasta_id=fuera[-1].id) # type: ignore
+        guardado = True
+        if len(fuera) < HISTORY_FETCH_LIMIT:
+            # No quedan más mensajes atrasados fuera de la ventana
+            return guardado
+
+
+async def _summarize_in_background(conversacion_id: int) -> None:
+    try:
+        await update_summary(conversacion_id)
+    except Exception as e:
+        print(f"Error al resumir la conversación {conversacion_id}: {e}")
+    finally:
+        _summaries_running.discard(conversacion_id)
+
+
+def schedule_summary(conversacion_id: int) -> None:
+    """Lanza la actualización del resumen (una sola a la vez por conversación)."""
+    if conversacion_id in _summaries_running:
+        return
+    _summaries_running.add(conversacion_id)
+    task = asyncio.create_task(_summarize_in_background(conversacion_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
@@ -1,14 +1,22 @@
 from datetime import datetime, timedelta, timezone
 import os
+import time
+import hashlib
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, selectinload
+from sqlalchemy import select, insert, update, delete, exists, bindparam, func
+from sqlalchemy.dialects.mysql import match
 from typing import Annotated, Optional
 from jose import  JWTError, jwt
 
 from app.schemas import TokenData
 from . import models
+from .cache import TTLCache
+from .database import get_db
+from .hashing import run_hashing
+from . import shopping_list
 from dotenv import load_dotenv
 from passlib.context import CryptContext
 load_dotenv()  # carga las variables de .env
@@ -19,6 +27,15 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 PEPPER = os.getenv("PEPPER", "")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth") # La URL debe coincidir con tu endpoint de login
 
+# Tokens ya verificados (clave: SHA-256 del token); cada entrada vence con su 'exp'
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+# Usuarios cargados recientemente; 0 desactiva la caché
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+_token_cache = TTLCache(TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+_user_cache = TTLCache(USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
 # Configuración personalizada de Argon2
 pwd_context = CryptContext(
     schemes=["argon2"],
@@ -39,59 +56,110 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     peppered = _apply_pepper(plain_password, PEPPER)
     return pwd_context.verify(peppered, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Verifica la contraseña y, si el hash usa parámetros obsoletos, devuelve uno nuevo."""
+    peppered = _apply_pepper(plain_password, PEPPER)
+    return pwd_context.verify_and_update(peppered, hashed_password)
+
+# Versiones asíncronas: Argon2 (64 MB, 3 iteraciones) corre en el pool de hashing
+async def hash_password_async(password: str) -> str:
+    return await run_hashing(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await run_hashing(verify_password, plain_password, hashed_password)
+
 
 # --- CRUD para Usuario (Usuario) ---
 
-async def get_usuario(db: Session, usuario_id: int) -> Optional[models.Usuario]:
+async def get_usuario(db: AsyncSession, usuario_id: int) -> Optional[models.Usuario]:
     """Obtiene un usuario por su ID."""
-    return db.get(models.Usuario, usuario_id)
+    return await db.get(models.Usuario, usuario_id)
 
-async def get_usuario_by_email(db: Session, email: str) -> Optional[models.Usuario]:
+async def get_usuario_by_email(db: AsyncSession, email: str) -> Optional[models.Usuario]:
     """Obtiene un usuario por su correo electrónico."""
     stmt = select(models.Usuario).where(models.Usuario.email == email)
-    return db.execute(stmt).scalars().first()
+    result = await db.execute(stmt)
+    return result.scalars().first()
 
-async def create_usuario(db: Session, user_data: dict) -> models.Usuario:
+async def create_usuario(db: AsyncSession, user_data: dict) -> models.Usuario:
     """Crea un nuevo usuario."""
     # En FastAPI real, user_data sería un objeto Pydantic
     db_user = models.Usuario(**user_data) 
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-async def update_usuario(db: Session, usuario_id: int, update_data: dict) -> Optional[models.Usuario]:
-    """Actualiza la información de un usuario."""
-    db_user = db.get(models.Usuario, usuario_id)
+async def update_usuario(db: AsyncSession, usuario_id: int, update_data: dict) -> Optional[models.Usuario]:
+    """Actualiza la información de un usuario (y su versión, que invalida el ETag)."""
+    db_user = await db.get(models.Usuario, usuario_id)
     if db_user:
         for key, value in update_data.items():
             setattr(db_user, key, value)
-        db.commit()
-        db.refresh(db_user)
+        db_user.version = models.Usuario.version + 1
+        db_user.actualizado_en = func.now()
+        await db.commit()
+        # Después del commit: antes, una lectura concurrente volvería a cachear la fila vieja
+        _user_cache.pop(usuario_id)
+        await db.refresh(db_user)
         return db_user
     return None
 
-async def delete_usuario(db: Session, usuario_id: int) -> bool:
+async def delete_usuario(db: AsyncSession, usuario_id: int) -> bool:
     """Elimina un usuario por su ID."""
-    db_user = db.get(models.Usuario, usuario_id)
+    db_user = await db.get(models.Usuario, usuario_id)
     if db_user:
-        db.delete(db_user)
-        db.commit()
+        await db.delete(db_user)
+        await db.commit()
+        _user_cache.pop(usuario_id)
         return True
     return False
 
+async def get_usuario_version(db: AsyncSession, usuario_id: int) -> Optional[tuple]:
+    """(version, actualizado_en) del usuario, por clave primaria y sin cargar el resto de la fila."""
+    stmt = select(models.Usuario.version, models.Usuario.actualizado_en).where(models.Usuario.id == usuario_id)
+    result = await db.execute(stmt)
+    return result.first()
+
+async def get_version_recetas(db: AsyncSession, usuario_id: int) -> Optional[tuple]:
+    """(version_recetas, recetas_actualizadas_en) del usuario: valida los listados con una lectura por clave primaria."""
+    stmt = (
+        select(models.Usuario.version_recetas, models.Usuario.recetas_actualizadas_en)
+        .where(models.Usuario.id == usuario_id)
+    )
+    result = await db.execute(stmt)
+    return result.first()
+
+async def _touch_recetas_usuarios(db: AsyncSession, usuario_ids) -> None:
+    """Incrementa la versión de la colección de recetas (sin commit: va en la transacción del cambio)."""
+    usuario_ids = set(usuario_ids)
+    if not usuario_ids:
+        return
+    await db.execute(
+        update(models.Usuario)
+        .where(models.Usuario.id.in_(usuario_ids))
+        .values(version_recetas=models.Usuario.version_recetas + 1, recetas_actualizadas_en=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
 #------------------------------------------------------------------
 #-----Autenticación y manejo de contraseñas (hashing)-----
 #------------------------------------------------------------------
 
-def authenticate_user(db: Session, email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     # Buscar usuario
-    user = db.query(models.Usuario).filter(models.Usuario.email == email).first()
+    user = await get_usuario_by_email(db, email)
     if not user:
         return None
     # Verificar contraseña
-    if not verify_password(password, user.hashed_password): # type: ignore
+    verified, new_hash = await run_hashing(verify_and_update_password, password, user.hashed_password)
+    if not verified:
         return None
+    # Rehash transparente si cambió la configuración de pwd_context
+    if new_hash:
+        user.hashed_password = new_hash # type: ignore
+        await db.commit()
+        _user_cache.pop(user.id)
     return user
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
@@ -111,6 +179,11 @@ async def verify_token(token: Annotated[str, Depends(oauth2_scheme)]) -> TokenDa
         detail="Credenciales no válidas",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Token ya verificado y aún vigente: no se vuelve a comprobar la firma
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    cached = _token_cache.get(cache_key)
+    if cached is not None:
+        return cached
     try:
         # Decodificación del token
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -123,16 +196,51 @@ async def verify_token(token: Annotated[str, Depends(oauth2_scheme)]) -> TokenDa
     except JWTError:
         # Esto atrapa errores de firma (token inválido) o de expiración ('exp' vencido)
         raise credentials_exception
-        
+
+    # La entrada vence a la vez que el token, así un token caducado nunca sale de la caché
+    exp = payload.get("exp")
+    if exp is not None:
+        remaining = float(exp) - time.time()
+        if remaining > 0:
+            _token_cache.set(cache_key, token_data, ttl=remaining)
     return token_data
 
+async def get_current_user(
+    db: AsyncSession = Depends(get_db),
+    token: TokenData = Depends(verify_token),
+) -> models.Usuario:
+    """
+    Dependencia con el usuario autenticado. FastAPI la resuelve una sola vez por
+    petición; además se usa una caché corta (USER_CACHE_TTL) que se invalida en
+    update_usuario/delete_usuario.
+    """
+    usuario_id = int(token.sub) # type: ignore
+    cached = _user_cache.get(usuario_id) if USER_CACHE_TTL > 0 else None
+    if cached is not None:
+        # merge(load=False) adjunta una copia a la sesión sin hacer SELECT
+        return await db.merge(cached, load=False)
+
+    db_user = await db.get(models.Usuario, usuario_id)
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Credenciales no válidas",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if USER_CACHE_TTL > 0:
+        # La copia cacheada queda separada de la sesión de esta petición
+        db.expunge(db_user)
+        _user_cache.set(usuario_id, db_user)
+        db_user = await db.merge(db_user, load=False)
+    return db_user
+
 # ------------------------------------------------------------------
 # --- CRUD para Receta (Receta) ---
 # ------------------------------------------------------------------
 
-async def get_receta(db: Session, receta_id: int) -> Optional[models.Receta]:
+async def get_receta(db: AsyncSession, receta_id: int) -> Optional[models.Receta]:
     """Obtiene una receta por su ID."""
-    return db.get(models.Receta, receta_id)
+    return await db.get(models.Receta, receta_id)
 
 from typing import Sequence
 # Importa Receta si no lo has hecho
@@ -140,56 +248,401 @@ from . import models
 
 # ...
 
-async def get_recetas_by_usuario(db: Session, usuario_id: int) -> Sequence[models.Receta]:
+async def get_recetas_by_usuario(db: AsyncSession, usuario_id: int) -> Sequence[models.Receta]:
     """Obtiene todas las recetas creadas por un usuario."""
     stmt = select(models.Receta).where(models.Receta.usuario_id == usuario_id)
     # El resultado de .all() se anotará como Sequence[Receta]
-    return db.execute(stmt).scalars().all()
+    result = await db.execute(stmt)
+    return result.scalars().all()
 
-async def create_receta(db: Session, receta_data: dict, usuario_id: int) -> models.Receta:
-    """Crea una nueva receta asociada a un usuario."""
+async def get_recetas_page(db: AsyncSession, usuario_id: int, limit: int, cursor: Optional[int] = None) -> Sequence[models.Receta]:
+    """
+    Página de recetas de un usuario, de la más reciente a la más antigua.
+    Paginación por keyset sobre id (WHERE id < cursor) y solo las columnas del resumen.
+    """
+    stmt = (
+        select(models.Receta)
+        .options(load_only(
+            models.Receta.id,
+            models.Receta.titulo,
+            models.Receta.promt_usuario,
+            models.Receta.usuario_id,
+            models.Receta.imagen_key,
+        ))
+        .where(models.Receta.usuario_id == usuario_id)
+        .order_by(models.Receta.id.desc())
+        .limit(limit)
+    )
+    if cursor is not None:
+        stmt = stmt.where(models.Receta.id < cursor)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def search_recetas(db: AsyncSession, usuario_id: int, boolean_query: str, limit: int, offset: int = 0) -> list:
+    """
+    Busca en las recetas del usuario con el índice FULLTEXT (consulta en BOOLEAN MODE,
+    ver app.search.build_boolean_query). Devuelve pares (receta, relevancia) ordenados.
+    """
+    score = match(
+        models.Receta.titulo, models.Receta.promt_usuario, models.Receta.instrucciones,
+        against=boolean_query,
+    ).in_boolean_mode()
+    stmt = (
+        select(models.Receta, score.label("score"))
+        .options(load_only(
+            models.Receta.id,
+            models.Receta.titulo,
+            models.Receta.promt_usuario,
+            models.Receta.usuario_id,
+            models.Receta.imagen_key,
+        ))
+        .where(models.Receta.usuario_id == usuario_id, score)
+        .order_by(score.desc(), models.Receta.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+async def get_receta_detail(db: AsyncSession, receta_id: int) -> Optional[models.Receta]:
+    """Obtiene una receta con sus ingredientes (una consulta extra con IN, sin cargas perezosas)."""
+    stmt = (
+        select(models.Receta)
+        .options(selectinload(models.Receta.ingredientes_faltantes))
+        .where(models.Receta.id == receta_id)
+    )
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+async def get_receta_version(db: AsyncSession, receta_id: int) -> Optional[tuple]:
+    """(usuario_id, version, actualizada_en) de una receta, para validar su ETag sin leer instrucciones."""
+    stmt = (
+        select(models.Receta.usuario_id, models.Receta.version, models.Receta.actualizada_en)
+        .where(models.Receta.id == receta_id)
+    )
+    result = await db.execute(stmt)
+    return result.first()
+
+async def get_receta_imagen_key(db: AsyncSession, receta_id: int) -> Optional[str]:
+    """Obtiene solo la clave de la imagen de una receta (sin cargar el resto de columnas)."""
+    stmt = select(models.Receta.imagen_key).where(models.Receta.id == receta_id)
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+async def create_receta(db: AsyncSession, receta_data: dict, usuario_id: int) -> models.Receta:
+    """
+    Crea una nueva receta asociada a un usuario.
+    Sin refresh: el id llega del INSERT (lastrowid) y el resto de valores ya
+    están en el objeto (expire_on_commit=False), así se evita releer la fila.
+    """
     db_receta = models.Receta(usuario_id=usuario_id, **receta_data)
     db.add(db_receta)
-    db.commit()
-    db.refresh(db_receta)
+    await _touch_recetas_usuarios(db, [usuario_id])
+    await db.commit()
     return db_receta
 
-async def update_receta(db: Session, receta_id: int, update_data: dict) -> Optional[models.Receta]:
-    """Actualiza una receta por su ID."""
-    db_receta = db.get(models.Receta, receta_id)
+async def create_recetas(db: AsyncSession, recetas_data: list[dict], usuario_id: int) -> list[models.Receta]:
+    """Crea varias recetas de un usuario en una sola transacción."""
+    return await create_recetas_en_lote(db, [(data, usuario_id) for data in recetas_data])
+
+async def create_recetas_en_lote(db: AsyncSession, filas: list[tuple[dict, int]]) -> list[models.Receta]:
+    """Crea recetas de distintos usuarios, pares (receta_data, usuario_id), con un único commit."""
+    db_recetas = [models.Receta(usuario_id=usuario_id, **data) for data, usuario_id in filas]
+    db.add_all(db_recetas)
+    await _touch_recetas_usuarios(db, [usuario_id for _, usuario_id in filas])
+    await db.commit()
+    return db_recetas
+
+async def get_recetas_de_usuario_por_ids(db: AsyncSession, usuario_id: int, receta_ids: list[int]) -> Sequence[models.Receta]:
+    """Obtiene (solo columnas de resumen) las recetas indicadas que pertenecen al usuario."""
+    stmt = (
+        select(models.Receta)
+        .options(load_only(models.Receta.id, models.Receta.titulo, models.Receta.usuario_id))
+        .where(models.Receta.usuario_id == usuario_id, models.Receta.id.in_(receta_ids))
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def update_receta(db: AsyncSession, receta_id: int, update_data: dict) -> Optional[models.Receta]:
+    """
+    Actualiza una receta por su ID.
+    Solo se leen las columnas cortas (no instrucciones) y el UPDATE incluye
+    únicamente las columnas cambiadas; no hay refresh después del commit.
+    """
+    db_receta = await db.get(
+        models.Receta,
+        receta_id,
+        options=[load_only(
+            models.Receta.id,
+            models.Receta.titulo,
+            models.Receta.usuario_id,
+            models.Receta.imagen_key,
+        )],
+    )
     if db_receta:
         # Nota: La clave foránea 'usuario_id' no debería cambiarse a menos que se reasigne la receta.
         for key, value in update_data.items():
             setattr(db_receta, key, value)
-        db.commit()
-        db.refresh(db_receta)
+        db_receta.version = models.Receta.version + 1
+        db_receta.actualizada_en = func.now()
+        await _touch_recetas_usuarios(db, [db_receta.usuario_id])
+        await db.commit()
+        shopping_list.invalidate_receta(receta_id)
         return db_receta
     return None
 
-async def delete_receta(db: Session, receta_id: int) -> bool:
+async def set_imagenes_recetas(db: AsyncSession, imagenes: dict[int, str]) -> None:
+    """Asigna la imagen de varias recetas en un solo UPDATE por lotes (executemany por clave primaria)."""
+    if not imagenes:
+        return
+    receta = models.Receta.__table__
+    await db.execute(
+        update(receta)
+        .where(receta.c.id == bindparam("b_id"))
+        .values(imagen_key=bindparam("b_imagen_key"), version=receta.c.version + 1, actualizada_en=func.now()),
+        [{"b_id": receta_id, "b_imagen_key": imagen_key} for receta_id, imagen_key in imagenes.items()],
+    )
+    usuarios = select(models.Receta.usuario_id).where(models.Receta.id.in_(list(imagenes)))
+    await _touch_recetas_usuarios(db, (await db.execute(usuarios)).scalars().all())
+    await db.commit()
+
+async def delete_receta(db: AsyncSession, receta_id: int) -> bool:
     """Elimina una receta por su ID."""
-    db_receta = db.get(models.Receta, receta_id)
+    db_receta = await db.get(models.Receta, receta_id)
     if db_receta:
-        db.delete(db_receta)
-        db.commit()
+        await db.delete(db_receta)
+        await _touch_recetas_usuarios(db, [db_receta.usuario_id])
+        await db.commit()
+        shopping_list.invalidate_receta(receta_id)
         return True
     return False
 
+# ------------------------------------------------------------------
+# --- Ingredientes de receta (IngredienteFaltanteReceta) ---
+# ------------------------------------------------------------------
+
+async def replace_ingredientes(db: AsyncSession, receta_id: int, ingredientes: list[dict]) -> None:
+    """Reemplaza los ingredientes de una receta con un único INSERT multi-fila."""
+    await db.execute(
+        delete(models.IngredienteFaltanteReceta).where(models.IngredienteFaltanteReceta.receta_id == receta_id)
+    )
+    if ingredientes:
+        await db.execute(
+            insert(models.IngredienteFaltanteReceta).values([{**i, "receta_id": receta_id} for i in ingredientes])
+        )
+    # Los ingredientes forman parte de /recipes/{id}: cambia su ETag
+    await db.execute(
+        update(models.Receta)
+        .where(models.Receta.id == receta_id)
+        .values(version=models.Receta.version + 1, actualizada_en=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    shopping_list.invalidate_receta(receta_id)
+
+async def get_ingredientes_por_instrucciones(db: AsyncSession, instrucciones: str, excluir_id: int) -> list[dict]:
+    """
+    Ingredientes de la receta más reciente con exactamente estas instrucciones
+    (la receta de la que salió una respuesta servida desde la caché del chat).
+    Se busca por el índice de instrucciones_sha256, no comparando el TEXT.
+    """
+    ingrediente = models.IngredienteFaltanteReceta
+    origen = await db.execute(
+        select(models.Receta.id)
+        .where(
+            models.Receta.instrucciones_sha256 == models.hash_instrucciones(instrucciones),
+            models.Receta.id != excluir_id,
+            exists().where(ingrediente.receta_id == models.Receta.id),
+        )
+        .order_by(models.Receta.id.desc())
+        .limit(1)
+    )
+    origen_id = origen.scalar_one_or_none()
+    if origen_id is None:
+        return []
+    result = await db.execute(
+        select(ingrediente.ingrediente, ingrediente.cantidad, ingrediente.unidad_medida)
+        .where(ingrediente.receta_id == origen_id)
+        .order_by(ingrediente.id)
+    )
+    return [dict(row._mapping) for row in result.all()]
+
+async def get_recetas_sin_ingredientes(db: AsyncSession, after_id: int, limit: int) -> list:
+    """Lote (keyset por id) de recetas que aún no tienen ingredientes extraídos: pares (id, instrucciones)."""
+    sin_ingredientes = ~exists().where(models.IngredienteFaltanteReceta.receta_id == models.Receta.id)
+    stmt = (
+        select(models.Receta.id, models.Receta.instrucciones)
+        .where(models.Receta.id > after_id, sin_ingredientes)
+        .order_by(models.Receta.id)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
 # ------------------------------------------------------------------
 # --- CRUD para Menu Semanal (MenuSemanal) ---
 # ------------------------------------------------------------------
 
-async def get_menu_semanal(db: Session, menu_id: int) -> Optional[models.MenuSemanal]:
+async def get_menu_semanal(db: AsyncSession, menu_id: int) -> Optional[models.MenuSemanal]:
     """Obtiene un menú semanal por su ID."""
     # Esta función no carga las recetas asociadas, solo el objeto MenuSemanal principal.
-    return db.get(models.MenuSemanal, menu_id)
+    return await db.get(models.MenuSemanal, menu_id)
 
-async def create_menu_semanal(db: Session, menu_data: dict, usuario_id: int) -> models.MenuSemanal:
+async def create_menu_semanal(db: AsyncSession, menu_data: dict, usuario_id: int) -> models.MenuSemanal:
     """Crea un nuevo menú semanal."""
     db_menu = models.MenuSemanal(usuario_id=usuario_id, **menu_data)
     db.add(db_menu)
-    db.commit()
-    db.refresh(db_menu)
+    await db.commit()
+    await db.refresh(db_menu)
     return db_menu
 
-# (Funciones update_menu_semanal y delete_menu_semanal seguirían un patrón similar)
\ No newline at end of file
+async def create_menu_semanal_con_recetas(
+    db: AsyncSession, menu_data: dict, usuario_id: int, receta_ids: list[int], posiciones: Optional[list[int]] = None
+) -> models.MenuSemanal:
+    """
+    Crea un menú semanal y sus filas de recetamenusemanal con un único INSERT multi-fila.
+    `posiciones` es el día de cada receta (por defecto, el orden de receta_ids).
+    """
+    if posiciones is None:
+        posiciones = list(range(len(receta_ids)))
+    db_menu = models.MenuSemanal(usuario_id=usuario_id, **menu_data)
+    db.add(db_menu)
+    await db.flush()  # asigna db_menu.id
+    if receta_ids:
+        await db.execute(
+            insert(models.receta_menu_semanal).values(
+                [
+                    {"menu_semanal_id": db_menu.id, "receta_id": receta_id, "posicion": posicion}
+                    for receta_id, posicion in zip(receta_ids, posiciones)
+                ]
+            )
+        )
+    await db.commit()
+    return db_menu
+
+async def get_menu_semanal_detail(db: AsyncSession, menu_id: int) -> Optional[models.MenuSemanal]:
+    """
+    Obtiene un menú con sus recetas (ordenadas por día) y los ingredientes de cada
+    una en tres consultas fijas (menú, recetas, ingredientes), sin cargas perezosas N+1.
+    """
+    stmt = (
+        select(models.MenuSemanal)
+        .options(
+            selectinload(models.MenuSemanal.recetas_asociadas)
+            .load_only(
+                models.Receta.id,
+                models.Receta.titulo,
+                models.Receta.promt_usuario,
+                models.Receta.usuario_id,
+                models.Receta.imagen_key,
+            )
+            .selectinload(models.Receta.ingredientes_faltantes)
+        )
+        .where(models.MenuSemanal.id == menu_id)
+    )
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+async def get_menus_by_usuario(db: AsyncSession, usuario_id: int) -> Sequence[models.MenuSemanal]:
+    """Obtiene los menús semanales de un usuario (sin recetas), del más reciente al más antiguo."""
+    stmt = (
+        select(models.MenuSemanal)
+        .where(models.MenuSemanal.usuario_id == usuario_id)
+        .order_by(models.MenuSemanal.id.desc())
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def get_filas_lista_compras(db: AsyncSession, menu_id: int) -> list:
+    """
+    Ingredientes de todas las recetas de un menú en una sola consulta:
+    filas (receta_id, ingrediente, cantidad, unidad_medida); las recetas sin
+    ingredientes aparecen con ingrediente None.
+    """
+    asociacion = models.receta_menu_semanal
+    ingrediente = models.IngredienteFaltanteReceta
+    stmt = (
+        select(asociacion.c.receta_id, ingrediente.ingrediente, ingrediente.cantidad, ingrediente.unidad_medida)
+        .select_from(asociacion)
+        .outerjoin(ingrediente, ingrediente.receta_id == asociacion.c.receta_id)
+        .where(asociacion.c.menu_semanal_id == menu_id)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+# (Funciones update_menu_semanal y delete_menu_semanal seguirían un patrón similar)
+
+# ------------------------------------------------------------------
+# --- Conversaciones del chat (Conversacion, MensajeConversacion) ---
+# ------------------------------------------------------------------
+
+async def get_conversacion(db: AsyncSession, conversacion_id: int) -> Optional[models.Conversacion]:
+    """Obtiene una conversación (sin mensajes) por su ID."""
+    return await db.get(models.Conversacion, conversacion_id)
+
+async def create_conversacion(db: AsyncSession, usuario_id: int, titulo: str) -> models.Conversacion:
+    """Crea una conversación vacía."""
+    db_conversacion = models.Conversacion(titulo=titulo, usuario_id=usuario_id)
+    db.add(db_conversacion)
+    await db.commit()
+    return db_conversacion
+
+async def get_conversaciones_by_usuario(db: AsyncSession, usuario_id: int, limit: int = 50) -> Sequence[models.Conversacion]:
+    """Conversaciones de un usuario, de la más reciente a la más antigua (sin mensajes)."""
+    stmt = (
+        select(models.Conversacion)
+        .options(load_only(models.Conversacion.id, models.Conversacion.titulo, models.Conversacion.creada_en))
+        .where(models.Conversacion.usuario_id == usuario_id)
+        .order_by(models.Conversacion.id.desc())
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def get_ultimos_mensajes(
+    db: AsyncSession, conversacion_id: int, limit: int, after_id: Optional[int] = None
+) -> Sequence[models.MensajeConversacion]:
+    """Los `limit` mensajes más recientes (posteriores a after_id), del más nuevo al más antiguo."""
+    stmt = (
+        select(models.MensajeConversacion)
+        .where(models.MensajeConversacion.conversacion_id == conversacion_id)
+        .order_by(models.MensajeConversacion.id.desc())
+        .limit(limit)
+    )
+    if after_id is not None:
+        stmt = stmt.where(models.MensajeConversacion.id > after_id)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def get_mensajes_sin_resumir(
+    db: AsyncSession, conversacion_id: int, after_id: Optional[int], before_id: Optional[int], limit: int
+) -> Sequence[models.MensajeConversacion]:
+    """Los `limit` mensajes más antiguos entre after_id y before_id (exclusivos), en orden cronológico."""
+    stmt = (
+        select(models.MensajeConversacion)
+        .where(models.MensajeConversacion.conversacion_id == conversacion_id)
+        .order_by(models.MensajeConversacion.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        stmt = stmt.where(models.MensajeConversacion.id > after_id)
+    if before_id is not None:
+        stmt = stmt.where(models.MensajeConversacion.id < before_id)
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def add_mensajes(db: AsyncSession, conversacion_id: int, mensajes: list[dict]) -> None:
+    """Guarda los mensajes de un turno (pregunta y respuesta) con un único INSERT multi-fila."""
+    await db.execute(
+        insert(models.MensajeConversacion).values([{**m, "conversacion_id": conversacion_id} for m in mensajes])
+    )
+    await db.commit()
+
+async def update_resumen_conversacion(db: AsyncSession, conversacion_id: int, resumen: str, resumen_hasta_id: int) -> None:
+    """Guarda el resumen de los mensajes hasta resumen_hasta_id."""
+    await db.execute(
+        update(models.Conversacion)
+        .where(models.Conversacion.id == conversacion_id)
+        .values(resumen=resumen, resumen_hasta_id=resumen_hasta_id)
+    )
+    await db.commit()
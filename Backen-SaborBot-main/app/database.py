@@ -1,8 +1,13 @@
 import os
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
+from app.metrics import instrument_engine
+
 load_dotenv()  # carga las variables de .env
 
 DB_USER = os.getenv("DB_USER", "")
@@ -11,21 +16,132 @@ DB_HOST = os.getenv("DB_HOST", "")
 DB_PORT = os.getenv("DB_PORT", "")
 DB_NAME = os.getenv("DB_NAME", "")
 
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL / ASYNC_DATABASE_URL permiten apuntar a otra base (p. ej. SQLite en bench/)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Mismo servidor, pero con un driver asyncio (aiomysql) para la API
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# --- Perfil del motor (por entorno) ---
+APP_ENV = os.getenv("APP_ENV", "prod")
+# Loguear cada sentencia solo en desarrollo: en producción formatear SQL cuesta CPU y llena stdout
+DB_ECHO = os.getenv("DB_ECHO", "1" if APP_ENV == "dev" else "0") == "1"
+# Conexiones por proceso: pool_size fijas + max_overflow temporales.
+# Dimensionar para que workers * (pool_size + max_overflow) < max_connections de MySQL
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Segundos esperando una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Recicla conexiones antes de que MySQL las cierre por wait_timeout
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Límite por sentencia SELECT en MySQL (max_execution_time); 0 = sin límite
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+def _engine_options() -> dict:
+    return {
+        "echo": DB_ECHO,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+class PoolMetrics:
+    """Contadores del pool de conexiones de un motor (checkouts, checkins, overflow, etc.)."""
+
+    def __init__(self, sync_engine: Engine):
+        self.pool = sync_engine.pool
+        self._lock = threading.Lock()
+        self._counters = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidations": 0, "peak_checked_out": 0}
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+        event.listen(sync_engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self._counters["connects"] += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        checked_out = self.pool.checkedout()
+        with self._lock:
+            self._counters["checkouts"] += 1
+            self._counters["peak_checked_out"] = max(self._counters["peak_checked_out"], checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self._counters["checkins"] += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self._counters["invalidations"] += 1
 
-# Crear motor SQLAlchemy
-engine = create_engine(DATABASE_URL, echo=True)
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        size = getattr(self.pool, "size", lambda: 0)()
+        checked_out = getattr(self.pool, "checkedout", lambda: 0)()
+        capacity = size + DB_MAX_OVERFLOW
+        return {
+            "pool_size": size,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": checked_out,
+            "checked_in": getattr(self.pool, "checkedin", lambda: 0)(),
+            "overflow": max(getattr(self.pool, "overflow", lambda: 0)(), 0),
+            "saturation": round(checked_out / capacity, 3) if capacity else 0.0,
+            **counters,
+        }
+
+
+def _set_statement_timeout(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"SET SESSION max_execution_time = {DB_STATEMENT_TIMEOUT_MS}")
+    cursor.close()
+
+
+# Crear motor SQLAlchemy (síncrono: scripts y tareas fuera del event loop)
+engine = create_engine(DATABASE_URL, **_engine_options())
 
 # Crear sesión
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor asíncrono usado por los endpoints: no bloquea el event loop mientras espera a MySQL
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options())
+
+# expire_on_commit=False: tras el commit los atributos siguen cargados y no
+# se dispara una carga implícita (no permitida en asyncio) al serializar
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# max_execution_time solo existe en MySQL
+if DB_STATEMENT_TIMEOUT_MS > 0 and engine.dialect.name == "mysql":
+    event.listen(engine, "connect", _set_statement_timeout)
+    event.listen(async_engine.sync_engine, "connect", _set_statement_timeout)
+
+pool_metrics = {
+    "sync": PoolMetrics(engine),
+    "async": PoolMetrics(async_engine.sync_engine),
+}
+# Latencia por consulta y tiempo de BD por petición (ver app/metrics.py)
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+
+
+def pool_stats() -> dict:
+    """Estado de los pools de conexiones de ambos motores."""
+    return {name: metrics.snapshot() for name, metrics in pool_metrics.items()}
+
 # Base para modelos
 Base = declarative_base()
 
 # Dependencia para FastAPI
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
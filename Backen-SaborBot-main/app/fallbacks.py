@@ -0,0 +1,84 @@
+# app/fallbacks.py
+# Degradación controlada cuando Bedrock falla o va lento.
+#
+# - Plazos por petición: la capa HTTP fija cuánto puede esperar cada endpoint
+#   (cola del planificador + reintentos + stream) y se lo pasa a bedrock_client;
+#   así una caída de Bedrock no deja los hilos del threadpool bloqueados minutos.
+# - Respuestas de reserva para el chat: la respuesta cacheada del mismo prompt
+#   (o de uno parecido) y, si no hay, una plantilla local.
+# - Traducción de BedrockError a respuestas HTTP 502/503/504 con Retry-After.
+import os
+import math
+import time
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+
+from app.bedrock_errors import BedrockError
+from app.cache import prompt_cache
+load_dotenv()
+
+# Segundos que una petición de chat o de imagen puede esperar a Bedrock
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+IMAGE_DEADLINE_SECONDS = float(os.getenv("IMAGE_DEADLINE_SECONDS", "90"))
+# Similitud mínima (Jaccard de trigramas) para responder con un prompt cacheado parecido
+FALLBACK_CACHE_SIMILARITY = float(os.getenv("FALLBACK_CACHE_SIMILARITY", "0.6"))
+
+FALLBACK_TEMPLATE = (
+    "Ahora mismo no puedo consultar al chef virtual, así que no generé una receta nueva para "
+    "«{consulta}». Mientras tanto, una base que casi siempre funciona:\n"
+    "1. Sofríe cebolla y ajo picados en un poco de aceite a fuego medio.\n"
+    "2. Agrega la proteína o las legumbres que tengas y dóralas unos minutos.\n"
+    "3. Suma verduras de temporada y un líquido (caldo, tomate triturado o leche de coco).\n"
+    "4. Cocina hasta que todo esté tierno y ajusta con sal, pimienta y un toque ácido (limón o vinagre).\n"
+    "Vuelve a intentarlo en unos minutos para recibir la receta completa."
+)
+
+_stats = {"cache": 0, "template": 0}
+
+
+def request_deadline(request: Request, budget: float) -> float:
+    """
+    Plazo (time.monotonic()) de la petición: `budget` segundos, o menos si el
+    cliente envía X-Request-Timeout con los segundos que está dispuesto a esperar.
+    """
+    try:
+        client_timeout = float(request.headers.get("x-request-timeout", ""))
+    except ValueError:
+        client_timeout = budget
+    if not math.isfinite(client_timeout) or client_timeout <= 0:
+        client_timeout = budget
+    return time.monotonic() + min(budget, client_timeout)
+
+
+def fallback_answer(prompt: str, max_tokens: int, temperature: float, use_cache: bool = True) -> tuple[str, str]:
+    """
+    Respuesta de reserva para el chat: (texto, origen) con origen "cache" o "template".
+    Sin `use_cache` (conversación con historial) solo se usa la plantilla: una respuesta
+    cacheada de otro prompt suelto no sirve como continuación de la conversación.
+    """
+    if use_cache:
+        cached = prompt_cache.find_similar(prompt, max_tokens, temperature, FALLBACK_CACHE_SIMILARITY)
+        if cached is not None:
+            _stats["cache"] += 1
+            return cached, "cache"
+    _stats["template"] += 1
+    consulta = " ".join(prompt.split())
+    if len(consulta) > 80:
+        consulta = consulta[:80] + "..."
+    return FALLBACK_TEMPLATE.format(consulta=consulta), "template"
+
+
+def error_response(e: BedrockError) -> JSONResponse:
+    """Respuesta HTTP para un BedrockError (503 si no está disponible, 504 si se agotó el plazo)."""
+    headers = {}
+    if e.retry_after is not None:
+        headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+    elif e.status_code == 503:
+        headers["Retry-After"] = "5"
+    return JSONResponse(status_code=e.status_code, content={"message": str(e)}, headers=headers)
+
+
+def fallback_stats() -> dict:
+    return dict(_stats)
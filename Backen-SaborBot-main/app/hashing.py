@@ -0,0 +1,79 @@
+# app/hashing.py
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from fastapi import HTTPException, status
+from dotenv import load_dotenv
+load_dotenv()
+
+T = TypeVar("T")
+
+# Cada hash Argon2 reserva ~64 MB, así que el nº de hilos acota la RAM usada por logins
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Peticiones que pueden esperar turno antes de responder 503 (degradación controlada)
+HASH_MAX_QUEUE = int(os.getenv("HASH_MAX_QUEUE", "64"))
+
+# argon2-cffi libera el GIL mientras calcula, por eso basta con hilos
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="argon2")
+_semaphore: asyncio.Semaphore | None = None
+
+_lock = threading.Lock()
+_stats = {"queued": 0, "running": 0, "completed": 0, "rejected": 0}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # Se crea perezosamente para que quede ligado al event loop del worker
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(HASH_WORKERS)
+    return _semaphore
+
+
+def _incr(key: str, delta: int = 1) -> None:
+    with _lock:
+        _stats[key] += delta
+
+
+async def run_hashing(fn: Callable[..., T], *args) -> T:
+    """
+    Ejecuta una operación de hashing en el pool dedicado sin bloquear el event loop.
+    Si la cola supera HASH_MAX_QUEUE responde 503 en lugar de acumular trabajo.
+    """
+    with _lock:
+        if _stats["queued"] >= HASH_MAX_QUEUE:
+            _stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servidor ocupado, inténtalo de nuevo en unos segundos",
+                headers={"Retry-After": "1"},
+            )
+        _stats["queued"] += 1
+
+    started = False
+    try:
+        async with _get_semaphore():
+            _incr("queued", -1)
+            _incr("running")
+            started = True
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_executor, fn, *args)
+    finally:
+        if started:
+            _incr("running", -1)
+            _incr("completed")
+        else:
+            # Cancelada mientras esperaba turno
+            _incr("queued", -1)
+
+
+def hashing_stats() -> dict:
+    """Estado actual del pool de hashing (profundidad de cola, en curso, totales)."""
+    with _lock:
+        return {"workers": HASH_WORKERS, "max_queue": HASH_MAX_QUEUE, **_stats}
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
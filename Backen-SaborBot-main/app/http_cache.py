@@ -0,0 +1,92 @@
+# app/http_cache.py
+# Utilidades HTTP para validación de caché (ETag, Last-Modified) y peticiones parciales (Range)
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional, Tuple
+
+
+class RangeNotSatisfiable(Exception):
+    """El rango pedido no cae dentro del recurso."""
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara el header If-None-Match con el ETag actual (comparación débil, RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == current for candidate in if_none_match.split(","))
+
+
+def http_date(value: datetime) -> str:
+    """Fecha en formato HTTP (IMF-fixdate). Las fechas sin zona de la base de datos se toman como UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def not_modified(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    etag: str,
+    last_modified: Optional[datetime] = None,
+) -> bool:
+    """
+    True si la copia del cliente sigue vigente y se puede responder 304.
+    If-None-Match tiene prioridad; If-Modified-Since solo se evalúa sin él (RFC 9110).
+    """
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # Las fechas HTTP tienen resolución de segundos
+    return last_modified.replace(microsecond=0) <= since
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None, cache_control: str = "private, no-cache") -> dict:
+    """ETag, Last-Modified y Cache-Control para respuestas que el cliente debe revalidar."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un header Range de un solo rango ("bytes=a-b", "bytes=a-" o "bytes=-n").
+    Devuelve (inicio, fin) incluidos, o None si no hay rango utilizable (se sirve completo).
+    Lanza RangeNotSatisfiable si el rango queda fuera del recurso; un rango inválido
+    ("bytes=5-3") se ignora y se sirve completo (RFC 9110, sección 14.2).
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        # Rangos múltiples no soportados: se devuelve el recurso completo
+        return None
+    start_text, end_text = (part.strip() for part in spec.split("-", 1))
+    try:
+        if start_text == "":
+            # Sufijo: los últimos n bytes
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable(range_header)
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(range_header)
+    if start > end:
+        return None
+    return start, min(end, size - 1)
@@ -0,0 +1,176 @@
+# app/image_store.py
+import os
+import base64
+import hashlib
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import boto3
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+load_dotenv()
+
+# Backend de almacenamiento: "local" (disco) o "s3" (S3 o compatible)
+IMAGE_STORE_BACKEND = os.getenv("IMAGE_STORE_BACKEND", "local")
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "./data/images")
+IMAGE_STORE_S3_BUCKET = os.getenv("IMAGE_STORE_S3_BUCKET", "")
+IMAGE_STORE_S3_PREFIX = os.getenv("IMAGE_STORE_S3_PREFIX", "recetas/")
+IMAGE_STORE_S3_ENDPOINT = os.getenv("IMAGE_STORE_S3_ENDPOINT") or None
+
+# Titan devuelve siempre PNG
+IMAGE_MEDIA_TYPE = "image/png"
+
+
+class ImageNotFound(Exception):
+    """La clave no existe en el almacén."""
+
+
+class ImageStore(ABC):
+    """
+    Almacén de imágenes direccionado por contenido: la clave de cada imagen es
+    el SHA-256 de sus bytes, así que guardar dos veces la misma imagen no
+    duplica datos y una clave nunca cambia de contenido.
+    """
+
+    def put(self, data: bytes) -> str:
+        """Guarda los bytes (si no existen ya) y devuelve su clave."""
+        key = hashlib.sha256(data).hexdigest()
+        if not self.exists(key):
+            self._write(key, data)
+        return key
+
+    def put_base64(self, data_base64: str) -> str:
+        """Decodifica una sola vez el Base64 de Titan y guarda el binario."""
+        return self.put(base64.b64decode(data_base64))
+
+    @abstractmethod
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Lee los bytes [start, end] (ambos incluidos) de la imagen."""
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def _write(self, key: str, data: bytes) -> None:
+        ...
+
+
+class LocalImageStore(ImageStore):
+    """Guarda cada imagen en disco bajo <root>/ab/cd/<sha256>."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        try:
+            with open(self.path(key), "rb") as f:
+                f.seek(start)
+                return f.read() if end is None else f.read(end - start + 1)
+        except FileNotFoundError:
+            raise ImageNotFound(key)
+
+    def size(self, key: str) -> int:
+        try:
+            return os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            raise ImageNotFound(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def _write(self, key: str, data: bytes) -> None:
+        final_path = self.path(key)
+        directory = os.path.dirname(final_path)
+        os.makedirs(directory, exist_ok=True)
+        # Escritura atómica: nunca se sirve un archivo a medio escribir
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class S3ImageStore(ImageStore):
+    """Guarda las imágenes como objetos <prefix><sha256> en un bucket S3 (o compatible)."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        byte_range = f"bytes={start}-" if end is None else f"bytes={start}-{end}"
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key), Range=byte_range)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise ImageNotFound(key)
+            raise
+        return response["Body"].read()
+
+    def size(self, key: str) -> int:
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                raise ImageNotFound(key)
+            raise
+        return response["ContentLength"]
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.size(key)
+            return True
+        except ImageNotFound:
+            return False
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def _write(self, key: str, data: bytes) -> None:
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=self._object_key(key),
+            Body=data,
+            ContentType=IMAGE_MEDIA_TYPE,
+        )
+
+
+_store: Optional[ImageStore] = None
+
+
+def get_image_store() -> ImageStore:
+    """Devuelve el almacén configurado por IMAGE_STORE_BACKEND (se crea una sola vez)."""
+    global _store
+    if _store is None:
+        if IMAGE_STORE_BACKEND == "s3":
+            _store = S3ImageStore(IMAGE_STORE_S3_BUCKET, IMAGE_STORE_S3_PREFIX, IMAGE_STORE_S3_ENDPOINT)
+        else:
+            _store = LocalImageStore(IMAGE_STORE_DIR)
+    return _store
@@ -0,0 +1,150 @@
+# app/ingredients.py
+import os
+import json
+import asyncio
+from typing import List
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+
+from app import crud, models, schemas
+from app.bedrock_client import invoke_bedrock
+from app.bedrock_scheduler import BACKGROUND
+from app.cache import TTLCache, PROMPT_CACHE_SIZE, PROMPT_CACHE_TTL
+from app.database import AsyncSessionLocal
+load_dotenv()
+
+# Extraer ingredientes tras cada /chat (una llamada extra a Nova en segundo plano)
+INGREDIENT_EXTRACTION_ENABLED = os.getenv("INGREDIENT_EXTRACTION_ENABLED", "1") == "1"
+# Ingredientes máximos guardados por receta
+MAX_INGREDIENTS = 40
+
+EXTRACTION_SYSTEM_PROMPT = (
+    "Extraes la lista de ingredientes de una receta de cocina. "
+    "Responde ÚNICAMENTE con un arreglo JSON, sin texto adicional, donde cada elemento tiene "
+    'la forma {"ingrediente": string, "cantidad": string o null, "unidad_medida": string o null}. '
+    'Ejemplo: [{"ingrediente": "arroz", "cantidad": "2", "unidad_medida": "tazas"}]. '
+    "Si el texto no contiene una receta responde []."
+)
+
+# Columnas de IngredienteFaltanteReceta: se recorta en lugar de descartar
+_FIELD_LIMITS = {"ingrediente": 200, "cantidad": 200, "unidad_medida": 50}
+
+_tasks: set = set()
+# Ingredientes ya extraídos por texto de respuesta: las respuestas servidas desde
+# la caché del chat se repiten tal cual y no necesitan otra llamada a Nova
+_extraidos = TTLCache(PROMPT_CACHE_SIZE, PROMPT_CACHE_TTL)
+_stats = {"extracted": 0, "reused": 0, "reuse_missed": 0}
+
+
+def _text_key(instrucciones: str) -> str:
+    return models.hash_instrucciones(instrucciones)
+
+
+class IngredientExtractionError(Exception):
+    """El modelo no devolvió una lista de ingredientes utilizable."""
+
+
+def parse_ingredients(raw: str) -> List[schemas.IngredienteCreate]:
+    """
+    Valida la salida JSON del modelo. Tolera texto o bloques ``` alrededor del
+    arreglo, descarta elementos inválidos y elimina ingredientes repetidos.
+    """
+    start, end = raw.find("["), raw.rfind("]")
+    if start == -1 or end < start:
+        raise IngredientExtractionError("La respuesta no contiene un arreglo JSON")
+    try:
+        items = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise IngredientExtractionError(f"JSON inválido: {e}")
+
+    ingredientes, seen = [], set()
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        values = {}
+        for field, limit in _FIELD_LIMITS.items():
+            value = item.get(field)
+            if value is not None:
+                value = str(value).strip()[:limit] or None
+            values[field] = value
+        try:
+            ingrediente = schemas.IngredienteCreate(**values)
+        except ValidationError:
+            continue
+        key = ingrediente.ingrediente.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        ingredientes.append(ingrediente)
+        if len(ingredientes) >= MAX_INGREDIENTS:
+            break
+    return ingredientes
+
+
+def extract_ingredients(instrucciones: str) -> List[schemas.IngredienteCreate]:
+    """Pide a Nova la lista estructurada de ingredientes (bloqueante, ejecutar en un hilo). Lanza BedrockError."""
+    raw = invoke_bedrock(
+        prompt=instrucciones,
+        max_tokens=800,
+        temperature=0.0,
+        system_prompt=EXTRACTION_SYSTEM_PROMPT,
+        priority=BACKGROUND, # Cede el turno al chat interactivo
+    )
+    return parse_ingredients(raw)
+
+
+async def extract_and_store(receta_id: int, instrucciones: str) -> int:
+    """Extrae los ingredientes de una receta y los guarda en un único INSERT. Devuelve cuántos guardó."""
+    ingredientes = [i.model_dump() for i in await run_in_threadpool(extract_ingredients, instrucciones)]
+    async with AsyncSessionLocal() as db:
+        await crud.replace_ingredientes(db, receta_id, ingredientes)
+    _extraidos.set(_text_key(instrucciones), ingredientes)
+    _stats["extracted"] += 1
+    return len(ingredientes)
+
+
+async def reuse_ingredients(receta_id: int, instrucciones: str) -> int:
+    """
+    Copia los ingredientes de la receta de la que salió una respuesta cacheada,
+    sin llamar a Nova. Devuelve cuántos guardó (0 si el origen aún no los tiene).
+    """
+    async with AsyncSessionLocal() as db:
+        ingredientes = _extraidos.get(_text_key(instrucciones))
+        if ingredientes is None:
+            # Extraídos en otro worker o antes de reiniciar: se leen de la receta de origen
+            ingredientes = await crud.get_ingredientes_por_instrucciones(db, instrucciones, excluir_id=receta_id)
+        if not ingredientes:
+            # La extracción del origen sigue en curso: la completa scripts/backfill_ingredientes.py
+            _stats["reuse_missed"] += 1
+            return 0
+        await crud.replace_ingredientes(db, receta_id, ingredientes)
+    _stats["reused"] += 1
+    return len(ingredientes)
+
+
+async def _extract_in_background(receta_id: int, instrucciones: str, from_cache: bool) -> None:
+    try:
+        if from_cache:
+            await reuse_ingredients(receta_id, instrucciones)
+        else:
+            await extract_and_store(receta_id, instrucciones)
+    except Exception as e:
+        print(f"No se pudieron extraer los ingredientes de la receta {receta_id}: {e}")
+
+
+def schedule_extraction(receta_id: int, instrucciones: str, from_cache: bool = False) -> None:
+    """
+    Lanza la extracción sin retrasar la respuesta al usuario. Con `from_cache`
+    (respuesta servida desde la caché del chat) se reutilizan los ingredientes ya extraídos.
+    """
+    if not INGREDIENT_EXTRACTION_ENABLED:
+        return
+    task = asyncio.create_task(_extract_in_background(receta_id, instrucciones, from_cache))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def extraction_stats() -> dict:
+    return {**_stats, "pending": len(_tasks)}
@@ -0,0 +1,187 @@
+# app/jobs.py
+import os
+import time
+import base64
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app import crud
+from app.bedrock_client import generate_image_with_titan
+from app.bedrock_scheduler import INTERACTIVE, BACKGROUND
+from app.database import AsyncSessionLocal
+from app.image_store import get_image_store
+from app.thumbnails import schedule_derivatives
+load_dotenv()
+
+# Generaciones de Titan simultáneas (mantenerlo por debajo del límite de Bedrock)
+IMAGE_JOB_CONCURRENCY = int(os.getenv("IMAGE_JOB_CONCURRENCY", "2"))
+# Segundos que se conservan los trabajos terminados para poder consultarlos
+IMAGE_JOB_RETENTION = float(os.getenv("IMAGE_JOB_RETENTION", "3600"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ImageGenerationError(Exception):
+    """No se pudo completar la generación (p. ej. la receta ya no existe)."""
+
+
+def generate_and_store_image(
+    prompt: str,
+    quality: str = "premium",
+    width: int = 1024,
+    height: int = 1024,
+    priority: int = INTERACTIVE,
+    deadline: Optional[float] = None,
+) -> tuple[str, str]:
+    """
+    Genera la imagen con Titan y la guarda en el almacén de imágenes.
+    Bloqueante: se ejecuta en un hilo. Devuelve (imagen_key, imagen_base64).
+    Lanza BedrockError si Titan no entrega la imagen.
+    """
+    image_base64_data = generate_image_with_titan(
+        prompt=prompt,
+        width=width,
+        height=height,
+        quality=quality,
+        output_image_path=None, # type: ignore
+        priority=priority,
+        deadline=deadline,
+    )
+    image_bytes = base64.b64decode(image_base64_data)
+    imagen_key = get_image_store().put(image_bytes)
+    # Las miniaturas WebP/AVIF se generan en su propio pool, sin retrasar la respuesta
+    schedule_derivatives(imagen_key, image_bytes)
+    return imagen_key, image_base64_data
+
+
+@dataclass
+class ImageJob:
+    receta_id: int
+    usuario_id: int
+    prompt: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = PENDING
+    error: Optional[str] = None
+    image_url: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    # Se incrementa en cada cambio de estado (lo usan los clientes SSE)
+    version: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "receta_id": self.receta_id,
+            "status": self.status,
+            "error": self.error,
+            "image_url": self.image_url,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ImageJobManager:
+    """
+    Cola de generación de imágenes en segundo plano.
+
+    El endpoint solo registra el trabajo y responde; un pool acotado de hilos
+    (IMAGE_JOB_CONCURRENCY) llama a Titan y guarda el resultado con
+    crud.update_receta. Las peticiones simultáneas para la misma receta
+    comparten un único trabajo.
+    """
+
+    def __init__(self, concurrency: int = IMAGE_JOB_CONCURRENCY, retention: float = IMAGE_JOB_RETENTION):
+        self.concurrency = concurrency
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="titan-job")
+        self._jobs: dict[str, ImageJob] = {}
+        self._active_by_receta: dict[int, str] = {}
+        self._tasks: set = set()
+        self._changed = asyncio.Condition()
+
+    def submit(self, receta_id: int, usuario_id: int, prompt: str) -> ImageJob:
+        """Encola la generación (o devuelve el trabajo en curso de esa receta)."""
+        self._prune()
+        active_id = self._active_by_receta.get(receta_id)
+        if active_id is not None:
+            return self._jobs[active_id]
+
+        job = ImageJob(receta_id=receta_id, usuario_id=usuario_id, prompt=prompt)
+        self._jobs[job.id] = job
+        self._active_by_receta[receta_id] = job.id
+        task = asyncio.create_task(self._run(job))
+        # Referencia fuerte para que el recolector no cancele la tarea
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        return self._jobs.get(job_id)
+
+    async def wait_for_change(self, job: ImageJob, version: int, timeout: float) -> bool:
+        """Espera a que el trabajo cambie de estado. Devuelve False si vence el timeout."""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: job.version != version), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def _update(self, job: ImageJob, **changes) -> None:
+        async with self._changed:
+            for key, value in changes.items():
+                setattr(job, key, value)
+            job.version += 1
+            self._changed.notify_all()
+
+    async def _run(self, job: ImageJob) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            # El pool tiene IMAGE_JOB_CONCURRENCY hilos: el resto espera su turno en la cola
+            imagen_key, _ = await loop.run_in_executor(self._executor, self._start_and_generate, loop, job)
+            async with AsyncSessionLocal() as db:
+                receta = await crud.update_receta(db=db, receta_id=job.receta_id, update_data={"imagen_key": imagen_key})
+            if receta is None:
+                raise ImageGenerationError("La receta fue eliminada durante la generación")
+            await self._update(job, status=DONE, image_url=receta.imagen_url, finished_at=time.time())
+        except Exception as e:
+            print(f"Error en el trabajo de imagen {job.id}: {e}")
+            await self._update(job, status=FAILED, error=str(e), finished_at=time.time())
+        finally:
+            self._active_by_receta.pop(job.receta_id, None)
+
+    def _start_and_generate(self, loop: asyncio.AbstractEventLoop, job: ImageJob) -> tuple[str, str]:
+        # Ya en un hilo del pool: se marca como "running" desde el event loop
+        asyncio.run_coroutine_threadsafe(self._update(job, status=RUNNING), loop)
+        # Los trabajos asíncronos van por el carril de segundo plano del planificador
+        return generate_and_store_image(job.prompt, priority=BACKGROUND)
+
+    def _prune(self) -> None:
+        limit = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < limit] # type: ignore
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {"concurrency": self.concurrency, **counts}
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+image_jobs = ImageJobManager()
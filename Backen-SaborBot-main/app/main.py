@@ -1,19 +1,40 @@
 # app/main.py
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
 from pydantic import BaseModel
-from app import crud, schemas
-from app.database import get_db
-from app.bedrock_client import invoke_bedrock, generate_image_with_titan
-from starlette.concurrency import run_in_threadpool
-from fastapi.responses import JSONResponse # Para devolver errores personalizados
-from sqlalchemy.orm import Session
-from typing import List
+from app import crud, models, schemas
+import json
+import random
+from datetime import datetime
+import orjson
+from app.database import get_db, AsyncSessionLocal, async_engine, pool_stats
+from app.bedrock_client import (
+    invoke_bedrock, stream_bedrock, client_manager, generate_images_with_titan,
+    TITAN_SIZES,
+    DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE,
+)
+from app.bedrock_errors import BedrockError, BedrockEmptyResponseError
+from app.bedrock_scheduler import bedrock_scheduler
+from app.cache import prompt_cache
+from app.jobs import image_jobs, ImageJob, generate_and_store_image
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from dotenv import load_dotenv
 from app.crud import verify_token
+from app import hashing, http_cache, thumbnails
+from app.search import build_boolean_query
+from app.ingredients import schedule_extraction, extraction_stats
+from app.menus import build_menu, generate_menu_images
+from app import shopping_list, conversations, write_buffer
+from app.image_store import get_image_store, ImageNotFound, IMAGE_MEDIA_TYPE
 from starlette.middleware.cors import CORSMiddleware
+from anyio.to_thread import current_default_thread_limiter
+from app import metrics, compression, fallbacks
 
 load_dotenv()  # carga las variables de .env
-app = FastAPI(title="AWS Nova & Titan Chef Bot API")
+# orjson serializa los listados de recetas y las imágenes en Base64 varias veces más rápido que json
+app = FastAPI(title="AWS Nova & Titan Chef Bot API", default_response_class=ORJSONResponse)
 
 # --- Configuración CORS ---
 origins = ["*"]
@@ -25,70 +46,355 @@ app.add_middleware(
     allow_methods=["*"],                # Permite todos los métodos (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],                # Permite todos los headers, incluyendo Content-Type y Authorization
 )
+# Brotli/gzip para respuestas JSON grandes (las imágenes y los streams pasan sin tocar)
+app.add_middleware(compression.CompressionMiddleware)
+# Se añade la última para quedar por fuera de todo y medir la petición completa (bytes ya comprimidos)
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.on_event("startup")
+async def startup():
+    # Clientes de Bedrock creados una sola vez (credenciales, endpoint y pool HTTP)
+    await run_in_threadpool(client_manager.warm)
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Primero se escriben las recetas pendientes del buffer (usan el pool)
+    await write_buffer.receta_buffer.drain()
+    # Cierra las conexiones del pool asíncrono al apagar el worker
+    await async_engine.dispose()
+    hashing.shutdown()
+    image_jobs.shutdown()
+    thumbnails.shutdown()
 
 
 ### --- Endpoints de Chat e Imagenes con Bedrock y Titan ---
 @app.post("/chat", response_model=schemas.ChatResponse)
-async def chat(req: schemas.ChatRequest, db: Session = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+async def chat(req: schemas.ChatRequest, request: Request, db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
     user_message = req.message
     user_id = int(token.sub) # type: ignore
     print(f"Usuario autenticado ID: {user_id}")
-    nova_response_text = await run_in_threadpool(
-        invoke_bedrock,
-        prompt=user_message
-    )
-    create_receta = await crud.create_receta(
-            db=db,
-            receta_data={
-                "titulo": f"Receta generada para: {user_message[:30]}...",
-                "promt_usuario": user_message,
-                "instrucciones": nova_response_text,
-                "imagen_receta_base64": None
-            },
-            usuario_id=user_id
-        )
+    deadline = fallbacks.request_deadline(request, fallbacks.CHAT_DEADLINE_SECONDS)
+    conversacion, history = await conversations.load_context(db, user_id, req.conversation_id, user_message)
+    use_cache = not conversations.has_context(conversacion, history)
+    degraded, source = False, "bedrock"
+    # Las preguntas repetidas (sin contexto previo) se responden desde la caché sin llamar a Bedrock
+    nova_response_text = await prompt_cache.get(user_message, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE) if use_cache else None
+    if nova_response_text is not None:
+        source = "cache"
+    else:
+        try:
+            nova_response_text = await run_in_threadpool(
+                invoke_bedrock,
+                prompt=user_message,
+                max_tokens=DEFAULT_MAX_TOKENS,
+                temperature=DEFAULT_TEMPERATURE,
+                system_prompt=conversations.system_prompt_for(conversacion),
+                history=history,
+                deadline=deadline,
+            )
+        except BedrockError as e:
+            print(f"Chat degradado ({type(e).__name__}): {e}")
+            nova_response_text, source = fallbacks.fallback_answer(
+                user_message, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, use_cache=use_cache
+            )
+            degraded = True
+        else:
+            if use_cache:
+                await prompt_cache.set(user_message, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, nova_response_text)
+
+    id_receta = None
+    # La plantilla de reserva no es una receta: no se guarda ni entra en la conversación
+    if source != "template":
+        create_receta = await write_buffer.create_receta(
+                db=db,
+                receta_data={
+                    "titulo": f"Receta generada para: {user_message[:30]}...",
+                    "promt_usuario": user_message,
+                    "instrucciones": nova_response_text,
+                },
+                usuario_id=user_id
+            )
+        id_receta = create_receta.id
+        await conversations.save_turn(db, conversacion.id, user_message, nova_response_text) # type: ignore
+        # Ingredientes estructurados en segundo plano (no retrasa la respuesta); si la
+        # respuesta salió de la caché se copian los de la receta original
+        schedule_extraction(create_receta.id, nova_response_text, from_cache=source == "cache") # type: ignore
     return schemas.ChatResponse(
         query=user_message,
         response=nova_response_text,
-        id_receta=create_receta.id # type: ignore
+        id_receta=id_receta, # type: ignore
+        conversation_id=conversacion.id, # type: ignore
+        degraded=degraded,
+    )
+
+def _ndjson(event: dict) -> str:
+    return orjson.dumps(event).decode() + "\n"
+
+@app.post("/chat/stream")
+async def chat_stream(req: schemas.ChatRequest, request: Request, token: schemas.TokenData = Depends(verify_token)):
+    """
+    Variante en streaming de /chat: devuelve NDJSON (una línea JSON por evento).
+    Eventos: {"type": "delta", "text": ...} por cada fragmento del modelo,
+    {"type": "done", "id_receta": ..., "conversation_id": ..., "degraded": ...} al final,
+    o {"type": "error", "message": ...} si Bedrock falla a mitad de la respuesta.
+    Si falla antes del primer fragmento se envía la respuesta de reserva con degraded=true.
+    La receta se guarda en la base de datos cuando el stream termina.
+    """
+    user_message = req.message
+    user_id = int(token.sub) # type: ignore
+    deadline = fallbacks.request_deadline(request, fallbacks.CHAT_DEADLINE_SECONDS)
+    # El contexto se carga antes de empezar a responder (así un 404 llega como tal)
+    async with AsyncSessionLocal() as db:
+        conversacion, history = await conversations.load_context(db, user_id, req.conversation_id, user_message)
+    use_cache = not conversations.has_context(conversacion, history)
+
+    async def event_stream():
+        degraded, source = False, "bedrock"
+        nova_response_text = await prompt_cache.get(user_message, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE) if use_cache else None
+        if nova_response_text is not None:
+            # Acierto de caché: la respuesta completa sale en un único fragmento
+            source = "cache"
+            yield _ndjson({"type": "delta", "text": nova_response_text})
+        else:
+            chunks = []
+            try:
+                text_stream = stream_bedrock(
+                    prompt=user_message,
+                    max_tokens=DEFAULT_MAX_TOKENS,
+                    temperature=DEFAULT_TEMPERATURE,
+                    system_prompt=conversations.system_prompt_for(conversacion),
+                    history=history,
+                    deadline=deadline,
+                )
+                async for text_chunk in iterate_in_threadpool(text_stream):
+                    chunks.append(text_chunk)
+                    yield _ndjson({"type": "delta", "text": text_chunk})
+                if not "".join(chunks).strip():
+                    raise BedrockEmptyResponseError("No se recibió respuesta del modelo de texto.")
+            except BedrockError as e:
+                print(f"Chat en streaming degradado ({type(e).__name__}): {e}")
+                if chunks:
+                    # Ya se envió parte de la respuesta: no se puede sustituir
+                    yield _ndjson({"type": "error", "message": str(e)})
+                    return
+                nova_response_text, source = fallbacks.fallback_answer(
+                    user_message, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, use_cache=use_cache
+                )
+                degraded = True
+                yield _ndjson({"type": "delta", "text": nova_response_text})
+            else:
+                nova_response_text = "".join(chunks).strip()
+                if use_cache:
+                    await prompt_cache.set(user_message, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE, nova_response_text)
+
+        if source == "template":
+            # La plantilla de reserva no se guarda como receta
+            yield _ndjson({"type": "done", "id_receta": None, "conversation_id": conversacion.id, "degraded": True})
+            return
+        # La sesión del Depends puede estar cerrada cuando termina el stream, usamos una propia
+        async with AsyncSessionLocal() as db:
+            create_receta = await write_buffer.create_receta(
+                db=db,
+                receta_data={
+                    "titulo": f"Receta generada para: {user_message[:30]}...",
+                    "promt_usuario": user_message,
+                    "instrucciones": nova_response_text,
+                },
+                usuario_id=user_id
+            )
+            await conversations.save_turn(db, conversacion.id, user_message, nova_response_text) # type: ignore
+        schedule_extraction(create_receta.id, nova_response_text, from_cache=source == "cache") # type: ignore
+        yield _ndjson({"type": "done", "id_receta": create_receta.id, "conversation_id": conversacion.id, "degraded": degraded})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 @app.post("/generate-image/{receta_id}", response_model=schemas.ImageResponse, )
-async def generate_image(receta_id: int,  db: Session = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+async def generate_image(receta_id: int, request: Request, db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
     """
     Genera una imagen basada en el prompt del usuario utilizando Amazon Titan Image Generator.
-    Devuelve la imagen en formato Base64.
+    Devuelve la imagen en formato Base64 (503/504 con Retry-After si Bedrock no responde).
     """
     receta = await crud.get_receta(db, receta_id)
     image_prompt = str(receta.promt_usuario) if (receta is not None and getattr(receta, "promt_usuario", None) is not None) else "Delicious food"
-    # Llama a la función de generación de imágenes en un threadpool
-    image_base64_data = await run_in_threadpool(
-        generate_image_with_titan,
-        prompt=image_prompt,
-        width=1024,
-        height=1024,
-        quality='premium',
-        output_image_path=None # Queremos los datos Base64 directamente # type: ignore
-    )
+    # Genera la imagen en un threadpool; se decodifica una sola vez y en la fila solo queda la clave
+    deadline = fallbacks.request_deadline(request, fallbacks.IMAGE_DEADLINE_SECONDS)
+    try:
+        imagen_key, image_base64_data = await run_in_threadpool(generate_and_store_image, image_prompt, deadline=deadline)
+    except BedrockError as e:
+        print(f"Error al generar la imagen de la receta {receta_id}: {e}")
+        return fallbacks.error_response(e)
 
-    if "Error" in image_base64_data: # Si la función devuelve un mensaje de error
-        return JSONResponse(status_code=500, content={"message": image_base64_data})
-    
-    await crud.update_receta(
+    updated_receta = await crud.update_receta(
             db=db,
             receta_id=receta_id,
-            update_data={"imagen_receta_base64": image_base64_data}
+            update_data={"imagen_key": imagen_key}
         )
     return schemas.ImageResponse(
-        image_base64=image_base64_data
+        image_base64=image_base64_data,
+        image_url=updated_receta.imagen_url if updated_receta else None
+    )
+
+@app.post("/recipes/{receta_id}/image-variants", response_model=schemas.ImageVariantsResponse)
+async def generate_image_variants(
+    receta_id: int,
+    batch: schemas.ImageBatchRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    token: schemas.TokenData = Depends(verify_token),
+):
+    """
+    Genera N variantes de la imagen de una receta en una sola invocación de Titan
+    (o en invocaciones paralelas con semillas distintas si N > 5). No se guardan.
+    """
+    receta = await crud.get_receta(db, receta_id)
+    if receta is None or receta.usuario_id != int(token.sub): # type: ignore
+        raise HTTPException(status_code=404, detail="Receta no encontrada")
+    width, height = TITAN_SIZES[batch.size]
+    seed = batch.seed if batch.seed is not None else random.randint(0, 2147483646)
+    deadline = fallbacks.request_deadline(request, fallbacks.IMAGE_DEADLINE_SECONDS)
+    try:
+        images = await run_in_threadpool(
+            generate_images_with_titan,
+            prompt=str(receta.promt_usuario or receta.titulo),
+            count=batch.n,
+            seed=seed,
+            quality=batch.quality,
+            width=width,
+            height=height,
+            deadline=deadline,
+        )
+    except BedrockError as e:
+        print(f"Error al invocar el modelo de Bedrock (imagen): {e}")
+        return fallbacks.error_response(e)
+    return {"images": images}
+
+@app.post("/recipes/{receta_id}/image-jobs", response_model=schemas.ImageJobOut, status_code=202)
+async def submit_image_job(receta_id: int, db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+    """
+    Encola la generación de la imagen de una receta y responde de inmediato con el trabajo.
+    El estado se consulta en GET /jobs/{id} o se sigue por SSE en GET /jobs/{id}/events.
+    """
+    user_id = int(token.sub) # type: ignore
+    receta = await crud.get_receta(db, receta_id)
+    if receta is None or receta.usuario_id != user_id:
+        raise HTTPException(status_code=404, detail="Receta no encontrada")
+    image_prompt = str(receta.promt_usuario) if receta.promt_usuario is not None else "Delicious food"
+    job = image_jobs.submit(receta_id=receta_id, usuario_id=user_id, prompt=image_prompt)
+    return job.to_dict()
+
+def _get_user_job(job_id: str, token: schemas.TokenData) -> ImageJob:
+    job = image_jobs.get(job_id)
+    if job is None or job.usuario_id != int(token.sub): # type: ignore
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+@app.get("/jobs/{job_id}", response_model=schemas.ImageJobOut)
+async def read_job(job_id: str, token: schemas.TokenData = Depends(verify_token)):
+    """Estado de un trabajo de generación de imagen."""
+    return _get_user_job(job_id, token).to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, token: schemas.TokenData = Depends(verify_token)):
+    """Server-Sent Events con cada cambio de estado del trabajo hasta que termina."""
+    job = _get_user_job(job_id, token)
+
+    async def event_stream():
+        while True:
+            version = job.version
+            yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+            if job.finished:
+                return
+            while not await image_jobs.wait_for_change(job, version, timeout=15):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
+@app.get("/recipes/{receta_id}/image")
+async def read_recipe_image(
+    receta_id: int,
+    request: Request,
+    w: Optional[int] = Query(None, ge=16, le=2048),
+    format: Optional[str] = Query(None, regex="^(avif|webp|png)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Sirve la imagen de una receta desde el almacén de imágenes.
+    Soporta If-None-Match (304) y peticiones Range (206).
+    Con ?w= devuelve un derivado reducido (AVIF/WebP según Accept o ?format=).
+    """
+    imagen_key = await crud.get_receta_imagen_key(db, receta_id)
+    if not imagen_key:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+
+    if w is not None and thumbnails.THUMBNAILS_ENABLED:
+        return await _read_recipe_thumbnail(imagen_key, w, format, request)
+
+    # La clave es el SHA-256 del contenido: sirve directamente como ETag fuerte
+    etag = f'"{imagen_key}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=86400",
+        "Accept-Ranges": "bytes",
+    }
+    if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    store = get_image_store()
+    try:
+        size = await run_in_threadpool(store.size, imagen_key)
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if if_range and if_range != etag:
+            # La copia parcial del cliente es de otra versión: se envía completa
+            range_header = None
+        try:
+            byte_range = http_cache.parse_range(range_header, size)
+        except http_cache.RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+        if byte_range is None:
+            data = await run_in_threadpool(store.read, imagen_key)
+            return Response(content=data, media_type=IMAGE_MEDIA_TYPE, headers=headers)
+
+        start, end = byte_range
+        data = await run_in_threadpool(store.read, imagen_key, start, end)
+    except ImageNotFound:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=data, status_code=206, media_type=IMAGE_MEDIA_TYPE, headers=headers)
+
+async def _read_recipe_thumbnail(imagen_key: str, w: int, fmt: Optional[str], request: Request) -> Response:
+    width = thumbnails.snap_width(w)
+    fmt = thumbnails.negotiate_format(fmt, request.headers.get("accept"))
+    etag = f'"{imagen_key}-{width}.{fmt}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=604800, immutable",
+        # El formato depende del Accept del cliente: las cachés intermedias deben distinguirlo
+        "Vary": "Accept",
+    }
+    if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        data = await thumbnails.get_derivative(imagen_key, width, fmt)
+    except ImageNotFound:
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    return Response(content=data, media_type=thumbnails.MEDIA_TYPES[fmt], headers=headers)
+
 # app/main.py
 
 @app.post("/auth", response_model=schemas.Authresponse)
-async def login(form_data: schemas.Authrequest, db: Session = Depends(get_db)):
+async def login(form_data: schemas.Authrequest, db: AsyncSession = Depends(get_db)):
     # Los datos vienen en form_data.email y form_data.password
-    user = crud.authenticate_user(db, form_data.email, form_data.password)
+    user = await crud.authenticate_user(db, form_data.email, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -100,29 +406,46 @@ async def login(form_data: schemas.Authrequest, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+def _not_modified(request: Request, headers: dict, last_modified: Optional[datetime]) -> bool:
+    return http_cache.not_modified(
+        request.headers.get("if-none-match"),
+        request.headers.get("if-modified-since"),
+        headers["ETag"],
+        last_modified,
+    )
+
 ### --- Endpoints de Usuarios (CRUD) ---
 @app.post("/users/", response_model=schemas.UserOut, status_code=201)
-async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
     """Crea un nuevo usuario."""
     db_user = await crud.get_usuario_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="El correo ya está registrado")
     # Aquí deberías hashear la contraseña (usando bcrypt, por ejemplo)
-    hashed_password = crud.hash_password(user.password)
+    hashed_password = await crud.hash_password_async(user.password)
     user_data = user.model_dump(exclude={"password"})
     user_data["hashed_password"] = hashed_password
     return await crud.create_usuario(db=db, user_data=user_data)
 
+@app.get("/users/me", response_model=schemas.UserOut)
+async def read_current_user(current_user: models.Usuario = Depends(crud.get_current_user)):
+    """Obtiene el usuario autenticado."""
+    return current_user
+
 @app.get("/users/{user_id}", response_model=schemas.UserOut)
-async def read_user(user_id: int, db: Session = Depends(get_db)):
-    """Obtiene un usuario por ID."""
+async def read_user(user_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Obtiene un usuario por ID. Soporta If-None-Match / If-Modified-Since (304)."""
     db_user = await crud.get_usuario(db, usuario_id=user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    headers = http_cache.validator_headers(f'"usuario-{user_id}-v{db_user.version}"', db_user.actualizado_en)
+    if _not_modified(request, headers, db_user.actualizado_en):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return db_user
 
 @app.get("/usersbymail/{email}", response_model=schemas.UserOut)
-async def read_user_by_mail(email: str, db: Session = Depends(get_db)):
+async def read_user_by_mail(email: str, db: AsyncSession = Depends(get_db)):
     """Obtiene un usuario por Email."""
     db_user = await crud.get_usuario_by_email(db, email=email)
     if db_user is None:
@@ -130,7 +453,7 @@ async def read_user_by_mail(email: str, db: Session = Depends(get_db)):
     return db_user
 
 @app.put("/users/{user_id}", response_model=schemas.UserUpdateResponse)
-async def update_user( user_id: int,usuario_data: schemas.UsuarioUpdate,db: Session = Depends(get_db)):
+async def update_user( user_id: int,usuario_data: schemas.UsuarioUpdate,db: AsyncSession = Depends(get_db)):
     """Obtiene un usuario por Email."""
     updated_user = await crud.update_usuario(db, user_id, usuario_data.model_dump(exclude_unset=True))
     if not updated_user:
@@ -145,15 +468,95 @@ async def update_user( user_id: int,usuario_data: schemas.UsuarioUpdate,db: Sess
 # --- Endpoints de Recetas (CRUD) ---
 
 
+async def _recetas_validators(db: AsyncSession, user_id: int, variant: str) -> tuple[Optional[dict], Optional[datetime]]:
+    """
+    ETag y Last-Modified de los listados del usuario a partir de usuario.version_recetas
+    (una lectura por clave primaria). `variant` distingue listados y páginas.
+    """
+    version = await crud.get_version_recetas(db, user_id)
+    if version is None:
+        return None, None
+    version_recetas, actualizadas_en = version
+    etag = f'"recetas-{user_id}-v{version_recetas}-{variant}"'
+    return http_cache.validator_headers(etag, actualizadas_en), actualizadas_en
+
 @app.get("/recetasbyuser", response_model=List[schemas.RecetaOut])
-async def read_recipes_for_user(db: Session = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
-    """Obtiene todas las recetas de un usuario."""
+async def read_recipes_for_user(request: Request, response: Response, db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+    """Obtiene todas las recetas de un usuario. Soporta If-None-Match / If-Modified-Since (304)."""
     user_id = int(token.sub) # type: ignore
+    # La versión se lee antes que las recetas: si cambian en medio, el próximo ETag no coincidirá
+    headers, last_modified = await _recetas_validators(db, user_id, "todas")
+    if headers and _not_modified(request, headers, last_modified):
+        return Response(status_code=304, headers=headers)
     recetas = await crud.get_recetas_by_usuario(db, usuario_id=user_id)
+    if headers:
+        response.headers.update(headers)
     return recetas
 
+@app.get("/recipes", response_model=schemas.RecetaPage)
+async def list_recipes(
+    request: Request,
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[int] = Query(None, description="next_cursor de la página anterior"),
+    db: AsyncSession = Depends(get_db),
+    token: schemas.TokenData = Depends(verify_token),
+):
+    """Lista paginada (keyset) de las recetas del usuario, sin instrucciones ni imagen."""
+    user_id = int(token.sub) # type: ignore
+    headers, last_modified = await _recetas_validators(db, user_id, f"p{limit}-{cursor or 0}")
+    if headers and _not_modified(request, headers, last_modified):
+        return Response(status_code=304, headers=headers)
+    # Se pide una fila extra para saber si hay otra página
+    recetas = await crud.get_recetas_page(db, usuario_id=user_id, limit=limit + 1, cursor=cursor)
+    next_cursor = recetas[limit - 1].id if len(recetas) > limit else None
+    if headers:
+        response.headers.update(headers)
+    return {"items": recetas[:limit], "next_cursor": next_cursor}
+
+@app.get("/recipes/search", response_model=schemas.RecetaSearchPage)
+async def search_recipes(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_db),
+    token: schemas.TokenData = Depends(verify_token),
+):
+    """Búsqueda de texto completo (título, prompt e instrucciones) en las recetas del usuario."""
+    user_id = int(token.sub) # type: ignore
+    boolean_query = build_boolean_query(q)
+    if not boolean_query:
+        return {"items": [], "next_offset": None}
+    rows = await crud.search_recetas(db, usuario_id=user_id, boolean_query=boolean_query, limit=limit + 1, offset=offset)
+    items = [
+        schemas.RecetaSearchHit(
+            id=receta.id, titulo=receta.titulo, promt_usuario=receta.promt_usuario,
+            usuario_id=receta.usuario_id, imagen_url=receta.imagen_url, score=score,
+        )
+        for receta, score in rows[:limit]
+    ]
+    return {"items": items, "next_offset": offset + limit if len(rows) > limit else None}
+
+@app.get("/recipes/{receta_id}", response_model=schemas.RecetaDetail)
+async def read_recipe(receta_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+    """
+    Obtiene el contenido completo de una receta del usuario, con sus ingredientes.
+    Soporta If-None-Match / If-Modified-Since: el 304 sale sin leer instrucciones ni ingredientes.
+    """
+    version = await crud.get_receta_version(db, receta_id)
+    if version is None or version.usuario_id != int(token.sub): # type: ignore
+        raise HTTPException(status_code=404, detail="Receta no encontrada")
+    headers = http_cache.validator_headers(f'"receta-{receta_id}-v{version.version}"', version.actualizada_en)
+    if _not_modified(request, headers, version.actualizada_en):
+        return Response(status_code=304, headers=headers)
+    receta = await crud.get_receta_detail(db, receta_id)
+    if receta is None:
+        raise HTTPException(status_code=404, detail="Receta no encontrada")
+    response.headers.update(headers)
+    return receta
+
 @app.delete("/recipes/{receta_id}", status_code=204)
-async def delete_recipe(receta_id: int, db: Session = Depends(get_db)):
+async def delete_recipe(receta_id: int, db: AsyncSession = Depends(get_db)):
     """Elimina una receta por ID."""
     success = await crud.delete_receta(db, receta_id=receta_id)
     if not success:
@@ -161,6 +564,182 @@ async def delete_recipe(receta_id: int, db: Session = Depends(get_db)):
     return {"message": "Receta eliminada correctamente"}
 
 
+# --- Endpoints de Conversaciones ---
+
+@app.get("/conversations", response_model=List[schemas.ConversacionOut])
+async def list_conversations(db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+    """Conversaciones del usuario, de la más reciente a la más antigua."""
+    return await crud.get_conversaciones_by_usuario(db, usuario_id=int(token.sub)) # type: ignore
+
+@app.get("/conversations/{conversation_id}", response_model=schemas.ConversacionDetail)
+async def read_conversation(
+    conversation_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    token: schemas.TokenData = Depends(verify_token),
+):
+    """Últimos mensajes de una conversación en orden cronológico (para retomarla en el front)."""
+    conversacion = await crud.get_conversacion(db, conversation_id)
+    if conversacion is None or conversacion.usuario_id != int(token.sub): # type: ignore
+        raise HTTPException(status_code=404, detail="Conversación no encontrada")
+    mensajes = await crud.get_ultimos_mensajes(db, conversation_id, limit=limit)
+    return {
+        "id": conversacion.id,
+        "titulo": conversacion.titulo,
+        "creada_en": conversacion.creada_en,
+        "mensajes": list(reversed(mensajes)),
+    }
+
+# --- Endpoints de Menú Semanal ---
+
+async def _get_user_menu(db: AsyncSession, menu_id: int, user_id: int) -> models.MenuSemanal:
+    menu = await crud.get_menu_semanal_detail(db, menu_id)
+    if menu is None or menu.usuario_id != user_id:
+        raise HTTPException(status_code=404, detail="Menú no encontrado")
+    return menu
+
+@app.post("/menus", response_model=schemas.MenuOut, status_code=201)
+async def create_menu(menu_req: schemas.MenuCreate, request: Request, db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+    """Crea un menú semanal con recetas del usuario, generando en paralelo las que falten."""
+    user_id = int(token.sub) # type: ignore
+    deadline = fallbacks.request_deadline(request, fallbacks.CHAT_DEADLINE_SECONDS)
+    db_menu = await build_menu(db, user_id, menu_req, deadline=deadline)
+    return await _get_user_menu(db, db_menu.id, user_id) # type: ignore
+
+@app.get("/menus", response_model=List[schemas.MenuSummary])
+async def list_menus(db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+    """Lista los menús semanales del usuario."""
+    return await crud.get_menus_by_usuario(db, usuario_id=int(token.sub)) # type: ignore
+
+@app.get("/menus/{menu_id}", response_model=schemas.MenuOut)
+async def read_menu(menu_id: int, db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+    """Obtiene un menú con sus recetas e ingredientes (número fijo de consultas)."""
+    return await _get_user_menu(db, menu_id, int(token.sub)) # type: ignore
+
+@app.post("/menus/{menu_id}/images", response_model=schemas.MenuImagesResponse)
+async def generate_menu_thumbnails(
+    menu_id: int,
+    req: schemas.MenuImagesRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    token: schemas.TokenData = Depends(verify_token),
+):
+    """Genera en paralelo las imágenes de todas las recetas del menú en una sola petición."""
+    menu = await _get_user_menu(db, menu_id, int(token.sub)) # type: ignore
+    width, height = TITAN_SIZES[req.size]
+    deadline = fallbacks.request_deadline(request, fallbacks.IMAGE_DEADLINE_SECONDS)
+    images = await generate_menu_images(db, menu, req.quality, width, height, req.solo_faltantes, deadline=deadline)
+    return {"menu_id": menu_id, "images": images}
+
+@app.get("/menus/{menu_id}/shopping-list", response_model=schemas.ShoppingListOut)
+async def read_shopping_list(menu_id: int, db: AsyncSession = Depends(get_db), token: schemas.TokenData = Depends(verify_token)):
+    """Lista de compras consolidada del menú (ingredientes agrupados y unidades normalizadas)."""
+    menu = await crud.get_menu_semanal(db, menu_id)
+    if menu is None or menu.usuario_id != int(token.sub): # type: ignore
+        raise HTTPException(status_code=404, detail="Menú no encontrado")
+
+    items = shopping_list.get_cached(menu_id)
+    if items is None:
+        read_generation = shopping_list.generation()
+        rows = await crud.get_filas_lista_compras(db, menu_id)
+        items = shopping_list.aggregate(
+            (row.ingrediente, row.cantidad, row.unidad_medida, row.receta_id)
+            for row in rows if row.ingrediente is not None
+        )
+        shopping_list.store(menu_id, {row.receta_id for row in rows}, items, read_generation)
+    return {"menu_id": menu_id, "items": items}
+
+
+# --- Estadísticas internas ---
+
+@app.get("/stats/hashing")
+async def read_hashing_stats():
+    """Profundidad de cola y ocupación del pool de hashing de contraseñas."""
+    return hashing.hashing_stats()
+
+@app.get("/stats/bedrock")
+async def read_bedrock_stats():
+    """Uso del pool de conexiones de los clientes de Bedrock."""
+    return client_manager.stats()
+
+@app.get("/stats/bedrock/scheduler")
+async def read_bedrock_scheduler_stats():
+    """Por modelo: límite de concurrencia adaptativo, cola por carril, esperas y throttling."""
+    return bedrock_scheduler.stats()
+
+@app.get("/stats/cache")
+async def read_cache_stats():
+    """Aciertos y fallos de la caché de respuestas del chat."""
+    return prompt_cache.stats()
+
+@app.get("/stats/jobs")
+async def read_job_stats():
+    """Trabajos de imagen por estado."""
+    return image_jobs.stats()
+
+@app.get("/stats/thumbnails")
+async def read_thumbnail_stats():
+    """Derivados de imagen generados y servidos desde disco."""
+    return thumbnails.thumbnail_stats()
+
+@app.get("/stats/compression")
+async def read_compression_stats():
+    """Respuestas comprimidas, omitidas y bytes ahorrados."""
+    return compression.compression_stats()
+
+@app.get("/stats/ingredients")
+async def read_ingredient_stats():
+    """Extracciones de ingredientes con Nova y reutilizadas para respuestas cacheadas."""
+    return extraction_stats()
+
+@app.get("/stats/write-buffer")
+async def read_write_buffer_stats():
+    """Lotes de recetas escritos por el buffer de /chat (RECETA_WRITE_BUFFER)."""
+    return write_buffer.receta_buffer.stats()
+
+@app.get("/stats/fallbacks")
+async def read_fallback_stats():
+    """Respuestas de chat degradadas servidas desde la caché o desde la plantilla local."""
+    return fallbacks.fallback_stats()
+
+@app.get("/stats/db")
+async def read_db_stats():
+    """Uso del pool de conexiones a MySQL (checkouts, overflow, saturación)."""
+    return pool_stats()
+
+
+def threadpool_stats() -> dict:
+    """Ocupación del threadpool de Starlette (run_in_threadpool): hilos en uso y tareas esperando."""
+    limiter_stats = current_default_thread_limiter().statistics()
+    return {
+        "total_tokens": limiter_stats.total_tokens,
+        "borrowed_tokens": limiter_stats.borrowed_tokens,
+        "tasks_waiting": limiter_stats.tasks_waiting,
+    }
+
+@app.get("/stats/threadpool")
+async def read_threadpool_stats():
+    """Hilos ocupados y cola del threadpool donde corren Bedrock y otras llamadas bloqueantes."""
+    return threadpool_stats()
+
+metrics.register_collector("threadpool", threadpool_stats)
+metrics.register_collector("hashing", hashing.hashing_stats)
+metrics.register_collector("bedrock_pool", client_manager.stats, label="family")
+metrics.register_collector("bedrock_scheduler", bedrock_scheduler.stats, label="model")
+metrics.register_collector("prompt_cache", prompt_cache.stats)
+metrics.register_collector("image_jobs", image_jobs.stats)
+metrics.register_collector("thumbnails", thumbnails.thumbnail_stats)
+metrics.register_collector("compression", compression.compression_stats)
+metrics.register_collector("ingredient_extraction", extraction_stats)
+metrics.register_collector("receta_write_buffer", write_buffer.receta_buffer.stats)
+metrics.register_collector("chat_fallbacks", fallbacks.fallback_stats)
+metrics.register_collector("db_pool", pool_stats, label="engine")
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """Métricas en formato de texto de Prometheus."""
+    # Se genera en el event loop: el limitador de hilos de anyio solo se consulta desde aquí
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/")
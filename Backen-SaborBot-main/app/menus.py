@@ -0,0 +1,120 @@
+# app/menus.py
+import asyncio
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app import crud, models, schemas
+from app.bedrock_client import invoke_bedrock, TITAN_BATCH_CONCURRENCY
+from app.bedrock_errors import BedrockError
+from app.ingredients import schedule_extraction
+from app.jobs import generate_and_store_image
+
+DIAS_SEMANA = ("lunes", "martes", "miércoles", "jueves", "viernes", "sábado", "domingo")
+
+
+def _titulo_desde_respuesta(texto: str, dia: str) -> str:
+    """Usa la primera línea de la receta generada como título."""
+    for linea in texto.splitlines():
+        linea = linea.strip().strip("#*").strip()
+        if linea:
+            return linea[:200]
+    return f"Receta para el {dia}"
+
+
+async def _generar_receta_del_dia(dia: str, preferencias: Optional[str], deadline: Optional[float] = None) -> Optional[dict]:
+    prompt = f"Propón una receta completa para la comida del {dia}, con ingredientes y pasos."
+    if preferencias:
+        prompt += f" Preferencias: {preferencias}"
+    try:
+        texto = await run_in_threadpool(invoke_bedrock, prompt=prompt, deadline=deadline)
+    except BedrockError as e:
+        print(f"No se pudo generar la receta del {dia}: {e}")
+        return None
+    return {"titulo": _titulo_desde_respuesta(texto, dia), "promt_usuario": prompt, "instrucciones": texto}
+
+
+async def build_menu(
+    db: AsyncSession, usuario_id: int, menu_req: schemas.MenuCreate, deadline: Optional[float] = None
+) -> models.MenuSemanal:
+    """
+    Arma un menú semanal con recetas del usuario y, si faltan días, genera el
+    resto con Bedrock (una llamada concurrente por día, todas con el plazo de la petición).
+    """
+    if menu_req.receta_ids:
+        receta_ids = list(dict.fromkeys(menu_req.receta_ids))[: menu_req.dias]
+        recetas = await crud.get_recetas_de_usuario_por_ids(db, usuario_id, receta_ids)
+        if len(recetas) != len(receta_ids):
+            raise HTTPException(status_code=404, detail="Alguna receta no existe o no es del usuario")
+    else:
+        recetas = await crud.get_recetas_page(db, usuario_id=usuario_id, limit=menu_req.dias)
+        receta_ids = [receta.id for receta in recetas]
+    # Día del menú de cada receta (0 = fecha_inicio)
+    posiciones = list(range(len(receta_ids)))
+
+    faltan = menu_req.dias - len(receta_ids)
+    if faltan > 0 and menu_req.generar_faltantes:
+        pendientes = range(len(receta_ids), menu_req.dias)
+        dias = [DIAS_SEMANA[(menu_req.fecha_inicio + timedelta(days=i)).weekday()] for i in pendientes]
+        generadas = await asyncio.gather(*(_generar_receta_del_dia(dia, menu_req.preferencias, deadline) for dia in dias))
+        nuevas = await crud.create_recetas(db, [g for g in generadas if g is not None], usuario_id=usuario_id)
+        for receta in nuevas:
+            schedule_extraction(receta.id, receta.instrucciones) # type: ignore
+        receta_ids += [receta.id for receta in nuevas]
+        # Un día cuya generación falló queda vacío: las demás recetas conservan su día
+        posiciones += [i for i, g in zip(pendientes, generadas) if g is not None]
+
+    fecha_fin: date = menu_req.fecha_inicio + timedelta(days=menu_req.dias - 1)
+    db_menu = await crud.create_menu_semanal_con_recetas(
+        db,
+        menu_data={
+            "fecha_inicio": menu_req.fecha_inicio.isoformat(),
+            "fecha_fin": fecha_fin.isoformat(),
+            "descripcion": menu_req.descripcion,
+        },
+        usuario_id=usuario_id,
+        receta_ids=receta_ids, # type: ignore
+        posiciones=posiciones,
+    )
+    return db_menu
+
+
+async def generate_menu_images(
+    db: AsyncSession,
+    menu: models.MenuSemanal,
+    quality: str,
+    width: int,
+    height: int,
+    solo_faltantes: bool = True,
+    deadline: Optional[float] = None,
+) -> list[dict]:
+    """
+    Genera en paralelo (máx. TITAN_BATCH_CONCURRENCY a la vez) una imagen por
+    receta del menú, las guarda y actualiza todas las recetas en un solo UPDATE.
+    Las que no terminan antes de `deadline` quedan con su error en el resultado.
+    """
+    semaphore = asyncio.Semaphore(TITAN_BATCH_CONCURRENCY)
+    recetas = [r for r in menu.recetas_asociadas if not (solo_faltantes and r.imagen_key)]
+
+    async def generar(receta: models.Receta) -> dict:
+        prompt = str(receta.promt_usuario or receta.titulo)
+        async with semaphore:
+            try:
+                imagen_key, _ = await run_in_threadpool(generate_and_store_image, prompt, quality, width, height, deadline=deadline)
+            except BedrockError as e:
+                return {"receta_id": receta.id, "error": str(e)}
+        return {"receta_id": receta.id, "imagen_key": imagen_key}
+
+    resultados = await asyncio.gather(*(generar(r) for r in recetas))
+    await crud.set_imagenes_recetas(db, {r["receta_id"]: r["imagen_key"] for r in resultados if "imagen_key" in r})
+    return [
+        {
+            "receta_id": r["receta_id"],
+            "image_url": f"/recipes/{r['receta_id']}/image" if "imagen_key" in r else None,
+            "error": r.get("error"),
+        }
+        for r in resultados
+    ]
@@ -0,0 +1,261 @@
+# app/metrics.py
+# Métricas en formato de texto de Prometheus, sin dependencias externas.
+#
+# - Histogramas de latencia por ruta y tamaño de respuesta (MetricsMiddleware).
+# - Tiempo de base de datos por petición: los eventos before/after_cursor_execute
+#   de SQLAlchemy suman al acumulador de la petición en curso (contextvar).
+# - Bedrock: tiempo hasta el primer token y tiempo total por modelo.
+# - Colectores: convierten en gauges los /stats/* existentes al exportar /metrics.
+import time
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PREFIX = "saborbot"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Bedrock tarda segundos (y las imágenes decenas de segundos)
+BEDROCK_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+_INF_LE = 'le="+Inf"'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = f"{PREFIX}_{name}", help, labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = f"{PREFIX}_{name}", help, labelnames
+        self.buckets = tuple(buckets)
+        # Por combinación de etiquetas: [conteos por bucket..., suma, total]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, _INF_LE)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+# --- Métricas de la API ---
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta", ("method", "route", "status"),
+)
+http_response_size = Histogram(
+    "http_response_size_bytes", "Tamaño del cuerpo de las respuestas por ruta", ("method", "route"), SIZE_BUCKETS,
+)
+http_request_db_time = Histogram(
+    "http_request_db_seconds", "Tiempo total en consultas SQL por petición", ("method", "route"),
+)
+http_request_db_queries = Histogram(
+    "http_request_db_queries", "Consultas SQL por petición", ("method", "route"), (0, 1, 2, 3, 5, 8, 13, 21, 50),
+)
+db_query_duration = Histogram("db_query_duration_seconds", "Latencia de cada consulta SQL", ("engine",))
+bedrock_time_to_first_token = Histogram(
+    "bedrock_time_to_first_token_seconds", "Tiempo hasta el primer fragmento de texto", ("model",), BEDROCK_BUCKETS,
+)
+bedrock_duration = Histogram(
+    "bedrock_duration_seconds", "Duración total de las invocaciones a Bedrock", ("model", "outcome"), BEDROCK_BUCKETS,
+)
+bedrock_output_chars = Counter("bedrock_output_chars_total", "Caracteres generados por modelo", ("model",))
+
+METRICS = [
+    http_request_duration, http_response_size, http_request_db_time, http_request_db_queries,
+    db_query_duration, bedrock_time_to_first_token, bedrock_duration, bedrock_output_chars,
+]
+
+
+# --- Tiempo de base de datos por petición ---
+
+class _DbTimer:
+    __slots__ = ("seconds", "queries")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+
+_request_db: ContextVar[Optional[_DbTimer]] = ContextVar("request_db", default=None)
+
+
+def instrument_engine(sync_engine: Engine, name: str) -> None:
+    """Mide cada consulta del motor y la suma al tiempo de BD de la petición en curso."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_duration.observe(elapsed, engine=name)
+        # SQLAlchemy propaga el contexto del task al greenlet del driver asyncio
+        timer = _request_db.get()
+        if timer is not None:
+            timer.seconds += elapsed
+            timer.queries += 1
+
+
+# --- Middleware ASGI ---
+
+class MetricsMiddleware:
+    """
+    Mide cada petición HTTP: latencia hasta el último byte (también en streams),
+    tamaño de la respuesta y tiempo de BD. La ruta se etiqueta con su plantilla
+    (/recipes/{receta_id}) para no crear una serie por cada id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timer = _DbTimer()
+        token = _request_db.set(timer)
+        state = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_db.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - start, method=method, route=route, status=str(state["status"]))
+            http_response_size.observe(state["size"], method=method, route=route)
+            http_request_db_time.observe(timer.seconds, method=method, route=route)
+            http_request_db_queries.observe(timer.queries, method=method, route=route)
+
+
+# --- Bedrock ---
+
+def observe_bedrock(model: str, start: float, outcome: str) -> None:
+    bedrock_duration.observe(time.perf_counter() - start, model=model, outcome=outcome)
+
+
+# --- Exportación de /stats/* como gauges ---
+
+_collectors: list[tuple[str, Optional[str], Callable[[], dict]]] = []
+
+
+def register_collector(name: str, collect: Callable[[], dict], label: Optional[str] = None) -> None:
+    """
+    Exporta en /metrics un dict de estadísticas como gauges <prefix>_<name>_<clave>.
+    Con `label`, las claves del primer nivel pasan a ser el valor de esa etiqueta.
+    """
+    _collectors.append((name, label, collect))
+
+
+def _flatten(stats: dict, path: str = "") -> Iterable[tuple[str, float]]:
+    for key, value in stats.items():
+        name = f"{path}_{key}" if path else str(key)
+        if isinstance(value, bool):
+            yield name, int(value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+        elif isinstance(value, dict):
+            yield from _flatten(value, name)
+
+
+def _sanitize(name: str) -> str:
+    return "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+
+
+def _render_collector(name: str, label: Optional[str], stats: dict) -> list[str]:
+    samples: dict[str, list[str]] = {}
+    groups = stats.items() if label else [(None, stats)]
+    for label_value, group in groups:
+        if not isinstance(group, dict):
+            continue
+        labels = _labels((label,), (label_value,)) if label else ""
+        for key, value in _flatten(group):
+            metric = _sanitize(f"{PREFIX}_{name}_{key}")
+            samples.setdefault(metric, []).append(f"{metric}{labels} {_number(value)}")
+    lines = []
+    for metric, metric_lines in samples.items():
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(metric_lines)
+    return lines
+
+
+def render() -> str:
+    """Todas las métricas en formato de exposición de texto de Prometheus 0.0.4."""
+    lines: list[str] = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, label, collect in _collectors:
+        try:
+            lines.extend(_render_collector(name, label, collect()))
+        except Exception as e:
+            print(f"Error al exportar las métricas de {name}: {e}")
+    return "\n".join(lines) + "\n"
@@ -1,22 +1,36 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Table
-from sqlalchemy.orm import relationship
+import hashlib
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Table, Index, func
+from sqlalchemy.orm import relationship, validates
 from .database import Base
 
+
+def hash_instrucciones(instrucciones: str) -> str:
+    """SHA-256 del texto de una receta (localiza recetas con la misma respuesta del chat)."""
+    return hashlib.sha256(instrucciones.encode()).hexdigest()
+
 # --- Tabla de asociación Muchos a Muchos ---
 receta_menu_semanal = Table(
     "recetamenusemanal",
     Base.metadata,
     Column("menu_semanal_id", Integer, ForeignKey("menusemanal.id"), primary_key=True),
     Column("receta_id", Integer, ForeignKey("receta.id"), primary_key=True),
+    # Día del menú (0 = fecha_inicio) que build_menu asignó a la receta
+    Column("posicion", Integer, nullable=False, server_default="0"),
 )
 
 class Usuario(Base):
     __tablename__ = "usuario"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     nombre = Column(String(100), nullable=False)
     apellido = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, index=True, nullable=False)
     hashed_password = Column(String(255), nullable=False)
+    # Versión de la fila y de la colección de recetas del usuario: ETags sin leer las recetas (ver app/http_cache.py)
+    version = Column(Integer, nullable=False, server_default="1")
+    actualizado_en = Column(DateTime, nullable=False, server_default=func.now())
+    version_recetas = Column(Integer, nullable=False, server_default="1")
+    recetas_actualizadas_en = Column(DateTime, nullable=False, server_default=func.now())
 
     # Relación 1: Usuario → Recetas
     recetas = relationship("Receta", back_populates="usuario")
@@ -24,14 +38,24 @@ class Usuario(Base):
     # Relación 2: Usuario → Menús Semanales
     menus_semanales = relationship("MenuSemanal", back_populates="usuario")
 
+    # Relación 5: Usuario → Conversaciones del chat
+    conversaciones = relationship("Conversacion", back_populates="usuario")
+
 
 class Receta(Base):
     __tablename__ = "receta"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     titulo = Column(String(200), nullable=False)
     promt_usuario = Column(Text, nullable=True)
     instrucciones = Column(Text, nullable=False)
-    imagen_receta_base64 = Column(Text(length=2**32), nullable=True)
+    # Hash de instrucciones (lo asigna _set_instrucciones_sha256): una respuesta servida desde
+    # la caché del chat encuentra por índice la receta de la que salió
+    instrucciones_sha256 = Column(String(64), nullable=True)
+    # SHA-256 de la imagen guardada en el almacén de imágenes (app/image_store.py)
+    imagen_key = Column(String(64), nullable=True)
+    # Se incrementa en cada cambio de la receta o de sus ingredientes (ETag de /recipes/{id})
+    version = Column(Integer, nullable=False, server_default="1")
+    actualizada_en = Column(DateTime, nullable=False, server_default=func.now())
 
     usuario_id = Column(Integer, ForeignKey("usuario.id"), nullable=False)
     usuario = relationship("Usuario", back_populates="recetas")
@@ -44,12 +68,35 @@ class Receta(Base):
     )
 
     # Relación 4: Receta ↔ Ingredientes faltantes
-    ingredientes_faltantes = relationship("IngredienteFaltanteReceta", back_populates="receta")
+    # Se borran con la receta (ON DELETE CASCADE en la base de datos, sin cargarlos antes)
+    ingredientes_faltantes = relationship(
+        "IngredienteFaltanteReceta",
+        back_populates="receta",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        # Listados por usuario ordenados por id (keyset); también sirve al FK
+        Index("ix_receta_usuario_id_id", "usuario_id", "id"),
+        Index("ix_receta_instrucciones_sha256", "instrucciones_sha256"),
+        # Índice FULLTEXT para la búsqueda de recetas (ver app/search.py)
+        Index("ft_receta_texto", "titulo", "promt_usuario", "instrucciones", mysql_prefix="FULLTEXT"),
+    )
+
+    @validates("instrucciones")
+    def _set_instrucciones_sha256(self, key, value):
+        self.instrucciones_sha256 = hash_instrucciones(value) if value is not None else None
+        return value
+
+    @property
+    def imagen_url(self):
+        return f"/recipes/{self.id}/image" if self.imagen_key else None
 
 
 class MenuSemanal(Base):
     __tablename__ = "menusemanal"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     fecha_inicio = Column(String(10), nullable=False)  # Formato YYYY-MM-DD
     fecha_fin = Column(String(10), nullable=False)
     descripcion = Column(Text, nullable=True)
@@ -57,20 +104,66 @@ class MenuSemanal(Base):
     usuario_id = Column(Integer, ForeignKey("usuario.id"), nullable=False)
     usuario = relationship("Usuario", back_populates="menus_semanales")
 
-    # Relación 3: Menú Semanal ↔ Recetas (M:M)
+    # Relación 3: Menú Semanal ↔ Recetas (M:M), en el orden de los días del menú
     recetas_asociadas = relationship(
         "Receta",
         secondary=receta_menu_semanal,
-        back_populates="menus_asociados"
+        back_populates="menus_asociados",
+        order_by=receta_menu_semanal.c.posicion,
+    )
+
+    __table_args__ = (
+        Index("ix_menusemanal_usuario_id_id", "usuario_id", "id"),
     )
 
 
 class IngredienteFaltanteReceta(Base):
     __tablename__ = "ingredientefaltantereceta"
-    id = Column(Integer, primary_key=True, index=True)
-    receta_id = Column(Integer, ForeignKey("receta.id"), nullable=False)
+    id = Column(Integer, primary_key=True)
+    receta_id = Column(Integer, ForeignKey("receta.id", ondelete="CASCADE"), nullable=False)
     ingrediente = Column(String(200), nullable=False)
     cantidad = Column(String(200), nullable=True)
     unidad_medida = Column(String(50), nullable=True)
 
     receta = relationship("Receta", back_populates="ingredientes_faltantes")
+
+    __table_args__ = (
+        Index("ix_ingredientefaltantereceta_receta_id", "receta_id"),
+    )
+
+
+class Conversacion(Base):
+    __tablename__ = "conversacion"
+    id = Column(Integer, primary_key=True)
+    titulo = Column(String(200), nullable=False)
+    creada_en = Column(DateTime, nullable=False, server_default=func.now())
+    # Resumen de los turnos que ya no caben en la ventana de contexto (ver app/conversations.py)
+    resumen = Column(Text, nullable=True)
+    # Último mensaje incluido en el resumen
+    resumen_hasta_id = Column(Integer, nullable=True)
+
+    usuario_id = Column(Integer, ForeignKey("usuario.id"), nullable=False)
+    usuario = relationship("Usuario", back_populates="conversaciones")
+
+    mensajes = relationship("MensajeConversacion", back_populates="conversacion")
+
+    __table_args__ = (
+        Index("ix_conversacion_usuario_id_id", "usuario_id", "id"),
+    )
+
+
+class MensajeConversacion(Base):
+    __tablename__ = "mensajeconversacion"
+    id = Column(Integer, primary_key=True)
+    conversacion_id = Column(Integer, ForeignKey("conversacion.id"), nullable=False)
+    rol = Column(String(10), nullable=False)  # "user" o "assistant"
+    contenido = Column(Text, nullable=False)
+    # Tokens estimados del contenido: la ventana se arma sin volver a medir el texto
+    tokens = Column(Integer, nullable=False)
+
+    conversacion = relationship("Conversacion", back_populates="mensajes")
+
+    __table_args__ = (
+        # Últimos mensajes de una conversación (id desc)
+        Index("ix_mensajeconversacion_conversacion_id_id", "conversacion_id", "id"),
+    )
@@ -1,8 +1,9 @@
 # app/schemas.py
 from pydantic import BaseModel
 
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import date, datetime
 
 # --- Esquemas para Usuario ---
 class UserBase(BaseModel):
@@ -28,7 +29,6 @@ class RecetaBase(BaseModel):
     titulo: str
     promt_usuario: Optional[str] = None
     instrucciones: str
-    imagen_receta_base64: Optional[str] = None
 
 class RecetaCreate(RecetaBase):
     pass # Usa el mismo esquema base para crear
@@ -36,9 +36,88 @@ class RecetaCreate(RecetaBase):
 class RecetaOut(RecetaBase):
     id: int
     usuario_id: int
+    imagen_url: Optional[str] = None
+    class Config:
+        from_attributes = True
+
+# --- Esquemas para Ingredientes ---
+class IngredienteCreate(BaseModel):
+    ingrediente: str = Field(min_length=1, max_length=200)
+    cantidad: Optional[str] = Field(default=None, max_length=200)
+    unidad_medida: Optional[str] = Field(default=None, max_length=50)
+
+class IngredienteOut(IngredienteCreate):
+    id: int
+    receta_id: int
     class Config:
         from_attributes = True
 
+class RecetaDetail(RecetaOut):
+    ingredientes_faltantes: List[IngredienteOut] = []
+
+class RecetaSummary(BaseModel):
+    # Vista ligera para listados: sin instrucciones ni imagen
+    id: int
+    titulo: str
+    promt_usuario: Optional[str] = None
+    usuario_id: int
+    imagen_url: Optional[str] = None
+    class Config:
+        from_attributes = True
+
+class RecetaPage(BaseModel):
+    items: List[RecetaSummary]
+    # id a pasar como ?cursor= para la siguiente página (None si no hay más)
+    next_cursor: Optional[int] = None
+
+# --- Esquemas para Menú Semanal ---
+class MenuCreate(BaseModel):
+    fecha_inicio: date
+    dias: int = Field(default=7, ge=1, le=7)
+    # Recetas propias a incluir, en orden de día (las sobrantes se ignoran); sin
+    # receta_ids se usan las más recientes. Los días restantes se generan si generar_faltantes
+    receta_ids: Optional[List[int]] = None
+    # Genera con Bedrock (en paralelo) las recetas de los días que falten
+    generar_faltantes: bool = True
+    preferencias: Optional[str] = Field(default=None, max_length=300)
+    descripcion: Optional[str] = None
+
+class MenuRecetaOut(RecetaSummary):
+    ingredientes_faltantes: List[IngredienteOut] = []
+
+class MenuSummary(BaseModel):
+    id: int
+    fecha_inicio: str
+    fecha_fin: str
+    descripcion: Optional[str] = None
+    usuario_id: int
+    class Config:
+        from_attributes = True
+
+class MenuOut(MenuSummary):
+    recetas_asociadas: List[MenuRecetaOut] = []
+
+class ShoppingListItem(BaseModel):
+    ingrediente: str
+    # Total en la unidad normalizada (g/kg, ml/l, unidad...); None si no se pudo sumar
+    cantidad: Optional[float] = None
+    unidad: Optional[str] = None
+    # Cantidades que no se pudieron interpretar ("al gusto", "un puñado")
+    cantidades_sin_convertir: List[str] = []
+    recetas: List[int]
+
+class ShoppingListOut(BaseModel):
+    menu_id: int
+    items: List[ShoppingListItem]
+
+class RecetaSearchHit(RecetaSummary):
+    score: float
+
+class RecetaSearchPage(BaseModel):
+    items: List[RecetaSearchHit]
+    # offset a pasar para la siguiente página (None si no hay más)
+    next_offset: Optional[int] = None
+
 class UsuarioUpdate(BaseModel):
     nombre: Optional[str] = None
     apellido: Optional[str] = None
@@ -55,14 +134,75 @@ class Authresponse(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
+    # Sin conversation_id se abre una conversación nueva
+    conversation_id: Optional[int] = None
 
 class ChatResponse(BaseModel):
     query: str
     response: str
-    id_receta:int
+    # None si la respuesta es la plantilla de reserva (no se guarda como receta)
+    id_receta: Optional[int] = None
+    conversation_id: Optional[int] = None
+    # True si Bedrock no respondió y se usó una respuesta de reserva (caché o plantilla)
+    degraded: bool = False
+
+class ConversacionOut(BaseModel):
+    id: int
+    titulo: str
+    creada_en: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class MensajeOut(BaseModel):
+    id: int
+    rol: str
+    contenido: str
+
+    class Config:
+        from_attributes = True
+
+class ConversacionDetail(ConversacionOut):
+    mensajes: List[MensajeOut]
     
 class ImageResponse(BaseModel):
     image_base64: str # Devuelve la imagen como una cadena Base64
+    image_url: Optional[str] = None # URL estable de la imagen guardada
+
+class ImageBatchRequest(BaseModel):
+    # Variantes a generar: hasta 5 salen de una sola invocación de Titan
+    n: int = Field(default=3, ge=1, le=10)
+    quality: Literal["standard", "premium"] = "standard"
+    # small=512x512, medium=768x768, large=1024x1024
+    size: Literal["small", "medium", "large"] = "small"
+    seed: Optional[int] = Field(default=None, ge=0, le=2147483646)
+
+class ImageVariantsResponse(BaseModel):
+    images: List[str] # Imágenes en Base64
+
+class MenuImagesRequest(BaseModel):
+    quality: Literal["standard", "premium"] = "standard"
+    size: Literal["small", "medium", "large"] = "small"
+    # Solo las recetas del menú que aún no tienen imagen
+    solo_faltantes: bool = True
+
+class MenuImageResult(BaseModel):
+    receta_id: int
+    image_url: Optional[str] = None
+    error: Optional[str] = None
+
+class MenuImagesResponse(BaseModel):
+    menu_id: int
+    images: List[MenuImageResult]
+
+class ImageJobOut(BaseModel):
+    id: str
+    receta_id: int
+    status: str # pending | running | done | failed
+    error: Optional[str] = None
+    image_url: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
 
 class TokenData(BaseModel):
     # El campo 'sub' (subject) se usa típicamente para el ID del usuario.
@@ -0,0 +1,72 @@
+# app/search.py
+# Construcción de consultas para el índice FULLTEXT de recetas (titulo, promt_usuario, instrucciones).
+#
+# InnoDB mantiene el índice al insertar/actualizar/borrar filas, así que no hace
+# falta reindexar. Las tildes se resuelven con la colación de la tabla
+# (utf8mb4_0900_ai_ci, insensible a acentos); aquí se pliegan también en la
+# consulta y se aplica un stemming ligero del español, buscando cada raíz
+# como prefijo ("pollos" -> +poll*), de modo que singulares, plurales y
+# géneros coinciden.
+import re
+import unicodedata
+
+# Palabras vacías que no aportan a la búsqueda (ya sin tildes)
+STOPWORDS = {
+    "a", "al", "algo", "con", "como", "de", "del", "el", "en", "es", "la", "las",
+    "lo", "los", "me", "mi", "para", "por", "que", "quiero", "receta", "recetas",
+    "se", "sin", "su", "un", "una", "unas", "unos", "y", "o",
+}
+
+# Sufijos de más largo a más corto: se quita solo el primero que encaje
+SUFFIXES = (
+    "amientos", "imientos", "amiento", "imiento", "aciones", "uciones",
+    "idades", "acion", "ucion", "mente", "ables", "ibles", "istas", "idad",
+    "able", "ible", "ista", "ando", "iendo", "ados", "adas", "idos", "idas",
+    "osos", "osas", "ado", "ada", "ido", "ida", "oso", "osa",
+    "ar", "er", "ir", "es", "s", "a", "o", "e",
+)
+
+# innodb_ft_min_token_size (por defecto 3): raíces más cortas no están en el índice
+MIN_STEM_LENGTH = 3
+MAX_TERMS = 8
+
+
+def fold_accents(text: str) -> str:
+    """Minúsculas y sin tildes ("Limón" -> "limon"); la ñ se conserva."""
+    text = text.lower().replace("ñ", "\0")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return text.replace("\0", "ñ")
+
+
+def stem_es(word: str) -> str:
+    """
+    Stemming ligero del español: quita un sufijo de flexión/derivación frecuente.
+    Tras un plural ("s", "es") se quita también la vocal de género, para que
+    "pollos", "pollo" y "polla" den la misma raíz.
+    """
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            stem = word[: -len(suffix)]
+            if suffix in ("s", "es") and stem[-1] in "aoe" and len(stem) - 1 >= MIN_STEM_LENGTH:
+                stem = stem[:-1]
+            return stem
+    return word
+
+
+def build_boolean_query(query: str) -> str:
+    """
+    Convierte el texto del usuario en una consulta BOOLEAN MODE de MySQL
+    donde todos los términos son obligatorios: "Arroz con pollos" -> "+arroz* +poll*".
+    Devuelve "" si no queda ningún término útil.
+    """
+    words = re.findall(r"\w+", fold_accents(query))
+    terms = []
+    for word in words:
+        if word in STOPWORDS or len(word) < MIN_STEM_LENGTH:
+            continue
+        stem = stem_es(word)
+        term = f"+{stem}*"
+        if term not in terms:
+            terms.append(term)
+    return " ".join(terms[:MAX_TERMS])
@@ -0,0 +1,155 @@
+# app/shopping_list.py
+import os
+import re
+import threading
+from fractions import Fraction
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+
+from app.cache import TTLCache
+from app.search import fold_accents
+load_dotenv()
+
+SHOPPING_LIST_CACHE_SIZE = int(os.getenv("SHOPPING_LIST_CACHE_SIZE", "256"))
+SHOPPING_LIST_CACHE_TTL = float(os.getenv("SHOPPING_LIST_CACHE_TTL", "600"))
+
+# Tabla de normalización: unidad (sin tildes, minúsculas) -> (dimensión, factor a la unidad base)
+UNIT_TABLE = {
+    "g": ("masa", 1), "gr": ("masa", 1), "grs": ("masa", 1), "gramo": ("masa", 1), "gramos": ("masa", 1),
+    "kg": ("masa", 1000), "kilo": ("masa", 1000), "kilos": ("masa", 1000),
+    "kilogramo": ("masa", 1000), "kilogramos": ("masa", 1000),
+    "lb": ("masa", 453.6), "libra": ("masa", 453.6), "libras": ("masa", 453.6),
+    "oz": ("masa", 28.35), "onza": ("masa", 28.35), "onzas": ("masa", 28.35),
+    "ml": ("volumen", 1), "mililitro": ("volumen", 1), "mililitros": ("volumen", 1),
+    "l": ("volumen", 1000), "lt": ("volumen", 1000), "litro": ("volumen", 1000), "litros": ("volumen", 1000),
+    "taza": ("volumen", 240), "tazas": ("volumen", 240),
+    "vaso": ("volumen", 200), "vasos": ("volumen", 200),
+    "cucharada": ("volumen", 15), "cucharadas": ("volumen", 15), "cda": ("volumen", 15), "cdas": ("volumen", 15),
+    "cucharadita": ("volumen", 5), "cucharaditas": ("volumen", 5), "cdta": ("volumen", 5), "cdtas": ("volumen", 5),
+    "": ("unidad", 1), "u": ("unidad", 1), "unidad": ("unidad", 1), "unidades": ("unidad", 1),
+    "pieza": ("unidad", 1), "piezas": ("unidad", 1),
+}
+BASE_UNITS = {"masa": "g", "volumen": "ml", "unidad": "unidad"}
+# A partir de este total se muestra en la unidad mayor (1500 g -> 1.5 kg)
+LARGE_UNITS = {"masa": ("kg", 1000), "volumen": ("l", 1000)}
+
+_QUANTITY_RE = re.compile(r"(\d+)\s+(\d+)/(\d+)|(\d+)/(\d+)|(\d+(?:[.,]\d+)?)")
+
+_cache = TTLCache(SHOPPING_LIST_CACHE_SIZE, SHOPPING_LIST_CACHE_TTL)
+# receta_id -> menús cuya lista está en caché (para invalidar al cambiar una receta)
+_menus_by_receta: dict[int, set[int]] = {}
+# Aumenta con cada invalidación: una lista leída antes de una invalidación no se guarda
+_generation = 0
+_lock = threading.Lock()
+
+
+def parse_quantity(cantidad: Optional[str]) -> Optional[float]:
+    """Convierte "2", "0,5", "1/2" o "1 1/2" a número; en rangos ("2-3") usa el primero."""
+    if not cantidad:
+        return None
+    match = _QUANTITY_RE.search(cantidad)
+    if match is None:
+        return None
+    whole, num, den, frac_num, frac_den, decimal = match.groups()
+    if whole is not None:
+        return float(int(whole) + Fraction(int(num), int(den))) if int(den) else None
+    if frac_num is not None:
+        return float(Fraction(int(frac_num), int(frac_den))) if int(frac_den) else None
+    return float(decimal.replace(",", "."))
+
+
+def normalize_name(ingrediente: str) -> str:
+    return " ".join(fold_accents(ingrediente).split())
+
+
+def aggregate(rows: Iterable) -> list[dict]:
+    """
+    Consolida filas (ingrediente, cantidad, unidad_medida, receta_id) agrupando por
+    ingrediente normalizado y dimensión de la unidad, sumando en la unidad base.
+    Las cantidades que no se pueden convertir se conservan como texto.
+    """
+    groups: dict[tuple, dict] = {}
+    for ingrediente, cantidad, unidad_medida, receta_id in rows:
+        name = normalize_name(ingrediente)
+        unit = fold_accents((unidad_medida or "").strip().rstrip("."))
+        if unit not in UNIT_TABLE and unit.endswith("s"):
+            # Unidades sin conversión ("dientes", "hojas"): se agrupan en singular
+            unit = unit[:-1]
+        # Una unidad desconocida es su propia dimensión: solo suma consigo misma
+        dimension, factor = UNIT_TABLE.get(unit, (unit, 1))
+        amount = parse_quantity(cantidad)
+
+        key = (name, dimension)
+        group = groups.setdefault(key, {
+            "ingrediente": ingrediente.strip(), "dimension": dimension,
+            "total": 0.0, "sin_convertir": [], "recetas": set(),
+        })
+        group["recetas"].add(receta_id)
+        if amount is not None:
+            group["total"] += amount * factor
+        elif cantidad:
+            group["sin_convertir"].append(f"{cantidad} {unidad_medida or ''}".strip())
+
+    items = []
+    for group in groups.values():
+        cantidad_total, unidad = None, BASE_UNITS.get(group["dimension"], group["dimension"])
+        if group["total"] > 0:
+            cantidad_total = group["total"]
+            large = LARGE_UNITS.get(group["dimension"])
+            if large and cantidad_total >= large[1]:
+                cantidad_total, unidad = cantidad_total / large[1], large[0]
+            cantidad_total = round(cantidad_total, 2)
+        items.append({
+            "ingrediente": group["ingrediente"],
+            "cantidad": cantidad_total,
+            "unidad": unidad if cantidad_total is not None else None,
+            "cantidades_sin_convertir": group["sin_convertir"],
+            "recetas": sorted(group["recetas"]),
+        })
+    items.sort(key=lambda item: normalize_name(item["ingrediente"]))
+    return items
+
+
+def get_cached(menu_id: int) -> Optional[list[dict]]:
+    return _cache.get(menu_id)
+
+
+def _prune_locked() -> None:
+    """Quita del índice los menús cuya lista ya expiró o se descartó de la caché."""
+    vigentes = {menu_id for menu_id, _ in _cache.items()}
+    for receta_id in list(_menus_by_receta):
+        menus = _menus_by_receta[receta_id] & vigentes
+        if menus:
+            _menus_by_receta[receta_id] = menus
+        else:
+            del _menus_by_receta[receta_id]
+
+
+def generation() -> int:
+    """Generación actual; se toma antes de leer las filas y se pasa a store()."""
+    with _lock:
+        return _generation
+
+
+def store(menu_id: int, receta_ids: Iterable[int], items: list[dict], read_generation: int) -> None:
+    """Guarda la lista salvo que alguna receta se haya invalidado desde read_generation."""
+    with _lock:
+        if _generation != read_generation:
+            # Las filas leídas pueden ser anteriores a la invalidación
+            return
+        _cache.set(menu_id, items)
+        # El índice no crece más que la caché: se poda en cada lista nueva
+        _prune_locked()
+        for receta_id in receta_ids:
+            _menus_by_receta.setdefault(receta_id, set()).add(menu_id)
+
+
+def invalidate_receta(receta_id: int) -> None:
+    """Descarta las listas de todos los menús en caché que incluyen la receta."""
+    global _generation
+    with _lock:
+        _generation += 1
+        menu_ids = _menus_by_receta.pop(receta_id, set())
+        for menu_id in menu_ids:
+            _cache.pop(menu_id)
@@ -0,0 +1,175 @@
+# app/thumbnails.py
+# Derivados reducidos (WebP/AVIF) de las imágenes de recetas.
+#
+# Titan genera PNG de 1024x1024 (~1-2 MB); para tarjetas y listados basta una
+# versión de 160-640 px en WebP/AVIF, que pesa decenas de KB. Los derivados se
+# generan en un pool de hilos propio (Pillow libera el GIL al redimensionar y
+# codificar), se guardan en disco y se sirven desde ahí en las siguientes peticiones.
+import os
+import io
+import asyncio
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app.image_store import get_image_store
+load_dotenv()
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow es opcional: sin él se sirve siempre el original
+    Image = None
+    features = None
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "./data/thumbnails")
+# Anchos generados (y a los que se ajusta ?w=); el alto mantiene la proporción
+THUMBNAIL_WIDTHS = sorted(int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "160,320,640").split(","))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Generar los derivados al guardar la imagen (si no, se crean en la primera petición)
+THUMBNAIL_PREGENERATE = os.getenv("THUMBNAIL_PREGENERATE", "1") == "1"
+
+MEDIA_TYPES = {"avif": "image/avif", "webp": "image/webp", "png": "image/png"}
+_PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP", "png": "PNG"}
+
+_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnails")
+_lock = threading.Lock()
+_stats = {"generated": 0, "served_from_disk": 0, "errors": 0}
+
+
+def _incr(key: str) -> None:
+    with _lock:
+        _stats[key] += 1
+
+
+def _format_supported(fmt: str) -> bool:
+    if Image is None:
+        return False
+    if fmt == "png":
+        return True
+    # AVIF requiere Pillow >= 11.2 compilado con libavif (o el plugin pillow-avif)
+    try:
+        return bool(features.check(fmt))
+    except ValueError:
+        return False
+
+
+THUMBNAILS_ENABLED = Image is not None
+SUPPORTED_FORMATS = [fmt for fmt in ("avif", "webp", "png") if _format_supported(fmt)]
+
+
+def snap_width(width: int) -> int:
+    """Ajusta el ancho pedido al menor ancho configurado que lo cubra (limita las variantes en disco)."""
+    for candidate in THUMBNAIL_WIDTHS:
+        if candidate >= width:
+            return candidate
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def negotiate_format(requested: Optional[str], accept: Optional[str]) -> str:
+    """Usa el formato pedido si está disponible; si no, el mejor que acepte el cliente (Accept)."""
+    if requested in SUPPORTED_FORMATS:
+        return requested  # type: ignore
+    accept = accept or ""
+    for fmt in ("avif", "webp"):
+        if fmt in SUPPORTED_FORMATS and MEDIA_TYPES[fmt] in accept:
+            return fmt
+    return "png"
+
+
+def path(key: str, width: int, fmt: str) -> str:
+    return os.path.join(THUMBNAIL_DIR, key[:2], f"{key}-{width}.{fmt}")
+
+
+def render(data: bytes, width: int, fmt: str) -> bytes:
+    """Redimensiona (sin ampliar) y codifica la imagen en el formato pedido."""
+    with Image.open(io.BytesIO(data)) as image:  # type: ignore
+        image.load()
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            image = image.resize((width, height), Image.LANCZOS)  # type: ignore
+        if fmt != "png" and image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        out = io.BytesIO()
+        options = {"optimize": True} if fmt == "png" else {"quality": THUMBNAIL_QUALITY}
+        if fmt == "webp":
+            options["method"] = 4
+        image.save(out, format=_PIL_FORMATS[fmt], **options)
+        return out.getvalue()
+
+
+def _write(target: str, data: bytes) -> None:
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    # Escritura atómica, igual que LocalImageStore
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_or_create(key: str, width: int, fmt: str, original: Optional[bytes] = None) -> bytes:
+    """Devuelve el derivado desde disco o lo genera a partir del original. Bloqueante."""
+    target = path(key, width, fmt)
+    try:
+        with open(target, "rb") as f:
+            data = f.read()
+        _incr("served_from_disk")
+        return data
+    except FileNotFoundError:
+        pass
+    if original is None:
+        original = get_image_store().read(key)
+    data = render(original, width, fmt)
+    _write(target, data)
+    _incr("generated")
+    return data
+
+
+def _pregenerate(key: str, original: bytes) -> None:
+    for fmt in SUPPORTED_FORMATS:
+        if fmt == "png":
+            continue
+        for width in THUMBNAIL_WIDTHS:
+            try:
+                get_or_create(key, width, fmt, original)
+            except Exception as e:
+                _incr("errors")
+                print(f"No se pudo generar el derivado {width}px {fmt} de {key}: {e}")
+
+
+def schedule_derivatives(key: str, original: bytes) -> None:
+    """Encola la generación de todos los derivados de una imagen recién guardada (no espera)."""
+    if THUMBNAILS_ENABLED and THUMBNAIL_PREGENERATE:
+        _executor.submit(_pregenerate, key, original)
+
+
+async def get_derivative(key: str, width: int, fmt: str) -> bytes:
+    """Obtiene un derivado en el pool de miniaturas, sin bloquear el event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, get_or_create, key, width, fmt)
+
+
+def thumbnail_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    return {
+        "enabled": THUMBNAILS_ENABLED,
+        "formats": SUPPORTED_FORMATS,
+        "widths": THUMBNAIL_WIDTHS,
+        "workers": THUMBNAIL_WORKERS,
+        "queued": _executor._work_queue.qsize(),
+        **stats,
+    }
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
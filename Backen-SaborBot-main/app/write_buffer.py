@@ -0,0 +1,132 @@
+# app/write_buffer.py
+# Escritura agrupada (write-behind) de las recetas que genera /chat.
+#
+# Con muchos chats simultáneos cada petición hacía su propio INSERT + COMMIT
+# (un fsync del redo log por receta). Con RECETA_WRITE_BUFFER=1 las recetas
+# que llegan dentro de la misma ventana (RECETA_WRITE_BUFFER_MS) se guardan
+# juntas en una sola transacción; cada petición sigue esperando a que su fila
+# esté confirmada, así que el id_receta que devuelve la API ya existe.
+import os
+import asyncio
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+
+from app import crud, models
+from app.database import AsyncSessionLocal
+load_dotenv()
+
+RECETA_WRITE_BUFFER = os.getenv("RECETA_WRITE_BUFFER", "0") == "1"
+# Espera máxima de una receta antes de escribir el lote
+RECETA_WRITE_BUFFER_MS = float(os.getenv("RECETA_WRITE_BUFFER_MS", "5"))
+# Recetas por transacción; al llenarse el lote se escribe sin esperar la ventana
+RECETA_WRITE_BUFFER_MAX = int(os.getenv("RECETA_WRITE_BUFFER_MAX", "50"))
+
+
+class RecetaWriteBuffer:
+    """Agrupa las recetas pendientes y las escribe con un único commit por lote."""
+
+    def __init__(self, max_batch: int, max_delay_ms: float):
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay_ms) / 1000
+        self._pending: list[tuple[dict, int, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._full: Optional[asyncio.Event] = None
+        self._writes: set = set()
+        self._stats = {"batches": 0, "rows": 0, "largest_batch": 0, "fallbacks": 0, "errors": 0}
+
+    async def submit(self, receta_data: dict, usuario_id: int) -> models.Receta:
+        """Encola la receta y espera a que su lote quede confirmado."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((receta_data, usuario_id, future))
+        if self._full is None:
+            self._full = asyncio.Event()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_after_window())
+        # shield: si el cliente se desconecta la receta se guarda igual
+        return await asyncio.shield(future)
+
+    async def _flush_after_window(self) -> None:
+        try:
+            await asyncio.wait_for(self._full.wait(), timeout=self.max_delay)
+        except asyncio.TimeoutError:
+            pass
+        self._full.clear()
+        # Las recetas que lleguen durante la escritura abren una ventana nueva
+        self._flusher = None
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.max_batch):
+            task = asyncio.create_task(self._write(pending[i:i + self.max_batch]))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: list) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                try:
+                    recetas = await crud.create_recetas_en_lote(db, [(data, usuario_id) for data, usuario_id, _ in batch])
+                except Exception as e:
+                    # Una fila inválida no debe tumbar el lote: se reintenta una por una
+                    print(f"Error al guardar un lote de {len(batch)} recetas, reintentando por separado: {e}")
+                    await db.rollback()
+                    self._stats["fallbacks"] += 1
+                    await self._write_one_by_one(db, batch)
+                    return
+        except Exception as e:
+            # Sin conexión: todas las peticiones del lote reciben el error
+            print(f"Error al guardar un lote de recetas: {e}")
+            self._stats["errors"] += len(batch)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._stats["batches"] += 1
+        self._stats["rows"] += len(batch)
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        for (_, _, future), receta in zip(batch, recetas):
+            if not future.done():
+                future.set_result(receta)
+
+    async def _write_one_by_one(self, db: AsyncSession, batch: list) -> None:
+        for data, usuario_id, future in batch:
+            try:
+                receta = await crud.create_receta(db, data, usuario_id)
+            except Exception as e:
+                await db.rollback()
+                self._stats["errors"] += 1
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self._stats["rows"] += 1
+                if not future.done():
+                    future.set_result(receta)
+
+    async def drain(self) -> None:
+        """Escribe lo pendiente (al apagar el worker)."""
+        if self._flusher is not None:
+            self._full.set()
+            await self._flusher
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {**self._stats, "enabled": RECETA_WRITE_BUFFER, "pending": len(self._pending)}
+
+
+receta_buffer = RecetaWriteBuffer(RECETA_WRITE_BUFFER_MAX, RECETA_WRITE_BUFFER_MS)
+
+
+async def create_receta(db: Optional[AsyncSession], receta_data: dict, usuario_id: int) -> models.Receta:
+    """
+    Guarda una receta de /chat: por el buffer si está activado, si no
+    directamente con la sesión recibida (o una propia si es None).
+    """
+    if RECETA_WRITE_BUFFER:
+        return await receta_buffer.submit(receta_data, usuario_id)
+    if db is not None:
+        return await crud.create_receta(db, receta_data, usuario_id)
+    async with AsyncSessionLocal() as own_db:
+        return await crud.create_receta(own_db, receta_data, usuario_id)
@@ -0,0 +1,118 @@
+# bench/dataset.py
+"""
+Genera un conjunto de datos reproducible (semilla fija) para las pruebas de carga:
+usuarios con contraseña conocida, recetas (una parte con imagen en el almacén),
+ingredientes y menús semanales.
+
+Funciona contra SQLite o MySQL según DATABASE_URL (ver app/database.py); con
+--reset borra antes todas las filas de las tablas de la aplicación.
+
+Uso (desde Backen-SaborBot-main):
+    DATABASE_URL=sqlite:///bench.db python -m bench.dataset --users 200 --recipes-per-user 50 --reset
+"""
+import random
+import argparse
+
+from sqlalchemy import insert
+
+from app import crud, models
+from app.database import Base, engine
+from app.image_store import get_image_store
+from bench.fake_bedrock import make_png
+
+BENCH_PASSWORD = "bench-password"
+
+WORDS = ("arroz", "pollo", "huevo", "papa", "tomate", "cebolla", "ajo", "lentejas", "limón", "queso",
+         "zanahoria", "pimiento", "atún", "garbanzos", "espinaca", "champiñones")
+UNITS = ("g", "kg", "taza", "cucharada", "unidad", "ml")
+
+
+def bench_email(user_id: int) -> str:
+    return f"bench{user_id}@example.com"
+
+
+def seed(users: int, recipes_per_user: int, image_ratio: float, distinct_images: int, reset: bool, seed_value: int = 42) -> dict:
+    """Crea las tablas si faltan y siembra los datos. Devuelve cuántas filas creó por tabla."""
+    Base.metadata.create_all(engine)
+    rng = random.Random(seed_value)
+
+    # Argon2 es lento a propósito: un solo hash compartido (misma contraseña) para todos los usuarios
+    hashed_password = crud.hash_password(BENCH_PASSWORD)
+    store = get_image_store()
+    image_keys = [
+        store.put(make_png(1024, 1024, noisy=False, shade=i * 16)) for i in range(distinct_images)
+    ]
+
+    with engine.begin() as conn:
+        if reset:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+
+        conn.execute(insert(models.Usuario), [
+            {"id": u, "nombre": f"Bench{u}", "apellido": "Carga", "email": bench_email(u), "hashed_password": hashed_password}
+            for u in range(1, users + 1)
+        ])
+
+        recetas = []
+        for u in range(1, users + 1):
+            for _ in range(recipes_per_user):
+                palabras = rng.sample(WORDS, 3)
+                recetas.append({
+                    "id": len(recetas) + 1,
+                    "usuario_id": u,
+                    "titulo": f"Receta de {' con '.join(palabras)}",
+                    "promt_usuario": f"quiero algo con {', '.join(palabras)}",
+                    # Respuestas de Nova típicas: ~2-3 KB de texto
+                    "instrucciones": " ".join(f"Paso {i + 1}: cocinar {rng.choice(WORDS)} a fuego medio." for i in range(40)),
+                    "imagen_key": rng.choice(image_keys) if image_keys and rng.random() < image_ratio else None,
+                })
+        if recetas:
+            conn.execute(insert(models.Receta), recetas)
+
+        ingredientes = [
+            {"receta_id": r["id"], "ingrediente": w, "cantidad": str(rng.randint(1, 500)), "unidad_medida": rng.choice(UNITS)}
+            for r in recetas for w in rng.sample(WORDS, 5)
+        ]
+        if ingredientes:
+            conn.execute(insert(models.IngredienteFaltanteReceta), ingredientes)
+
+        menus = [
+            {"id": u, "usuario_id": u, "fecha_inicio": "2026-01-05", "fecha_fin": "2026-01-11", "descripcion": "Menú de prueba"}
+            for u in range(1, users + 1)
+        ]
+        conn.execute(insert(models.MenuSemanal), menus)
+        asociaciones = [
+            {"menu_semanal_id": r["usuario_id"], "receta_id": r["id"]}
+            for r in recetas if (r["id"] - 1) % recipes_per_user < 7
+        ]
+        if asociaciones:
+            conn.execute(insert(models.receta_menu_semanal), asociaciones)
+
+    return {
+        "usuario": users,
+        "receta": len(recetas),
+        "ingredientefaltantereceta": len(ingredientes),
+        "menusemanal": len(menus),
+        "recetamenusemanal": len(asociaciones),
+        "imagenes": len(image_keys),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Siembra datos para las pruebas de carga")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--recipes-per-user", type=int, default=50)
+    parser.add_argument("--image-ratio", type=float, default=0.5, help="fracción de recetas con imagen")
+    parser.add_argument("--distinct-images", type=int, default=8)
+    parser.add_argument("--reset", action="store_true", help="borra los datos existentes antes de sembrar")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    counts = seed(args.users, args.recipes_per_user, args.image_ratio, args.distinct_images, args.reset, args.seed)
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"Contraseña de todos los usuarios: {BENCH_PASSWORD} (emails bench<N>@example.com)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# bench/fake_bedrock.py
+"""
+Servidor local que imita bedrock-runtime para pruebas de carga sin red ni costo.
+
+- POST /model/<id>/invoke-with-response-stream: responde con el framing binario
+  application/vnd.amazon.eventstream que espera boto3 (eventos "chunk" con
+  messageStart, contentBlockDelta, contentBlockStop y messageStop de Nova).
+- POST /model/<id>/invoke: responde como Titan G1 con N imágenes PNG en Base64.
+
+La latencia es configurable (tiempo hasta el primer token, retardo por
+fragmento y duración de cada imagen) y puede devolver ThrottlingException
+en una fracción de las llamadas para ejercitar app/bedrock_scheduler.py.
+
+Uso (desde Backen-SaborBot-main):
+    python -m bench.fake_bedrock --port 9010 --ttft 0.4 --token-delay 0.02
+    BEDROCK_ENDPOINT_URL=http://127.0.0.1:9010 AWS_ACCESS_KEY_ID=x AWS_SECRET_ACCESS_KEY=x uvicorn app.main:app
+"""
+import os
+import json
+import time
+import zlib
+import base64
+import random
+import struct
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+WORDS = (
+    "mezclar", "la", "harina", "con", "dos", "huevos", "y", "una", "taza", "de", "leche",
+    "hornear", "a", "180", "grados", "durante", "25", "minutos", "servir", "caliente",
+    "picar", "cebolla", "ajo", "sofreír", "en", "aceite", "de", "oliva", "agregar", "arroz",
+)
+
+
+@dataclass
+class FakeBedrockConfig:
+    ttft: float = 0.3            # segundos hasta el primer fragmento de texto
+    token_delay: float = 0.02    # segundos entre fragmentos
+    tokens: int = 200            # palabras por respuesta
+    words_per_chunk: int = 3
+    image_latency: float = 3.0   # segundos por invocación de Titan
+    noisy_images: bool = False   # PNG con ruido (tamaño realista, ~3 MB a 1024x1024)
+    throttle_rate: float = 0.0   # fracción de llamadas que responden ThrottlingException
+
+
+# --- Framing application/vnd.amazon.eventstream ---
+
+def _header(name: str, value: str) -> bytes:
+    name_bytes, value_bytes = name.encode(), value.encode()
+    # Tipo 7 = string
+    return struct.pack("!B", len(name_bytes)) + name_bytes + struct.pack("!BH", 7, len(value_bytes)) + value_bytes
+
+
+def encode_event(payload: bytes, event_type: str = "chunk") -> bytes:
+    """Un mensaje del event stream: preludio (longitudes + CRC), headers, payload y CRC final."""
+    headers = (
+        _header(":event-type", event_type)
+        + _header(":content-type", "application/json")
+        + _header(":message-type", "event")
+    )
+    total_length = 12 + len(headers) + len(payload) + 4
+    prelude = struct.pack("!II", total_length, len(headers))
+    prelude += struct.pack("!I", zlib.crc32(prelude) & 0xFFFFFFFF)
+    message = prelude + headers + payload
+    return message + struct.pack("!I", zlib.crc32(message) & 0xFFFFFFFF)
+
+
+def nova_chunk(body: dict) -> bytes:
+    # El modelo entrega cada evento JSON en base64 dentro del campo "bytes"
+    inner = base64.b64encode(json.dumps(body).encode()).decode()
+    return encode_event(json.dumps({"bytes": inner}).encode())
+
+
+# --- Imágenes ---
+
+_png_cache: dict = {}
+_png_lock = threading.Lock()
+
+
+def make_png(width: int, height: int, noisy: bool, shade: int = 0) -> bytes:
+    """PNG RGB válido generado con zlib (degradado desplazado por `shade`, o ruido aleatorio)."""
+    key = (width, height, noisy, shade)
+    with _png_lock:
+        if key not in _png_cache:
+            if noisy:
+                raw = b"".join(b"\x00" + os.urandom(width * 3) for _ in range(height))
+            else:
+                raw = b"".join(b"\x00" + bytes((x + y + shade) % 256 for x in range(width)) * 3 for y in range(height))
+            ihdr = struct.pack("!IIBBBBB", width, height, 8, 2, 0, 0, 0)
+
+            def chunk(kind: bytes, data: bytes) -> bytes:
+                return struct.pack("!I", len(data)) + kind + data + struct.pack("!I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+            _png_cache[key] = (
+                b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+            )
+        return _png_cache[key]
+
+
+# --- Servidor HTTP ---
+
+class FakeBedrockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # conexiones keep-alive, como el pool de botocore
+    config = FakeBedrockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length", "0"))
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def _send_json(self, status: int, body: dict, headers: dict | None = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _throttled(self) -> bool:
+        if random.random() >= self.config.throttle_rate:
+            return False
+        self._send_json(
+            429, {"message": "Too many requests, please wait before trying again."},
+            {"x-amzn-ErrorType": "ThrottlingException:http://internal.amazon.com/coral/com.amazon.bedrock/"},
+        )
+        return True
+
+    def do_POST(self):
+        path = unquote(self.path)
+        request = self._read_body()
+        if self._throttled():
+            return
+        if path.endswith("/invoke-with-response-stream"):
+            self._stream_text(request)
+        elif path.endswith("/invoke"):
+            self._images(request)
+        else:
+            self._send_json(404, {"message": f"Ruta desconocida: {path}"})
+
+    def _write_chunk(self, data: bytes) -> None:
+        # Transfer-Encoding: chunked
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream_text(self, request: dict) -> None:
+        cfg = self.config
+        max_tokens = request.get("inferenceConfig", {}).get("maxTokens", cfg.tokens)
+        words = [random.choice(WORDS) for _ in range(min(cfg.tokens, max_tokens))]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Amzn-Bedrock-Content-Type", "application/json")
+        self.end_headers()
+
+        time.sleep(cfg.ttft)
+        self._write_chunk(nova_chunk({"messageStart": {"role": "assistant"}}))
+        for i in range(0, len(words), cfg.words_per_chunk):
+            text = " ".join(words[i:i + cfg.words_per_chunk]) + " "
+            self._write_chunk(nova_chunk({"contentBlockDelta": {"delta": {"text": text}, "contentBlockIndex": 0}}))
+            time.sleep(cfg.token_delay)
+        self._write_chunk(nova_chunk({"contentBlockStop": {"contentBlockIndex": 0}}))
+        self._write_chunk(nova_chunk({"messageStop": {"stopReason": "end_turn"}}))
+        self._write_chunk(nova_chunk({"metadata": {"usage": {"inputTokens": 50, "outputTokens": len(words)}}}))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _images(self, request: dict) -> None:
+        cfg = request.get("imageGenerationConfig", {})
+        width, height = cfg.get("width", 1024), cfg.get("height", 1024)
+        count = cfg.get("numberOfImages", 1)
+        time.sleep(self.config.image_latency)
+        image = base64.b64encode(make_png(width, height, self.config.noisy_images)).decode()
+        self._send_json(200, {"images": [image] * count, "error": None})
+
+
+def serve(host: str, port: int, config: FakeBedrockConfig) -> ThreadingHTTPServer:
+    """Arranca el servidor en un hilo y lo devuelve (llamar a .shutdown() para detenerlo)."""
+    handler = type("ConfiguredHandler", (FakeBedrockHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-bedrock").start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="bedrock-runtime falso para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9010)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--image-latency", type=float, default=3.0)
+    parser.add_argument("--noisy-images", action="store_true")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = FakeBedrockConfig(
+        ttft=args.ttft, token_delay=args.token_delay, tokens=args.tokens,
+        image_latency=args.image_latency, noisy_images=args.noisy_images, throttle_rate=args.throttle_rate,
+    )
+    server = serve(args.host, args.port, config)
+    print(f"bedrock-runtime falso en http://{args.host}:{args.port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+# bench/run.py
+"""
+Pruebas de carga de la API completamente offline.
+
+Levanta el bedrock-runtime falso (bench/fake_bedrock.py), siembra una base de
+datos (SQLite temporal por defecto, o la indicada con --database-url), arranca
+uvicorn como subproceso y ejecuta los escenarios:
+
+- login:   ráfaga de POST /auth (Argon2 + pool de hashing)
+- chat:    ráfaga de POST /chat con prompts distintos (Nova simulado + escritura de receta)
+- listing: GET /recetasbyuser (listado completo) y GET /recipes?limit=50 (paginado)
+
+Para cada escenario informa p50/p95/p99, throughput, errores y la memoria
+residente (RSS) del servidor antes y en el pico.
+
+Uso (desde Backen-SaborBot-main, con requirements.txt y bench/requirements.txt instalados):
+    python -m bench.run --scenario all --requests 500 --concurrency 32
+    python -m bench.run --scenario listing --json resultados.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from bench.fake_bedrock import FakeBedrockConfig, serve
+
+BENCH_PASSWORD = "bench-password"  # el mismo que bench/dataset.py
+SCENARIOS = ("login", "chat", "listing")
+
+
+def bench_email(user_id: int) -> str:
+    return f"bench{user_id}@example.com"
+
+
+# --- Memoria del servidor ---
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """RSS del proceso en MB leyendo /proc (Linux); None si no está disponible."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """Muestrea el RSS del servidor en un hilo mientras corre un escenario."""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid, self.interval = pid, interval
+        self.start_mb = read_rss_mb(pid)
+        self.peak_mb = self.start_mb
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.peak_mb = max(self.peak_mb or 0, rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# --- Resultados ---
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    concurrency: int
+    elapsed_s: float = 0.0
+    latencies_ms: list = field(default_factory=list)
+    errors: int = 0
+    statuses: dict = field(default_factory=dict)
+    rss_start_mb: Optional[float] = None
+    rss_peak_mb: Optional[float] = None
+
+    def percentile(self, q: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+    def summary(self) -> dict:
+        return {
+            "scenario": self.name,
+            "requests": self.requests,
+            "concurrency": self.concurrency,
+            "errors": self.errors,
+            "statuses": self.statuses,
+            "throughput_rps": round(self.requests / self.elapsed_s, 1) if self.elapsed_s else 0.0,
+            "p50_ms": round(self.percentile(0.50), 1),
+            "p95_ms": round(self.percentile(0.95), 1),
+            "p99_ms": round(self.percentile(0.99), 1),
+            "max_ms": round(max(self.latencies_ms, default=0.0), 1),
+            "rss_start_mb": round(self.rss_start_mb, 1) if self.rss_start_mb else None,
+            "rss_peak_mb": round(self.rss_peak_mb, 1) if self.rss_peak_mb else None,
+        }
+
+
+async def run_load(
+    name: str,
+    send: Callable[[int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+    server_pid: int,
+) -> ScenarioResult:
+    """Lanza `requests` peticiones con `concurrency` workers y mide cada una."""
+    result = ScenarioResult(name, requests, concurrency)
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await send(i)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            result.latencies_ms.append((time.perf_counter() - start) * 1000)
+            result.statuses[str(status)] = result.statuses.get(str(status), 0) + 1
+            if not (isinstance(status, int) and status < 400):
+                result.errors += 1
+
+    with RssSampler(server_pid) as sampler:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.elapsed_s = time.perf_counter() - start
+    result.rss_start_mb, result.rss_peak_mb = sampler.start_mb, sampler.peak_mb
+    return result
+
+
+# --- Escenarios ---
+
+async def login(client: httpx.AsyncClient, user_id: int) -> str:
+    response = await client.post("/auth", json={"email": bench_email(user_id), "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run_scenarios(args, base_url: str, server_pid: int) -> list[ScenarioResult]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        # Tokens de un subconjunto de usuarios (no se mide)
+        token_users = range(1, min(args.users, args.concurrency) + 1)
+        tokens = [await login(client, u) for u in token_users]
+
+        def auth(i: int) -> dict:
+            return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+        scenarios: dict[str, list[tuple[str, Callable[[int], Awaitable[httpx.Response]]]]] = {
+            "login": [(
+                "login_storm",
+                lambda i: client.post("/auth", json={"email": bench_email(i % args.users + 1), "password": BENCH_PASSWORD}),
+            )],
+            "chat": [(
+                "chat_burst",
+                # Prompts distintos: sin aciertos en la caché de respuestas
+                lambda i: client.post("/chat", json={"message": f"Dame una receta rápida número {i} con arroz"}, headers=auth(i)),
+            )],
+            "listing": [
+                ("listing_full", lambda i: client.get("/recetasbyuser", headers=auth(i))),
+                ("listing_page", lambda i: client.get("/recipes", params={"limit": 50}, headers=auth(i))),
+            ],
+        }
+        selected = SCENARIOS if args.scenario == "all" else (args.scenario,)
+        results = []
+        for scenario in selected:
+            for name, send in scenarios[scenario]:
+                print(f"Escenario {name}: {args.requests} peticiones, concurrencia {args.concurrency}...", flush=True)
+                results.append(await run_load(name, send, args.requests, args.concurrency, server_pid))
+        return results
+
+
+# --- Orquestación ---
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn terminó antes de estar listo")
+        try:
+            if httpx.get(f"{base_url}/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("uvicorn no respondió a tiempo")
+
+
+def print_table(results: list[ScenarioResult]) -> None:
+    columns = ("scenario", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "max_ms", "rss_start_mb", "rss_peak_mb")
+    rows = [result.summary() for result in results]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pruebas de carga offline de la API")
+    parser.add_argument("--scenario", choices=("all",) + SCENARIOS, default="all")
+    parser.add_argument("--requests", type=int, default=300, help="peticiones por escenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--recipes-per-user", type=int, default=50)
+    parser.add_argument("--database-url", help="URL síncrona (p. ej. mysql+pymysql://...); por defecto SQLite temporal")
+    parser.add_argument("--async-database-url", help="URL asíncrona equivalente (p. ej. mysql+aiomysql://...)")
+    parser.add_argument("--no-seed", action="store_true", help="usar los datos existentes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--bedrock-port", type=int, default=9010)
+    parser.add_argument("--workers", type=int, default=1, help="workers de uvicorn")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--extract-ingredients", action="store_true", help="incluir la extracción en segundo plano tras /chat")
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="saborbot-bench-")
+    database_url = args.database_url or f"sqlite:///{workdir}/bench.db"
+    async_database_url = args.async_database_url or f"sqlite+aiosqlite:///{workdir}/bench.db"
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "ASYNC_DATABASE_URL": async_database_url,
+        "APP_ENV": "bench",
+        "IMAGE_STORE_DIR": os.path.join(workdir, "images"),
+        "THUMBNAIL_DIR": os.path.join(workdir, "thumbnails"),
+        "BEDROCK_ENDPOINT_URL": f"http://127.0.0.1:{args.bedrock_port}",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_REGION": "us-east-1",
+        # Tokens JWT del login: sin .env de desarrollo /auth falla con "Algorithm not supported"
+        "SECRET_KEY": "bench-secret-key",
+        "ALGORITHM": "HS256",
+        "INGREDIENT_EXTRACTION_ENABLED": "1" if args.extract_ingredients else "0",
+    }
+
+    fake = serve("127.0.0.1", args.bedrock_port, FakeBedrockConfig(
+        ttft=args.ttft, token_delay=args.token_delay, throttle_rate=args.throttle_rate,
+    ))
+    if not args.no_seed:
+        subprocess.run(
+            [sys.executable, "-m", "bench.dataset", "--users", str(args.users),
+             "--recipes-per-user", str(args.recipes_per_user), "--reset"],
+            env=env, check=True,
+        )
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        wait_until_ready(base_url, server)
+        results = asyncio.run(run_scenarios(args, base_url, server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        fake.shutdown()
+
+    print()
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([result.summary() for result in results], f, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# bench/serialization.py
+"""
+Compara la serialización JSON (json de la stdlib frente a orjson) y los bytes
+enviados (sin comprimir, gzip y Brotli) de las respuestas más pesadas:
+
+- recetas:  GET /recetasbyuser (lista de RecetaOut con instrucciones de ~2-3 KB)
+- imagen:   POST /generate-image (ImageResponse con el PNG en Base64)
+- variantes: POST /recipes/{id}/image-variants (ImageVariantsResponse, varias imágenes)
+- png:      GET /recipes/{id}/image (bytes PNG; se muestra por qué no se comprime)
+
+No necesita servidor ni base de datos.
+
+Uso (desde Backen-SaborBot-main):
+    python -m bench.serialization --recipes 200 --repeat 20
+    python -m bench.serialization --noisy-images --json serializacion.json
+"""
+import json
+import time
+import base64
+import random
+import argparse
+from typing import Callable
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app import schemas
+from app.compression import brotli, compress
+from bench.dataset import WORDS
+from bench.fake_bedrock import make_png
+
+
+def timed(fn: Callable[[], bytes], repeat: int) -> tuple[float, bytes]:
+    """Mediana en ms de `repeat` ejecuciones y el último resultado."""
+    samples, result = [], b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+
+def recipe_payload(count: int, rng: random.Random) -> list:
+    return [
+        schemas.RecetaOut(
+            id=i + 1,
+            usuario_id=1,
+            titulo=f"Receta de {' con '.join(rng.sample(WORDS, 3))}",
+            promt_usuario="quiero algo rápido para la cena",
+            instrucciones=" ".join(f"Paso {p + 1}: cocinar {rng.choice(WORDS)} a fuego medio." for p in range(40)),
+            imagen_url=f"/recipes/{i + 1}/image" if i % 2 else None,
+        )
+        for i in range(count)
+    ]
+
+
+def measure_json(name: str, payload, repeat: int) -> dict:
+    """Mismo camino que FastAPI: jsonable_encoder + render de la clase de respuesta."""
+    row = {"payload": name}
+    for label, response_class in (("stdlib", JSONResponse), ("orjson", ORJSONResponse)):
+        ms, body = timed(lambda: response_class(jsonable_encoder(payload)).body, repeat)
+        row[f"{label}_ms"] = round(ms, 2)
+    row.update(measure_bytes(body, repeat))
+    return row
+
+
+def measure_bytes(body: bytes, repeat: int) -> dict:
+    row = {"raw_bytes": len(body)}
+    encodings = ("gzip", "br") if brotli is not None else ("gzip",)
+    for encoding in encodings:
+        ms, compressed = timed(lambda: compress(body, encoding), repeat)
+        row[f"{encoding}_bytes"] = len(compressed)
+        row[f"{encoding}_ms"] = round(ms, 2)
+    return row
+
+
+def print_table(rows: list[dict]) -> None:
+    columns = list(dict.fromkeys(c for row in rows for c in row))
+    widths = {c: max(len(c), *(len(str(r.get(c, "-"))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "-")).ljust(widths[c]) for c in columns))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serialización JSON y compresión de respuestas")
+    parser.add_argument("--recipes", type=int, default=200, help="recetas en el listado")
+    parser.add_argument("--variants", type=int, default=3)
+    parser.add_argument("--size", type=int, default=1024, help="lado de las imágenes en px")
+    parser.add_argument("--noisy-images", action="store_true", help="PNG con ruido (tamaño realista de Titan)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    png = make_png(args.size, args.size, args.noisy_images)
+    image_b64 = base64.b64encode(png).decode()
+
+    rows = [
+        measure_json(f"recetas x{args.recipes}", recipe_payload(args.recipes, rng), args.repeat),
+        measure_json("imagen", schemas.ImageResponse(image_base64=image_b64, image_url="/recipes/1/image"), args.repeat),
+        # Variantes distintas entre sí: imágenes repetidas falsearían el ratio de Brotli
+        measure_json(f"variantes x{args.variants}", schemas.ImageVariantsResponse(images=[
+            base64.b64encode(make_png(args.size, args.size, args.noisy_images, shade=i * 16)).decode()
+            for i in range(args.variants)
+        ]), args.repeat),
+        {"payload": "png binario", **measure_bytes(png, args.repeat)},
+    ]
+    print_table(rows)
+    if brotli is None:
+        print("\nbrotli no está instalado: solo se mide gzip")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
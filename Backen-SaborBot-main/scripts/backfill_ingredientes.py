@@ -0,0 +1,65 @@
+# scripts/backfill_ingredientes.py
+"""
+Extrae los ingredientes estructurados de las recetas existentes que aún no los tienen.
+
+Recorre la tabla receta por lotes (keyset sobre id) y procesa cada lote con
+una concurrencia acotada de llamadas a Nova; cada receta se guarda con un
+único INSERT multi-fila.
+
+Uso (desde Backen-SaborBot-main):
+    python -m scripts.backfill_ingredientes --batch-size 100 --concurrency 4
+"""
+import sys
+import asyncio
+import argparse
+
+from app import crud
+from app.database import AsyncSessionLocal, async_engine
+from app.ingredients import extract_and_store
+
+
+async def backfill(batch_size: int, concurrency: int, limit: int | None) -> tuple[int, int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    processed, failed, last_id = 0, 0, 0
+
+    async def process(receta_id: int, instrucciones: str) -> bool:
+        async with semaphore:
+            try:
+                count = await extract_and_store(receta_id, instrucciones)
+                print(f"Receta {receta_id}: {count} ingredientes")
+                return True
+            except Exception as e:
+                print(f"Receta {receta_id}: error ({e})")
+                return False
+
+    while limit is None or processed < limit:
+        async with AsyncSessionLocal() as db:
+            rows = await crud.get_recetas_sin_ingredientes(db, after_id=last_id, limit=batch_size)
+        if not rows:
+            break
+        if limit is not None:
+            rows = rows[: limit - processed]
+        results = await asyncio.gather(*(process(row.id, row.instrucciones) for row in rows))
+        processed += len(rows)
+        failed += results.count(False)
+        # Las fallidas siguen sin ingredientes: se reintentan en la próxima ejecución
+        last_id = rows[-1].id
+
+    await async_engine.dispose()
+    return processed, failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4, help="llamadas simultáneas a Bedrock")
+    parser.add_argument("--limit", type=int, default=None, help="máximo de recetas a procesar")
+    args = parser.parse_args()
+
+    processed, failed = asyncio.run(backfill(args.batch_size, args.concurrency, args.limit))
+    print(f"Recetas procesadas: {processed} (fallidas: {failed})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
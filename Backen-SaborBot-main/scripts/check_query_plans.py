@@ -0,0 +1,158 @@
+# scripts/check_query_plans.py
+"""
+Auditoría de planes de consulta de app/crud.py.
+
+Ejecuta las consultas de lectura del CRUD contra una base de datos MySQL de
+pruebas, captura el SQL real que emite SQLAlchemy y corre EXPLAIN sobre cada
+SELECT. Termina con código 1 si alguna hace un recorrido completo de tabla
+(type=ALL) o de índice (type=index) sobre las tablas sembradas.
+
+Uso (desde Backen-SaborBot-main, con las variables DB_* apuntando a una base de pruebas):
+    python -m scripts.check_query_plans --seed
+"""
+import sys
+import random
+import asyncio
+import argparse
+
+from sqlalchemy import event, insert, text
+
+from app import crud, models
+from app.database import Base, engine, async_engine, AsyncSessionLocal
+
+SEEDED_TABLES = (
+    "usuario", "receta", "menusemanal", "ingredientefaltantereceta", "recetamenusemanal",
+    "conversacion", "mensajeconversacion",
+)
+MENSAJES_POR_CONVERSACION = 60
+FULL_SCAN_TYPES = ("ALL", "index")
+
+WORDS = ("arroz", "pollo", "huevo", "papa", "tomate", "cebolla", "ajo", "lentejas", "limón", "queso")
+
+
+def seed(users: int, recipes_per_user: int) -> None:
+    """Crea las tablas si faltan y siembra un conjunto de datos suficiente para que el optimizador use índices."""
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for table in reversed(SEEDED_TABLES):
+            conn.execute(text(f"DELETE FROM {table}"))
+        conn.execute(insert(models.Usuario), [
+            {"id": u, "nombre": f"Usuario{u}", "apellido": "Prueba", "email": f"user{u}@example.com", "hashed_password": "x"}
+            for u in range(1, users + 1)
+        ])
+        recetas = []
+        for u in range(1, users + 1):
+            for _ in range(recipes_per_user):
+                palabras = " ".join(rng.sample(WORDS, 3))
+                instrucciones = f"Mezclar {palabras}. " * 20
+                recetas.append({
+                    "id": len(recetas) + 1, "usuario_id": u, "titulo": f"Receta de {palabras}",
+                    "promt_usuario": f"algo con {palabras}", "instrucciones": instrucciones,
+                    # El INSERT de Core no pasa por el @validates del modelo
+                    "instrucciones_sha256": models.hash_instrucciones(instrucciones),
+                })
+        conn.execute(insert(models.Receta), recetas)
+        conn.execute(insert(models.IngredienteFaltanteReceta), [
+            {"receta_id": r["id"], "ingrediente": w, "cantidad": "1", "unidad_medida": "taza"}
+            for r in recetas for w in rng.sample(WORDS, 2)
+        ])
+        conn.execute(insert(models.MenuSemanal), [
+            {"id": u, "usuario_id": u, "fecha_inicio": "2026-01-05", "fecha_fin": "2026-01-11"}
+            for u in range(1, users + 1)
+        ])
+        conn.execute(insert(models.receta_menu_semanal), [
+            {"menu_semanal_id": r["usuario_id"], "receta_id": r["id"]} for r in recetas[::recipes_per_user]
+        ])
+        conn.execute(insert(models.Conversacion), [
+            {"id": u, "usuario_id": u, "titulo": f"Conversación {u}"} for u in range(1, users + 1)
+        ])
+        conn.execute(insert(models.MensajeConversacion), [
+            {"conversacion_id": u, "rol": "user" if m % 2 == 0 else "assistant", "contenido": f"Mensaje {m}", "tokens": 5}
+            for u in range(1, users + 1) for m in range(MENSAJES_POR_CONVERSACION)
+        ])
+        for table in SEEDED_TABLES:
+            conn.execute(text(f"ANALYZE TABLE {table}"))
+
+
+async def run_crud_queries(usuario_id: int) -> None:
+    """Ejecuta las lecturas del CRUD con los patrones de acceso de la API."""
+    async with AsyncSessionLocal() as db:
+        await crud.get_usuario(db, usuario_id)
+        await crud.get_usuario_by_email(db, f"user{usuario_id}@example.com")
+        page = await crud.get_recetas_page(db, usuario_id, limit=20)
+        await crud.get_recetas_page(db, usuario_id, limit=20, cursor=page[-1].id if page else None)
+        await crud.get_recetas_by_usuario(db, usuario_id)
+        if page:
+            receta = await crud.get_receta(db, page[0].id)
+            await crud.get_receta_imagen_key(db, page[0].id)
+            # Respuesta servida desde la caché del chat: receta de origen por hash
+            await crud.get_ingredientes_por_instrucciones(db, receta.instrucciones, excluir_id=0) # type: ignore
+        # Lotes de scripts/backfill_ingredientes.py
+        await crud.get_recetas_sin_ingredientes(db, after_id=0, limit=50)
+        await crud.search_recetas(db, usuario_id, "+poll* +arroz*", limit=20)
+        await crud.get_menu_semanal(db, usuario_id)
+        # Lista de compras del menú (el menú sembrado de cada usuario tiene su mismo id)
+        await crud.get_filas_lista_compras(db, usuario_id)
+        # Ventana del chat y lotes del resumen (la conversación sembrada de cada usuario tiene su mismo id)
+        mensajes = await crud.get_ultimos_mensajes(db, usuario_id, limit=40)
+        if mensajes:
+            resumen_hasta_id = mensajes[-1].id
+            await crud.get_ultimos_mensajes(db, usuario_id, limit=40, after_id=resumen_hasta_id)
+            await crud.get_mensajes_sin_resumir(
+                db, usuario_id, after_id=resumen_hasta_id, before_id=mensajes[0].id, limit=40
+            )
+
+
+def capture_statements(usuario_id: int) -> list:
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        asyncio.run(run_crud_queries(usuario_id))
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+def explain(statements: list) -> list:
+    """Devuelve las filas de EXPLAIN que recorren tablas completas."""
+    problems = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().all()
+            for row in rows:
+                if row["table"] in SEEDED_TABLES and row["type"] in FULL_SCAN_TYPES:
+                    problems.append((statement, dict(row)))
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="borra y siembra las tablas antes de comprobar")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--recipes-per-user", type=int, default=40)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.users, args.recipes_per_user)
+
+    statements = capture_statements(usuario_id=1)
+    problems = explain(statements)
+    print(f"Consultas analizadas: {len(statements)}")
+    for statement, row in problems:
+        print(f"\nRecorrido completo en '{row['table']}' (type={row['type']}, rows={row['rows']}):")
+        print(" ".join(statement.split()))
+    if problems:
+        print(f"\n{len(problems)} consulta(s) sin índice adecuado")
+        return 1
+    print("Todas las consultas usan índices")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())